@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -23,7 +24,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-toikptb1%th0)*@^@+-na6-ci35el^dg1dgayzg86f5n^n5u%h'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Продакшен-профиль: DIARY_DEBUG=0 после collectstatic — статика с хэшем в имени
+# и Cache-Control: immutable (см. diary_analytic/static_assets.py). При DEBUG
+# шаблоны ссылаются на исходные имена, а статику раздаёт runserver из приложений.
+DEBUG = os.environ.get('DIARY_DEBUG', '1') != '0'
 
 ALLOWED_HOSTS = ['150.241.74.139', 'peppy-toad.aeza.network', 'localhost', '127.0.0.1']
 
@@ -40,13 +44,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'diary_analytic.static_assets.PrecompressedStaticMiddleware',
+    'diary_analytic.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'diary_analytic.static_assets.ThresholdGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'diary_analytic.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'diary_analytic.versioning.DataVersionMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -75,8 +84,15 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # DIARY_DB_PATH позволяет запустить процесс на другой (например, временной) БД
+        'NAME': os.environ.get('DIARY_DB_PATH') or BASE_DIR / 'db.sqlite3',
         # 'NAME': BASE_DIR / 'sync' / 'db' / 'db.sqlite3',
+        'OPTIONS': {
+            # Транзакция сразу берёт блокировку на запись: несколько воркеров
+            # ждут друг друга (timeout), а не падают на повышении блокировки
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -117,6 +133,56 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic: имена с хэшем содержимого + сжатые .gz/.br (см. diary_analytic/static_assets.py)
+STATIC_ROOT = Path(os.environ.get('DIARY_STATIC_ROOT') or BASE_DIR / 'staticfiles')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'diary_analytic.static_assets.CompressedManifestStorage'},
+}
+
+# С какого размера сжимать динамические ответы (история, прогнозы, HTML), байт
+DIARY_GZIP_MIN_BYTES = int(os.environ.get('DIARY_GZIP_MIN_BYTES') or 1024)
+
+# Memmap-снимки широкой матрицы дневника (см. diary_analytic/snapshot.py)
+DIARY_SNAPSHOT_DIR = Path(os.environ.get('DIARY_SNAPSHOT_DIR') or BASE_DIR / 'snapshots')
+
+# Поколения обученных моделей (см. diary_analytic/model_store.py)
+DIARY_MODELS_DIR = Path(os.environ.get('DIARY_MODELS_DIR') or BASE_DIR / 'diary_analytic' / 'trained_models')
+
+# Размер пула потоков для блокирующей работы async-вьюх (см. diary_analytic/async_views.py)
+DIARY_ASYNC_WORKERS = int(os.environ.get('DIARY_ASYNC_WORKERS') or 8)
+
+# Запись значений через очередь с одним писателем (см. diary_analytic/write_queue.py)
+DIARY_WRITE_QUEUE = os.environ.get('DIARY_WRITE_QUEUE', '1') != '0'
+
+# Снимок, экспорт и прогнозы после записи — в фоновом потоке (см. diary_analytic/signals.py); 0 — сразу после коммита
+DIARY_BACKGROUND_REFRESH = os.environ.get('DIARY_BACKGROUND_REFRESH', '1') != '0'
+
+# manage.py test: обновление после записи — сразу в потоке коммита (см. diary_analytic/test_runner.py)
+TEST_RUNNER = 'diary_analytic.test_runner.DiaryTestRunner'
+
+# Файлы метрик процессов для GET /metrics (см. diary_analytic/metrics.py); пусто — только текущий процесс.
+# Включает gunicorn.conf.py, чтобы тесты и команды manage.py не попадали в метрики сервера
+DIARY_METRICS_DIR = os.environ.get('DIARY_METRICS_DIR') or None
+
+# Архив закрытых лет (см. diary_analytic/archive.py); пусто — каталог <файл БД>.archive рядом с БД
+DIARY_ARCHIVE_DIR = os.environ.get('DIARY_ARCHIVE_DIR') or None
+
+# Синхронизация устройств дельтами журнала изменений (см. diary_analytic/changelog.py):
+# id устройства (пусто — создаётся и хранится в <файл БД>.sync.json) и каталог дельт
+DIARY_SYNC_DEVICE = os.environ.get('DIARY_SYNC_DEVICE') or None
+DIARY_SYNC_DIR = Path(os.environ.get('DIARY_SYNC_DIR') or BASE_DIR / 'sync' / 'deltas')
+
+# Профили cProfile/tracemalloc по запросу (см. diary_analytic/profiling.py)
+DIARY_PROFILES_DIR = Path(os.environ.get('DIARY_PROFILES_DIR') or BASE_DIR / 'profiles')
+
+# Предрасчёт прогнозов в таблицу Prediction после обучения (см. diary_analytic/prediction_store.py)
+DIARY_PRECOMPUTE_PREDICTIONS = True
+
+# Автоматический CSV-экспорт после изменений (см. utils.export_diary_to_csv)
+DIARY_EXPORT_PATH = Path(os.environ.get('DIARY_EXPORT_PATH') or BASE_DIR / 'other' / 'export.csv')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from diary_analytic.admin import profile_file, profiles_view
 from diary_analytic.views import retrain_models_all, get_predictions
 
 from django.shortcuts import redirect
@@ -26,6 +27,10 @@ urlpatterns = [
     path("get_predictions/", get_predictions, name="get_predictions"),
     path("retrain_models_all/", retrain_models_all, name="retrain_models_all"),
 
+    # 🔬 Профили производительности (только staff, см. diary_analytic/profiling.py)
+    path("admin/profiles/", admin.site.admin_view(profiles_view), name="diary_profiles"),
+    path("admin/profiles/<str:name>", admin.site.admin_view(profile_file), name="diary_profile_file"),
+
     path('admin/', admin.site.urls),
 
     # ⬇️ 👇 редирект с корня "/" на /add/?date=YYYY-MM-DD
@@ -1,5 +1,9 @@
 from django.contrib import admin, messages
 from django import forms
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404
 from django.shortcuts import redirect
 from django.urls import path
 from django.template.response import TemplateResponse
@@ -8,11 +12,18 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
 import os
+from datetime import date, datetime, timedelta
 import pandas as pd
 from slugify import slugify
 
-from .models import Entry, EntryValue, Parameter
+from .models import ChangeLog, Entry, EntryValue, Parameter
 from .importers.excel_entry_importer import import_excel_dataframe
+from . import archive, profiling, write_queue
+
+# Сколько дней на одной странице сетки «параметры × даты»
+GRID_DAYS = 14
+# Сколько ждать подтверждения записи правок сетки (сек)
+GRID_WRITE_TIMEOUT = 30
 
 
 # 📥 Форма для загрузки Excel-файла
@@ -20,6 +31,23 @@ class ExcelImportForm(forms.Form):
     excel_file = forms.FileField(label="Excel-файл с данными")
 
 
+# 🧊 Значение нельзя добавить или изменить в архивном году (см. archive.py)
+class EntryValueAdminForm(forms.ModelForm):
+    class Meta:
+        model = EntryValue
+        fields = "__all__"
+
+    def clean(self):
+        cleaned = super().clean()
+        entry = cleaned.get("entry")
+        if entry is not None:
+            try:
+                archive.check_writable(entry.date)
+            except archive.ArchivedPeriodError as e:
+                raise forms.ValidationError(str(e))
+        return cleaned
+
+
 @admin.register(Parameter)
 class ParameterAdmin(admin.ModelAdmin):
     list_display = ("key", "name", "is_active")
@@ -69,16 +97,189 @@ class EntryAdmin(admin.ModelAdmin):
     list_filter = ("date",)
     search_fields = ("date",)
     date_hierarchy = "date"
+    # Без COUNT(*) всей таблицы на каждой странице
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Значения всех строк страницы — одним запросом, а не по запросу на строку
+        values = EntryValue.objects.select_related("parameter").order_by("parameter__name")
+        return super().get_queryset(request).prefetch_related(Prefetch("entryvalue_set", queryset=values))
 
     def get_values(self, obj):
-        values = obj.entryvalue_set.select_related("parameter")
-        return ", ".join(f"{v.parameter.name}: {v.value}" for v in values)
+        return ", ".join(f"{v.parameter.name}: {v.value}" for v in obj.entryvalue_set.all())
     get_values.short_description = "Значения параметров"
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path("grid/", self.admin_site.admin_view(self.grid_view), name="diary_analytic_entry_grid"),
+        ]
+        return custom_urls + urls
+
+    # -----------------------------------------------------------------
+    # 🧮 Сетка «параметры × даты» с правкой ячеек
+    # -----------------------------------------------------------------
+
+    def grid_view(self, request):
+        """
+        Страница сетки: GRID_DAYS дней, заканчивая ?end=YYYY-MM-DD (по умолчанию —
+        последний день дневника). Данные страницы — два запроса (параметры и
+        значения за диапазон дат), независимо от длины истории.
+        POST — изменённые ячейки (c_<parameter_id>_<YYYYMMDD>), пустая ячейка удаляет
+        значение; всё пишется одной группой через очередь записи (write_queue.py).
+        Без права change сетка только для просмотра, POST — 403.
+        """
+        can_change = self.has_change_permission(request)
+        if request.method == "POST" and not can_change:
+            raise PermissionDenied
+        end = self._grid_end(request)
+        start = end - timedelta(days=GRID_DAYS - 1)
+        dates = [start + timedelta(days=i) for i in range(GRID_DAYS)]
+        parameters = list(Parameter.objects.filter(is_active=True).order_by("name").only("id", "key", "name"))
+        values = {
+            (d, pid): value
+            for d, pid, value in EntryValue.objects
+            .filter(entry__date__range=(start, end))
+            .values_list("entry__date", "parameter_id", "value")
+        }
+        # Дни архивных лет — из архива (только просмотр: запись туда отклоняется)
+        for d, pid, value in archive.values_between(start, end):
+            values.setdefault((d, pid), value)
+
+        if request.method == "POST":
+            return self._grid_save(request, dates, parameters, values)
+
+        rows = [
+            (parameter, [(f"c_{parameter.id}_{d:%Y%m%d}", values.get((d, parameter.id))) for d in dates])
+            for parameter in parameters
+        ]
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Значения: {start:%d.%m.%Y} — {end:%d.%m.%Y}",
+            "opts": self.model._meta,
+            "dates": dates,
+            "rows": rows,
+            "prev_end": start - timedelta(days=1),
+            "next_end": end + timedelta(days=GRID_DAYS),
+            "end": end,
+            "can_change": can_change,
+        }
+        return TemplateResponse(request, "admin/diary_analytic/entry/grid.html", context)
+
+    @staticmethod
+    def _grid_end(request) -> date:
+        raw = request.GET.get("end")
+        if raw:
+            try:
+                return datetime.strptime(raw, "%Y-%m-%d").date()
+            except ValueError:
+                pass
+        last = Entry.objects.order_by("-date").values_list("date", flat=True).first()
+        return last or date.today()
+
+    def _grid_save(self, request, dates, parameters, values):
+        by_id = {p.id: p for p in parameters}
+        by_day = {f"{d:%Y%m%d}": d for d in dates}
+        changes, errors = [], []
+        for name, raw in request.POST.items():
+            if not name.startswith("c_"):
+                continue
+            try:
+                _, pid, day = name.split("_")
+                parameter, d = by_id[int(pid)], by_day[day]
+            except (ValueError, KeyError):
+                continue  # ячейка не с этой страницы
+            raw = raw.strip().replace(",", ".")
+            try:
+                value = float(raw) if raw else None
+            except ValueError:
+                errors.append(f"{parameter.key} ({d}): «{raw}» — не число")
+                continue
+            if value is not None and not 0 <= value <= 5:
+                errors.append(f"{parameter.key} ({d}): {value} вне диапазона 0–5")
+                continue
+            if value != values.get((d, parameter.id)):
+                changes.append((d, parameter.key, value))
+
+        coordinator = write_queue.get_write_coordinator()
+        if write_queue.is_enabled():
+            futures = coordinator.submit_many(changes)
+        else:
+            # Очередь выключена (DIARY_WRITE_QUEUE=False) — как update_value, пишем в потоке
+            # запроса: внутри транзакции координатор фиксирует группу сразу, без писателя
+            with transaction.atomic():
+                futures = coordinator.submit_many(changes)
+        saved = 0
+        for future in futures:
+            try:
+                future.result(timeout=GRID_WRITE_TIMEOUT)
+                saved += 1
+            except Exception as e:
+                errors.append(f"запись не удалась: {e!r}")
+        if saved:
+            self.message_user(request, f"✅ Сохранено значений: {saved}", messages.SUCCESS)
+        for error in errors:
+            self.message_user(request, f"❌ {error}", messages.ERROR)
+        return redirect(f"{request.path}?end={dates[-1]:%Y-%m-%d}")
+
 
 @admin.register(EntryValue)
 class EntryValueAdmin(admin.ModelAdmin):
+    form = EntryValueAdminForm
     list_display = ("entry", "parameter", "value")
-    list_filter = ("parameter", "entry__date")
+    # Строка списка выводит entry и parameter — без запроса на каждую
+    list_select_related = ("entry", "parameter")
+    # Даты — через date_hierarchy; отдельный фильтр по entry__date дублировал его
+    list_filter = ("parameter",)
+    show_full_result_count = False
     search_fields = ("parameter__name", "entry__date")
     date_hierarchy = "entry__date"
+
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    """Журнал изменений для синхронизации (см. changelog.py) — только просмотр."""
+
+    list_display = ("id", "changed_at", "origin", "kind", "date", "key", "value")
+    list_filter = ("kind", "origin")
+    search_fields = ("key",)
+    date_hierarchy = "changed_at"
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# --------------------------------------------------------------------
+# 🔬 Профили cProfile/tracemalloc (см. profiling.py)
+# Страница не привязана к модели — маршруты в config/urls.py через admin_view
+# --------------------------------------------------------------------
+
+def profiles_view(request):
+    """Список сохранённых профилей: запрос/команда, время, пик памяти, шаги."""
+    context = {
+        **admin.site.each_context(request),
+        "title": "Профили производительности",
+        "profiles": profiling.list_profiles(),
+        "profiles_dir": profiling.profiles_dir(),
+        "header": profiling.PROFILE_HEADER,
+        "param": profiling.PROFILE_PARAM,
+        "env": profiling.PROFILE_ENV,
+    }
+    return TemplateResponse(request, "admin/diary_analytic/profiles.html", context)
+
+
+def profile_file(request, name):
+    """Отчёт .txt — в браузере, статистика .prof — скачиванием."""
+    path = profiling.profile_path(name)
+    if path is None:
+        raise Http404("Нет такого профиля")
+    if name.endswith(".txt"):
+        return FileResponse(open(path, "rb"), content_type="text/plain; charset=utf-8")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
@@ -7,3 +7,7 @@ class DiaryAnalyticConfig(AppConfig):
 
     def ready(self):
         import diary_analytic.signals
+        from diary_analytic import profiling
+
+        # DIARY_PROFILE=1 python manage.py <команда> — профиль всего запуска
+        profiling.start_command_profile()
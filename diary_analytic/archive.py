@@ -0,0 +1,425 @@
+# diary_analytic/archive.py
+
+"""
+🧊 archive.py — архив закрытых лет в сжатых столбцовых файлах
+
+Прошлые годы дневника уже не меняются, но каждый снимок (snapshot.py),
+экспорт и админка читают их из EntryValue вместе со свежими днями.
+Архив выносит закрытые годы из живой таблицы в файлы:
+
+    <БД>.archive/                 (например, db.sqlite3.archive/, см. archive_dir)
+        manifest.json             ← список периодов: файл, границы, строк, sha256
+        2023.npz                  ← np.savez_compressed, столбцы одинаковой длины:
+                                     days (int32, дни от 1970-01-01),
+                                     parameter_ids (int32), values (float64)
+
+Записи Entry (даты и комментарии) остаются в БД — поиск и страница дня их
+видят как раньше; в архив уходят только значения параметров.
+
+Чтение прозрачно объединяет архив и живую таблицу:
+    - DiaryMatrix.from_db() — union_triples() (снимок, история, обучение, прогнозы);
+    - export.iter_export_rows() — ArchivedValues по годам, потоково;
+    - add_entry и сетка админки — values_between().
+
+Архивные периоды закрыты для записи: update_value, очередь записи и импорт
+получают ArchivedPeriodError (сначала manage.py unarchive <год>).
+Ключи параметров в архив не пишутся (только id), поэтому переименование
+параметра архив не затрагивает; значения удалённых параметров при чтении
+отбрасываются, как и при каскадном удалении.
+
+Команды:
+    python manage.py archive               # все закрытые годы до текущего
+    python manage.py archive 2023 --vacuum
+    python manage.py unarchive 2023
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from .loggers import db_logger
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+# Порция строк для bulk_create при разархивации
+BULK_BATCH = 2000
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+class ArchivedPeriodError(Exception):
+    """Запись в день архивного периода."""
+
+    def __init__(self, day: date, period: str):
+        super().__init__(f"{day} в архивном периоде {period} (manage.py unarchive {period})")
+        self.day = day
+        self.period = period
+
+
+def archive_dir() -> Path | None:
+    """
+    DIARY_ARCHIVE_DIR или каталог <файл БД>.archive рядом с БД — архив едет
+    вместе с файлом БД (копия для loadtest, DIARY_DB_PATH). У БД в памяти
+    (тесты) архива нет.
+    """
+    configured = getattr(settings, "DIARY_ARCHIVE_DIR", None)
+    if configured:
+        return Path(configured)
+    name = str(connection.settings_dict.get("NAME") or "")
+    if not name or name == ":memory:" or name.startswith("file:") or "mode=memory" in name:
+        return None
+    return Path(f"{name}.archive")
+
+
+# --------------------------------------------------------------------
+# 📋 Манифест
+# --------------------------------------------------------------------
+
+# Манифест перечитывается, только если файл изменился (mtime + размер)
+_manifest_cache = {}
+_lock = threading.Lock()
+
+
+def read_manifest() -> dict:
+    directory = archive_dir()
+    empty = {"format": FORMAT_VERSION, "partitions": []}
+    if directory is None:
+        return empty
+    path = directory / MANIFEST_FILE
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return empty
+    stamp = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _manifest_cache.get("manifest")
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    with _lock:
+        _manifest_cache["manifest"] = (stamp, manifest)
+    return manifest
+
+
+def _write_manifest(directory: Path, manifest: dict):
+    manifest["partitions"].sort(key=lambda p: p["from"])
+    tmp = directory / f".{MANIFEST_FILE}-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, directory / MANIFEST_FILE)
+
+
+def partitions() -> list[dict]:
+    return read_manifest()["partitions"]
+
+
+def archived_period(day: date) -> str | None:
+    """Период архива, в который попадает день (или None)."""
+    iso = day.isoformat()
+    for part in partitions():
+        if part["from"] <= iso <= part["to"]:
+            return part["period"]
+    return None
+
+
+def check_writable(day: date):
+    """:raises ArchivedPeriodError: день в архивном периоде"""
+    period = archived_period(day)
+    if period is not None:
+        raise ArchivedPeriodError(day, period)
+
+
+# --------------------------------------------------------------------
+# 📦 Файлы периодов
+# --------------------------------------------------------------------
+
+# Распакованные периоды: file → (sha256, days, parameter_ids, values)
+_partition_cache = {}
+
+
+def _load_partition(part: dict) -> tuple:
+    """(days datetime64[D], parameter_ids int32, values float64) периода."""
+    key = part["file"]
+    with _lock:
+        cached = _partition_cache.get(key)
+    if cached is not None and cached[0] == part["sha256"]:
+        return cached[1:]
+    with np.load(archive_dir() / part["file"]) as data:
+        arrays = (
+            _EPOCH + data["days"].astype("timedelta64[D]"),
+            data["parameter_ids"],
+            data["values"],
+        )
+    with _lock:
+        _partition_cache[key] = (part["sha256"],) + arrays
+    return arrays
+
+
+def _write_partition(directory: Path, period: str, start: date, end: date, days, parameter_ids, values) -> dict:
+    order = np.lexsort((parameter_ids, days))
+    days, parameter_ids, values = days[order], parameter_ids[order], values[order]
+    name = f"{period}.npz"
+    tmp = directory / f".{period}-{os.getpid()}.npz"
+    np.savez_compressed(
+        tmp,
+        days=(days - _EPOCH).astype(np.int32),
+        parameter_ids=parameter_ids.astype(np.int32),
+        values=values.astype(np.float64),
+    )
+    with open(tmp, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    os.replace(tmp, directory / name)
+    return {
+        "period": period,
+        "file": name,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "rows": int(len(days)),
+        "days": int(len(np.unique(days))),
+        "bytes": (directory / name).stat().st_size,
+        "sha256": digest,
+        "created": time.time(),
+    }
+
+
+def _year_bounds(year: int) -> tuple[date, date]:
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+# --------------------------------------------------------------------
+# 📖 Чтение: объединение с живой таблицей
+# --------------------------------------------------------------------
+
+def archived_arrays() -> tuple | None:
+    """
+    Все архивные значения: (dates, parameter_ids, values) или None, если архива нет.
+    """
+    parts = partitions()
+    if not parts:
+        return None
+    loaded = [_load_partition(part) for part in parts]
+    return tuple(np.concatenate(column) for column in zip(*loaded))
+
+
+def union_triples(live: list) -> tuple:
+    """
+    Живые тройки (дата, ключ, значение) + архив с ключами по текущим id параметров.
+    Если пара (дата, параметр) есть и там, и там (прерванная архивация),
+    побеждает живая таблица.
+    :return: (dates, keys, values) — параллельные последовательности
+    """
+    archived = archived_arrays()
+    if archived is None:
+        return tuple(zip(*live)) if live else ((), (), ())
+    from .models import Parameter
+
+    days, parameter_ids, values = archived
+    id_to_key = dict(Parameter.objects.values_list("id", "key"))
+    keys = np.array([id_to_key.get(pid) for pid in parameter_ids.tolist()], dtype=object)
+    # Значения удалённых параметров отбрасываются
+    known = np.array([key is not None for key in keys], dtype=bool)
+    if not live:
+        return days[known], keys[known], values[known]
+
+    live_dates, live_keys, live_values = zip(*live)
+    live_dates = np.array(live_dates, dtype="datetime64[D]")
+    live_keys = np.array(live_keys, dtype=object)
+    recent = live_dates <= days.max()
+    if recent.any():
+        overlap = set(zip(live_dates[recent].tolist(), live_keys[recent].tolist()))
+        known &= np.array([pair not in overlap for pair in zip(days.tolist(), keys.tolist())], dtype=bool)
+    return (
+        np.concatenate((days[known], live_dates)),
+        np.concatenate((keys[known], live_keys)),
+        np.concatenate((values[known], np.asarray(live_values, dtype=np.float64))),
+    )
+
+
+def values_between(start: date, end: date) -> list[tuple]:
+    """Архивные (date, parameter_id, value) за [start, end] — для страниц отдельных дней."""
+    out = []
+    lo, hi = start.isoformat(), end.isoformat()
+    for part in partitions():
+        if part["to"] < lo or part["from"] > hi:
+            continue
+        days, parameter_ids, values = _load_partition(part)
+        a = np.searchsorted(days, np.datetime64(start, "D"))
+        b = np.searchsorted(days, np.datetime64(end, "D"), side="right")
+        out.extend(zip(days[a:b].astype(object).tolist(), parameter_ids[a:b].tolist(), values[a:b].tolist()))
+    return out
+
+
+class ArchivedValues:
+    """
+    Значения архивных дат для потокового экспорта (даты идут по убыванию):
+    в памяти распакован только один период.
+    """
+
+    def __init__(self):
+        self._parts = partitions()
+        self._period = None
+        self._by_date = {}
+
+    def get(self, day: date) -> list[tuple]:
+        """[(parameter_id, value), ...] за день или []."""
+        if not self._parts:
+            return []
+        iso = day.isoformat()
+        part = next((p for p in self._parts if p["from"] <= iso <= p["to"]), None)
+        if part is None:
+            return []
+        if part["period"] != self._period:
+            days, parameter_ids, values = _load_partition(part)
+            self._by_date = {}
+            for d, pid, value in zip(days.astype(object).tolist(), parameter_ids.tolist(), values.tolist()):
+                self._by_date.setdefault(d, []).append((pid, value))
+            self._period = part["period"]
+        return self._by_date.get(day, [])
+
+
+# --------------------------------------------------------------------
+# 🧊 Архивация и разархивация
+# --------------------------------------------------------------------
+
+def closed_years(today: date | None = None) -> list[int]:
+    """Годы с живыми значениями, закончившиеся до текущего."""
+    from .models import EntryValue
+
+    today = today or date.today()
+    first = EntryValue.objects.order_by("entry__date").values_list("entry__date", flat=True).first()
+    if first is None:
+        return []
+    return list(range(first.year, today.year))
+
+
+def _raw_delete_values(start: date, end: date) -> int:
+    """
+    Удаляет значения за период одним DELETE, без сигналов на каждую строку
+    (версия данных растёт один раз — в schedule_data_refresh).
+    """
+    from .models import Entry, EntryValue
+
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(EntryValue._meta.db_table)} WHERE entry_id IN "
+            f"(SELECT id FROM {qn(Entry._meta.db_table)} WHERE date BETWEEN %s AND %s)",
+            [start, end],
+        )
+        return cursor.rowcount
+
+
+def archive_year(year: int, today: date | None = None) -> dict | None:
+    """
+    Переносит значения года в архив и удаляет их из EntryValue.
+    Файл и манифест пишутся до DELETE в той же транзакции: если она откатится,
+    данные окажутся и там, и там (union_triples берёт живые), а не потеряются.
+    :return: запись манифеста или None, если за год нет значений
+    """
+    from .models import EntryValue
+    from .signals import schedule_data_refresh
+
+    today = today or date.today()
+    if year >= today.year:
+        raise ValueError(f"{year} ещё не закрыт — архивируются только прошедшие годы")
+    directory = archive_dir()
+    if directory is None:
+        raise ValueError("у этой БД нет каталога архива (БД в памяти?)")
+    start, end = _year_bounds(year)
+    period = str(year)
+
+    with transaction.atomic():
+        rows = list(
+            EntryValue.objects.filter(entry__date__range=(start, end))
+            .values_list("entry__date", "parameter_id", "value")
+        )
+        manifest = read_manifest()
+        existing = next((p for p in manifest["partitions"] if p["period"] == period), None)
+        if not rows:
+            return existing
+
+        days = np.array([r[0] for r in rows], dtype="datetime64[D]")
+        parameter_ids = np.array([r[1] for r in rows], dtype=np.int32)
+        values = np.array([r[2] for r in rows], dtype=np.float64)
+        if existing is not None:
+            # Дописываем к уже архивному году (живые значения новее архивных)
+            old_days, old_ids, old_values = _load_partition(existing)
+            fresh = set(zip(days.tolist(), parameter_ids.tolist()))
+            keep = np.array([(d, p) not in fresh for d, p in zip(old_days.tolist(), old_ids.tolist())], dtype=bool)
+            days = np.concatenate((old_days[keep], days))
+            parameter_ids = np.concatenate((old_ids[keep], parameter_ids))
+            values = np.concatenate((old_values[keep], values))
+
+        directory.mkdir(parents=True, exist_ok=True)
+        part = _write_partition(directory, period, start, end, days, parameter_ids, values)
+        manifest = {
+            "format": FORMAT_VERSION,
+            "partitions": [p for p in manifest["partitions"] if p["period"] != period] + [part],
+        }
+        _write_manifest(directory, manifest)
+        deleted = _raw_delete_values(start, end)
+        schedule_data_refresh()
+    db_logger.info(f"[archive] 🧊 {period}: в архив {part['rows']} значений ({part['bytes']} байт), из БД удалено {deleted}")
+    return part
+
+
+def unarchive_year(year: int) -> int:
+    """
+    Возвращает значения года в EntryValue. Манифест и файл меняются только
+    после коммита — при откате архив остаётся как был.
+    :return: число восстановленных значений
+    """
+    from .models import Entry, EntryValue, Parameter
+    from .signals import schedule_data_refresh
+
+    period = str(year)
+    directory = archive_dir()
+    manifest = read_manifest()
+    part = next((p for p in manifest["partitions"] if p["period"] == period), None)
+    if part is None:
+        return 0
+    days, parameter_ids, values = _load_partition(part)
+    day_list = days.astype(object).tolist()
+
+    with transaction.atomic():
+        known = set(Parameter.objects.values_list("id", flat=True))
+        entry_ids = dict(Entry.objects.filter(date__in=set(day_list)).values_list("date", "id"))
+        missing = sorted(set(day_list) - set(entry_ids))
+        if missing:
+            Entry.objects.bulk_create([Entry(date=d) for d in missing], batch_size=BULK_BATCH)
+            entry_ids = dict(Entry.objects.filter(date__in=set(day_list)).values_list("date", "id"))
+        start, end = _year_bounds(year)
+        live = set(
+            EntryValue.objects.filter(entry__date__range=(start, end)).values_list("entry_id", "parameter_id")
+        )
+        objs = [
+            EntryValue(entry_id=entry_ids[d], parameter_id=pid, value=value)
+            for d, pid, value in zip(day_list, parameter_ids.tolist(), values.tolist())
+            if pid in known and (entry_ids[d], pid) not in live
+        ]
+        EntryValue.objects.bulk_create(objs, batch_size=BULK_BATCH)
+        # Значения те же, что были в архиве, — прогнозы пересчитывать не нужно
+        schedule_data_refresh()
+
+        def drop_partition():
+            current = read_manifest()
+            _write_manifest(directory, {
+                "format": FORMAT_VERSION,
+                "partitions": [p for p in current["partitions"] if p["period"] != period],
+            })
+            (directory / part["file"]).unlink(missing_ok=True)
+
+        transaction.on_commit(drop_partition)
+    db_logger.info(f"[archive] ♨️ {period}: возвращено в БД {len(objs)} значений")
+    return len(objs)
@@ -0,0 +1,176 @@
+# diary_analytic/async_views.py
+
+"""
+⚡ async_views.py — async-варианты API прогнозов и истории (для ASGI)
+
+Синхронные вьюхи держат воркер на всё время запроса, а diary.js при открытии
+дня запрашивает историю ~100 параметров разом. Здесь те же ответы, но:
+
+    - CPU и диск (матрица, модели, SQLite) уходят в ограниченный пул потоков
+      (DIARY_ASYNC_WORKERS), цикл событий только принимает и отдаёт запросы;
+    - стратегии без предрасчёта считаются параллельно (asyncio.gather);
+    - формат ответов совпадает с views.py (общие функции history_payload и т.п.).
+
+Запуск под ASGI: python manage.py runasgi (см. management/commands/runasgi.py).
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from . import prediction_store
+from .json_response import FastJsonResponse, SCHEMAS
+from .predictor_manager import PredictorManager
+from .utils import get_today_row
+from .views import (
+    flatten_predictions, history_payload, parse_history_options, parse_range_options, predictions_range_payload,
+)
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Общий пул для блокирующей работы async-вьюх (создаётся при первом запросе)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "DIARY_ASYNC_WORKERS", 8),
+            thread_name_prefix="diary-async",
+        )
+    return _executor
+
+
+def _with_fresh_connection(fn, *args, **kwargs):
+    """
+    Соединения с БД в потоках пула живут своей жизнью: request_started /
+    request_finished закрывают только соединение потока запроса. Поэтому, как
+    Django на границах запроса, закрываем устаревшие (CONN_MAX_AGE, ошибки)
+    до и после каждого вызова.
+    """
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Выполняет fn в пуле потоков. Контекст (версия данных запроса из
+    DataVersionMiddleware) передаётся в поток вместе с вызовом.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, _with_fresh_connection, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+# --------------------------------------------------------------------
+# 🔮 Прогнозы всех стратегий — параллельно
+# --------------------------------------------------------------------
+
+def _predict_for_date(strategy: str, date) -> dict:
+    return PredictorManager(strategy).predict_for_date(date)
+
+
+async def predictions_by_models(date, model_names=None) -> dict:
+    """
+    Async-аналог views.get_predictions_by_models: {strategy: {param_key: value}}.
+    Стратегии без предрасчёта считаются одновременно, каждая в своём потоке пула.
+    """
+    model_names = model_names or prediction_store.STRATEGIES
+    predictions = {}
+    if prediction_store.is_enabled():
+        predictions = await run_blocking(prediction_store.get_stored_predictions, date, model_names)
+    missing = [name for name in model_names if name not in predictions]
+    if missing:
+        for name in missing:
+            prediction_store.note_fallback(name, date)
+        results = await asyncio.gather(*(run_blocking(_predict_for_date, name, date) for name in missing))
+        predictions.update(zip(missing, results))
+    return predictions
+
+
+@require_GET
+async def get_predictions(request):
+    """То же, что views.get_predictions: {"key_strategy": value}."""
+    date_str = request.GET.get("date")
+    if not date_str:
+        return JsonResponse({"error": "missing date"}, status=400)
+    selected_date = _parse_date(date_str)
+    if selected_date is None:
+        return JsonResponse({"error": "invalid date"}, status=400)
+
+    row = await run_blocking(get_today_row, selected_date)
+    if not row:
+        return JsonResponse({"error": "no data"}, status=404)
+
+    predictions = await predictions_by_models(selected_date, ["base"])
+    return FastJsonResponse(flatten_predictions(predictions))
+
+
+@require_GET
+async def predictions_block(request):
+    """
+    Блок прогнозов страницы дня (add_entry → predictions_by_model) отдельным запросом:
+    {strategy: {param_key: value}} по всем стратегиям.
+    """
+    selected_date = _parse_date(request.GET.get("date"))
+    if selected_date is None:
+        return JsonResponse({"error": "invalid date"}, status=400)
+    return FastJsonResponse(await predictions_by_models(selected_date))
+
+
+# --------------------------------------------------------------------
+# 📊 История параметра
+# --------------------------------------------------------------------
+
+@require_GET
+async def parameter_history(request):
+    """То же, что views.parameter_history (GET: param, date, from, max_points, schema)."""
+    param_key = request.GET.get("param")
+    date_str = request.GET.get("date")
+    schema = request.GET.get("schema", "rows")
+    if not param_key or not date_str:
+        return JsonResponse({"error": "missing param or date"}, status=400)
+    if schema not in SCHEMAS:
+        return JsonResponse({"error": "invalid schema"}, status=400)
+    to_date = _parse_date(date_str)
+    if to_date is None:
+        return JsonResponse({"error": "invalid date"}, status=400)
+    try:
+        date_from, max_points = parse_history_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    payload = await run_blocking(history_payload, param_key, to_date, schema, date_from, max_points)
+    return FastJsonResponse(payload)
+
+
+# --------------------------------------------------------------------
+# 📈 Прогнозы и факт на диапазон дат
+# --------------------------------------------------------------------
+
+@require_GET
+async def predictions_range(request):
+    """То же, что views.predictions_range (GET: from, to, strategy, params)."""
+    try:
+        date_from, date_to, strategies, params = parse_range_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    payload = await run_blocking(predictions_range_payload, date_from, date_to, strategies, params)
+    return FastJsonResponse(payload)
@@ -0,0 +1,161 @@
+# diary_analytic/backtest.py
+
+"""
+📉 backtest.py — walk-forward проверка качества прогнозов
+
+Для каждого параметра и каждого дня с известным значением строится прогноз
+моделью, обученной только на предыдущих днях (расширяющееся окно), и
+считаются ошибки MAE / RMSE.
+
+Переобучать LinearRegression на каждой отсечке — O(дни × параметры) полных
+обучений. Вместо этого накапливаются достаточные статистики (XᵀX, Xᵀy, Σx, Σy)
+и на каждой отсечке решается та же задача, что решает sklearn:
+центрированные нормальные уравнения с псевдообратной матрицей
+(решение минимальной нормы, как у lstsq при n < p).
+
+Семантика данных повторяет обучение стратегий base/flags:
+    - признаки — все остальные параметры того же дня;
+    - в обучение идут только строки без пропусков в признаках и с известным y;
+    - при прогнозе пропуски заменяются на 0.0 (как в PredictorManager).
+"""
+
+import numpy as np
+
+from .diary_matrix import DiaryMatrix
+
+# Стратегии, для которых есть бэктест (обе используют признаки того же дня)
+STRATEGIES = ["base", "flags"]
+
+# Отсечение малых сингулярных чисел при псевдообращении матрицы Грама
+RCOND = 1e-10
+
+
+def _same_day_design(values: np.ndarray, mask: np.ndarray, t: int):
+    """
+    Признаки стратегий base/flags для параметра t: остальные столбцы того же дня.
+    :return: (X с пропусками → 0.0, y, строки для обучения, строки для проверки)
+    """
+    others = np.arange(values.shape[1]) != t
+    X = np.where(mask[:, others], values[:, others], 0.0)
+    y = values[:, t]
+    has_y = mask[:, t]
+    train = has_y & mask[:, others].all(axis=1)
+    return X, y, train, has_y
+
+
+# Стратегия → построитель признаков (точка расширения для новых стратегий)
+DESIGNS = {
+    "base": _same_day_design,
+    "flags": _same_day_design,
+}
+
+
+def backtest_target(X: np.ndarray, y: np.ndarray, train: np.ndarray, test: np.ndarray, min_train: int = 3):
+    """
+    Walk-forward по одному параметру.
+
+    :param X: признаки (n × q), строки упорядочены по дате
+    :param y: целевые значения (n)
+    :param train: какие строки можно использовать для обучения
+    :param test: для каких строк считать прогноз
+    :param min_train: минимум обучающих строк до отсечки (≥ 1)
+    :return: (индексы строк, прогнозы)
+    """
+    if min_train < 1:
+        # При k = 0 средние — деление на ноль, прогнозы — NaN
+        raise ValueError("min_train должен быть не меньше 1")
+    # Сколько обучающих строк лежит строго до каждой строки
+    prefix = np.concatenate([[0], np.cumsum(train)])[:-1]
+    test_rows = np.flatnonzero(test & (prefix >= min_train))
+    if not len(test_rows):
+        return test_rows, np.array([])
+
+    train_rows = np.flatnonzero(train)
+    q = X.shape[1]
+    G = np.zeros((q, q))   # Σ x xᵀ
+    Sxy = np.zeros(q)      # Σ x y
+    Sx = np.zeros(q)       # Σ x
+    Sy = 0.0               # Σ y
+    used = 0
+    preds = np.empty(len(test_rows))
+
+    # Отсечки: уникальные размеры обучающей выборки, по возрастанию
+    cutoffs = prefix[test_rows]
+    for k in np.unique(cutoffs):
+        # Инкрементально добавляем строки, вошедшие в окно с прошлой отсечки
+        block = train_rows[used:k]
+        Xb, yb = X[block], y[block]
+        G += Xb.T @ Xb
+        Sxy += Xb.T @ yb
+        Sx += Xb.sum(axis=0)
+        Sy += yb.sum()
+        used = k
+
+        # Центрированные нормальные уравнения (так считает LinearRegression)
+        x_mean, y_mean = Sx / k, Sy / k
+        C = G - k * np.outer(x_mean, x_mean)
+        c = Sxy - k * x_mean * y_mean
+        w = np.linalg.pinv(C, rcond=RCOND, hermitian=True) @ c
+        b = y_mean - x_mean @ w
+
+        at_cutoff = cutoffs == k
+        preds[at_cutoff] = X[test_rows[at_cutoff]] @ w + b
+    return test_rows, preds
+
+
+def run_backtest(matrix: DiaryMatrix, strategies=None, min_train: int = 3, targets=None) -> dict:
+    """
+    Walk-forward бэктест всех параметров по выбранным стратегиям.
+
+    :return: {
+        strategy: {
+            "targets": {key: {"n": ..., "mae": ..., "rmse": ..., "baseline_mae": ...}},
+            "summary": {"targets": ..., "n": ..., "mae": ..., "rmse": ...},
+        }
+    }
+    baseline_mae — ошибка прогноза «среднее по прошлым дням», для сравнения.
+    """
+    strategies = strategies or STRATEGIES
+    values = matrix.to_float_array()
+    mask = ~np.isnan(values)
+    keys = matrix.keys
+    wanted = set(targets) if targets else None
+
+    results = {}
+    for strategy in strategies:
+        design = DESIGNS[strategy]
+        per_target = {}
+        all_errors = []
+        for t, key in enumerate(keys):
+            if wanted is not None and key not in wanted:
+                continue
+            X, y, train, test = design(values, mask, t)
+            rows, preds = backtest_target(X, y, train, test, min_train=min_train)
+            if not len(rows):
+                continue
+            errors = preds - y[rows]
+
+            # Наивный прогноз: среднее y по обучающим строкам до отсечки
+            cum_y = np.concatenate([[0.0], np.cumsum(np.where(train, y, 0.0))])[:-1]
+            cum_n = np.concatenate([[0], np.cumsum(train)])[:-1]
+            baseline = cum_y[rows] / cum_n[rows] - y[rows]
+
+            per_target[key] = {
+                "n": int(len(rows)),
+                "mae": round(float(np.abs(errors).mean()), 4),
+                "rmse": round(float(np.sqrt((errors ** 2).mean())), 4),
+                "baseline_mae": round(float(np.abs(baseline).mean()), 4),
+            }
+            all_errors.append(errors)
+
+        errors = np.concatenate(all_errors) if all_errors else np.array([])
+        results[strategy] = {
+            "targets": per_target,
+            "summary": {
+                "targets": len(per_target),
+                "n": int(len(errors)),
+                "mae": round(float(np.abs(errors).mean()), 4) if len(errors) else None,
+                "rmse": round(float(np.sqrt((errors ** 2).mean())), 4) if len(errors) else None,
+            },
+        }
+    return results
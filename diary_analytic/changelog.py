@@ -0,0 +1,345 @@
+# diary_analytic/changelog.py
+
+"""
+🔁 changelog.py — журнал изменений (CDC) и синхронизация устройств дельтами
+
+Раньше между машинами синхронизировался весь файл SQLite (закомментированный
+путь sync/db/db.sqlite3 в settings): медленно и с конфликтами при правках на
+двух устройствах. Теперь каждое изменение пишется в таблицу ChangeLog:
+
+    - сигналы EntryValue / Entry / Parameter (signals.py) — одиночные записи;
+    - record_values() — групповые пути без сигналов (очередь записи, импорт Excel).
+
+Синхронизация:
+    python manage.py sync_export --peer laptop   # дельта с прошлого экспорта для laptop
+    python manage.py sync_apply sync/deltas/     # применить чужие дельты
+
+Дельта — gzip-JSON со строками журнала после курсора (ChangeLog.id). Внутри
+дельты изменения сжимаются: для каждой пары (день, параметр) остаётся только
+последнее. Стоимость синхронизации зависит от числа правок, а не от размера БД.
+
+Применение идемпотентно: изменение, уже записанное в журнал, пропускается,
+а конфликт решает «последняя запись побеждает» по (changed_at, origin) для
+каждой пары (день, параметр) — и для комментария дня, и для параметра.
+Применённые изменения попадают в журнал с исходными origin и changed_at
+(поэтому их можно переслать дальше третьему устройству), а не как новые.
+
+Состояние устройства (id, курсоры экспорта, применённые файлы) лежит рядом
+с файлом БД: <БД>.sync.json — как архив (archive.py), едет вместе с БД.
+"""
+
+import contextvars
+import gzip
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .loggers import db_logger
+from .models import ChangeLog, Entry, EntryValue, Parameter
+
+FORMAT_VERSION = 1
+DELTA_PREFIX = "delta-"
+DELTA_SUFFIX = ".json.gz"
+COLUMNS = ("id", "origin", "changed_at", "kind", "date", "key", "value", "payload")
+
+# Во время применения чужой дельты сигналы не пишут журнал (изменения уже в нём)
+_replaying = contextvars.ContextVar("diary_sync_replaying", default=False)
+
+
+# --------------------------------------------------------------------
+# 🪪 Устройство и его состояние
+# --------------------------------------------------------------------
+
+def state_path() -> Path | None:
+    name = str(connection.settings_dict.get("NAME") or "")
+    if not name or name == ":memory:" or name.startswith("file:") or "mode=memory" in name:
+        return None
+    return Path(f"{name}.sync.json")
+
+
+def read_state() -> dict:
+    path = state_path()
+    if path is None or not path.exists():
+        return {"device": None, "exported": {}, "applied": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_state(state: dict):
+    path = state_path()
+    if path is None:
+        return
+    tmp = path.with_name(f".{path.name}-{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+_device = None
+
+
+def device_id() -> str:
+    """
+    DIARY_SYNC_DEVICE или id, созданный при первом обращении и сохранённый
+    в состоянии (две копии БД на одной машине — разные устройства).
+    """
+    global _device
+    configured = getattr(settings, "DIARY_SYNC_DEVICE", None)
+    if configured:
+        return configured
+    if _device is None:
+        state = read_state()
+        if not state.get("device"):
+            state["device"] = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+            write_state(state)
+        _device = state["device"]
+    return _device
+
+
+def sync_dir() -> Path:
+    return Path(getattr(settings, "DIARY_SYNC_DIR", None) or Path(settings.BASE_DIR) / "sync" / "deltas")
+
+
+# --------------------------------------------------------------------
+# ✍️ Запись в журнал
+# --------------------------------------------------------------------
+
+def capturing() -> bool:
+    return not _replaying.get()
+
+
+def record(kind: str, date=None, key: str = "", value=None, payload=None):
+    """Одно изменение (из сигналов)."""
+    if capturing():
+        ChangeLog.objects.create(
+            origin=device_id(), changed_at=datetime.now(timezone.utc),
+            kind=kind, date=date, key=key, value=value, payload=payload,
+        )
+
+
+def record_values(changes):
+    """
+    Групповая запись значений: [(date, key, value|None), ...] — для путей
+    без сигналов (bulk_create очереди записи, импорт).
+    """
+    if not capturing():
+        return
+    origin, now = device_id(), datetime.now(timezone.utc)
+    ChangeLog.objects.bulk_create([
+        ChangeLog(origin=origin, changed_at=now, kind=ChangeLog.VALUE, date=d, key=key, value=value)
+        for d, key, value in changes
+    ])
+
+
+def parameter_payload(parameter: Parameter, old_key: str | None = None) -> dict:
+    payload = {"name": parameter.name, "is_active": parameter.is_active, "description": parameter.description}
+    if old_key and old_key != parameter.key:
+        payload["old_key"] = old_key
+    return payload
+
+
+# --------------------------------------------------------------------
+# 📤 Экспорт дельты
+# --------------------------------------------------------------------
+
+def _identity(row: dict) -> tuple:
+    return row["kind"], row["date"], row["key"]
+
+
+def export_delta(since: int, exclude_origin: str | None = None, output: Path | None = None) -> tuple:
+    """
+    Пишет изменения журнала с id > since в файл дельты.
+    :param exclude_origin: не отправлять изменения этого устройства (его же правки — назад)
+    :return: (путь к файлу или None, если отправлять нечего; новый курсор; число изменений)
+    """
+    qs = ChangeLog.objects.filter(id__gt=since).order_by("id")
+    last = qs.values_list("id", flat=True).last()
+    if last is None:
+        return None, since, 0
+    if exclude_origin:
+        qs = qs.exclude(origin=exclude_origin)
+
+    # Внутри дельты достаточно последнего изменения каждой сущности
+    latest = {}
+    for row in qs.values(*COLUMNS).iterator(chunk_size=2000):
+        latest[_identity(row)] = row
+    rows = sorted(latest.values(), key=lambda r: r["id"])
+    if not rows:
+        return None, last, 0
+
+    origin = device_id()
+    output = Path(output or sync_dir())
+    output.mkdir(parents=True, exist_ok=True)
+    path = output / f"{DELTA_PREFIX}{origin}-{since + 1:09d}-{last:09d}{DELTA_SUFFIX}"
+    body = {
+        "format": FORMAT_VERSION,
+        "origin": origin,
+        "from": since,
+        "to": last,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "columns": list(COLUMNS[1:]),
+        "changes": [
+            [r["origin"], r["changed_at"].isoformat(), r["kind"],
+             r["date"].isoformat() if r["date"] else None, r["key"], r["value"], r["payload"]]
+            for r in rows
+        ],
+    }
+    tmp = path.with_name(f".{path.name}-{os.getpid()}")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(body, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path, last, len(rows)
+
+
+def read_delta(path) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        body = json.load(f)
+    if body.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path}: неизвестный формат дельты {body.get('format')}")
+    return body
+
+
+# --------------------------------------------------------------------
+# 📥 Применение дельты
+# --------------------------------------------------------------------
+
+class ApplyStats:
+    __slots__ = ("applied", "duplicate", "stale", "skipped", "dates")
+
+    def __init__(self):
+        self.applied = self.duplicate = self.stale = self.skipped = 0
+        self.dates = set()
+
+    def as_dict(self) -> dict:
+        return {"applied": self.applied, "duplicate": self.duplicate, "stale": self.stale, "skipped": self.skipped}
+
+
+def _parse_change(row: list) -> ChangeLog:
+    origin, changed_at, kind, day, key, value, payload = row
+    return ChangeLog(
+        origin=origin,
+        changed_at=datetime.fromisoformat(changed_at),
+        kind=kind,
+        date=datetime.strptime(day, "%Y-%m-%d").date() if day else None,
+        key=key or "",
+        value=value,
+        payload=payload,
+    )
+
+
+# Какие виды журнала спорят за одну сущность (для «последняя запись побеждает»)
+_RIVALS = {
+    ChangeLog.VALUE: (ChangeLog.VALUE, ChangeLog.ENTRY_DELETE),
+    ChangeLog.COMMENT: (ChangeLog.COMMENT, ChangeLog.ENTRY_DELETE),
+    ChangeLog.ENTRY_DELETE: (ChangeLog.VALUE, ChangeLog.COMMENT, ChangeLog.ENTRY_DELETE),
+    ChangeLog.PARAMETER: (ChangeLog.PARAMETER, ChangeLog.PARAMETER_DELETE),
+    ChangeLog.PARAMETER_DELETE: (ChangeLog.PARAMETER, ChangeLog.PARAMETER_DELETE),
+}
+
+
+def _newest_local(change: ChangeLog):
+    """(changed_at, origin) самого нового локального изменения той же сущности."""
+    qs = ChangeLog.objects.filter(kind__in=_RIVALS[change.kind])
+    if change.kind in (ChangeLog.PARAMETER, ChangeLog.PARAMETER_DELETE):
+        qs = qs.filter(key=change.key, date=None)
+    else:
+        qs = qs.filter(date=change.date)
+        if change.kind == ChangeLog.VALUE:
+            qs = qs.filter(key__in=(change.key, ""))
+    return qs.order_by("-changed_at", "-origin").values_list("changed_at", "origin").first()
+
+
+def apply_delta(body: dict) -> ApplyStats:
+    """
+    Применяет дельту в одной транзакции. Повторное применение того же файла
+    ничего не меняет (все изменения окажутся duplicate).
+    """
+    from . import archive
+    from .signals import schedule_data_refresh
+
+    stats = ApplyStats()
+    changes = sorted((_parse_change(row) for row in body["changes"]), key=lambda c: (c.changed_at, c.origin))
+    token = _replaying.set(True)
+    try:
+        with transaction.atomic():
+            for change in changes:
+                if ChangeLog.objects.filter(
+                    origin=change.origin, changed_at=change.changed_at,
+                    kind=change.kind, date=change.date, key=change.key,
+                ).exists():
+                    stats.duplicate += 1
+                    continue
+                newest = _newest_local(change)
+                if newest is not None and newest >= (change.changed_at, change.origin):
+                    stats.stale += 1
+                    continue
+                if change.date is not None and archive.archived_period(change.date):
+                    db_logger.warning(f"[sync] 🧊 Пропущено изменение архивного дня {change.date}: {change.kind} {change.key}")
+                    stats.skipped += 1
+                    continue
+                if _apply_change(change):
+                    change.save()
+                    stats.applied += 1
+                    if change.date is not None:
+                        stats.dates.add(change.date)
+                else:
+                    stats.skipped += 1
+            if stats.applied:
+                schedule_data_refresh(stats.dates)
+    finally:
+        _replaying.reset(token)
+    return stats
+
+
+def _apply_change(change: ChangeLog) -> bool:
+    """Применяет одно изменение к таблицам; False — применить нельзя (нет параметра и т.п.)."""
+    if change.kind == ChangeLog.VALUE:
+        parameter = Parameter.objects.filter(key=change.key).first()
+        if parameter is None:
+            db_logger.warning(f"[sync] ⚠️ Нет параметра {change.key} — значение за {change.date} пропущено")
+            return False
+        if change.value is None:
+            EntryValue.objects.filter(entry__date=change.date, parameter=parameter).delete()
+        else:
+            entry, _ = Entry.objects.get_or_create(date=change.date)
+            EntryValue.objects.update_or_create(entry=entry, parameter=parameter, defaults={"value": change.value})
+        return True
+
+    if change.kind == ChangeLog.COMMENT:
+        entry, _ = Entry.objects.get_or_create(date=change.date)
+        entry.comment = (change.payload or {}).get("comment", "")
+        entry.save(update_fields=["comment"])
+        return True
+
+    if change.kind == ChangeLog.ENTRY_DELETE:
+        Entry.objects.filter(date=change.date).delete()
+        return True
+
+    if change.kind == ChangeLog.PARAMETER:
+        payload = dict(change.payload or {})
+        old_key = payload.pop("old_key", None)
+        parameter = Parameter.objects.filter(key=change.key).first()
+        if parameter is None and old_key:
+            # Переименование: ключ меняется у существующего параметра, значения остаются
+            parameter = Parameter.objects.filter(key=old_key).first()
+        if parameter is None:
+            parameter = Parameter(key=change.key)
+        parameter.key = change.key
+        for field in ("name", "is_active", "description"):
+            if field in payload:
+                setattr(parameter, field, payload[field])
+        parameter.save()
+        return True
+
+    if change.kind == ChangeLog.PARAMETER_DELETE:
+        Parameter.objects.filter(key=change.key).delete()
+        return True
+
+    db_logger.warning(f"[sync] ⚠️ Неизвестный вид изменения: {change.kind}")
+    return False
@@ -0,0 +1,364 @@
+# diary_analytic/correlations.py
+
+"""
+🔗 correlations.py — попарные корреляции и совместная встречаемость параметров
+
+Чтобы понять, какая еда связана с какими симптомами, раньше приходилось читать
+коэффициенты моделей из trained_models/<strategy>/csv/. Здесь по всей матрице
+дневника одним векторным проходом (несколько матричных произведений) считаются:
+
+    - n  — сколько дней оба параметра заполнены (совместная встречаемость);
+    - nz — сколько дней оба параметра заполнены и не равны 0;
+    - r  — корреляция Пирсона или Спирмена с учётом пропусков (по парам дней,
+           где заполнены оба параметра).
+
+Лаг (lag=1): строки — параметры «вчера», столбцы — параметры «сегодня»,
+т.е. r[i, j] — связь значения i за день d-1 со значением j за день d.
+
+Пирсон строится из накопленных сумм (PairStats: Σx, Σy, Σx², Σy², Σxy и счётчики),
+поэтому при смене версии данных суммы не пересчитываются целиком: изменённые дни
+находятся сравнением с прошлой матрицей, их вклад вычитается и добавляется заново.
+Спирмен (ранги зависят от всех значений пары) считается заново на каждую версию;
+как и pandas corr("spearman"), ранги берутся по общим дням каждой пары отдельно.
+
+Пример:
+    result = get_correlations("pearson", lag=1)
+    result.top("toshn", min_periods=10)   → [{"key": ..., "r": ..., "n": ..., "nz": ...}, ...]
+"""
+
+import threading
+
+import numpy as np
+
+from .diary_matrix import DiaryMatrix
+from .loggers import predict_logger
+from .versioning import VersionedCache
+
+METHODS = ("pearson", "spearman")
+MAX_LAG = 7
+# Минимум общих дней, чтобы корреляция имела смысл
+MIN_PERIODS = 5
+# Если изменилась большая доля дней — дешевле пересчитать суммы целиком
+INCREMENTAL_MAX_FRACTION = 0.2
+# После стольких инкрементальных шагов подряд суммы пересчитываются с нуля
+# (дробные значения float32 иначе копили бы погрешность)
+FULL_RECOMPUTE_EVERY = 200
+
+
+# --------------------------------------------------------------------
+# 📐 Строки матрицы для матричных произведений
+# --------------------------------------------------------------------
+
+def _rows(matrix: DiaryMatrix, dates: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Значения (0 в пустых ячейках) и маска, float64. Дни, которых в матрице нет, —
+    нулевые строки, т.е. ни во что не дают вклада.
+    """
+    values, bits = matrix.rows_for_dates(dates)
+    mask = np.unpackbits(bits, axis=1, count=matrix.shape[1]).astype(np.float64)
+    return values.astype(np.float64) * mask, mask
+
+
+# --------------------------------------------------------------------
+# ➕ Накопленные суммы по парам параметров
+# --------------------------------------------------------------------
+
+class PairStats:
+    """
+    Суммы по всем парам (i, j) по дням, где заполнены оба параметра:
+    x — параметр i (для лага — «вчера»), y — параметр j («сегодня»).
+    """
+
+    __slots__ = ("n", "nz", "sx", "sy", "sxx", "syy", "sxy")
+
+    def __init__(self, size: int):
+        for name in self.__slots__:
+            setattr(self, name, np.zeros((size, size), dtype=np.float64))
+
+    def add(self, x: tuple, y: tuple, sign: float = 1.0):
+        """
+        Добавляет (sign=+1) или вычитает (sign=-1) вклад строк.
+        x, y — пары (значения, маска) одинаковой длины: k-я строка x идёт в паре с k-й строкой y.
+        """
+        vx, mx = x
+        vy, my = y
+        self.n += sign * (mx.T @ my)
+        self.nz += sign * ((vx != 0).astype(np.float64).T @ (vy != 0).astype(np.float64))
+        self.sx += sign * (vx.T @ my)
+        self.sy += sign * (mx.T @ vy)
+        self.sxx += sign * ((vx * vx).T @ my)
+        self.syy += sign * (mx.T @ (vy * vy))
+        self.sxy += sign * (vx.T @ vy)
+
+    def correlation(self) -> np.ndarray:
+        """Пирсон по накопленным суммам; NaN, где общих дней нет или параметр постоянен."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            n = np.where(self.n > 0, self.n, np.nan)
+            cov = self.sxy - self.sx * self.sy / n
+            var_x = self.sxx - self.sx * self.sx / n
+            var_y = self.syy - self.sy * self.sy / n
+            # Разность сумм может дать -1e-12 вместо 0 — постоянный ряд
+            eps = 1e-9 * np.maximum(n, 1)
+            var_x = np.where(var_x > eps, var_x, np.nan)
+            var_y = np.where(var_y > eps, var_y, np.nan)
+            r = cov / np.sqrt(var_x * var_y)
+        return np.clip(r, -1.0, 1.0)
+
+
+def _pairs(dates: np.ndarray, lag: int) -> tuple[np.ndarray, np.ndarray]:
+    """Даты «x» и «y» для пар дней: y — сам день, x — день на lag раньше."""
+    return dates - np.timedelta64(lag, "D"), dates
+
+
+def full_stats(matrix: DiaryMatrix, lag: int = 0) -> PairStats:
+    """Суммы по всей матрице за один проход."""
+    stats = PairStats(matrix.shape[1])
+    if len(matrix):
+        x_dates, y_dates = _pairs(matrix.dates, lag)
+        y = _rows(matrix, y_dates)
+        x = y if lag == 0 else _rows(matrix, x_dates)
+        stats.add(x, y)
+    return stats
+
+
+# --------------------------------------------------------------------
+# 🔁 Инкрементальное обновление между версиями данных
+# --------------------------------------------------------------------
+
+class PearsonAccumulator:
+    """
+    Суммы PairStats для одного лага + копия матрицы, по которой они посчитаны.
+    advance(matrix) доводит суммы до новой матрицы и возвращает корреляции.
+    """
+
+    def __init__(self, lag: int):
+        self.lag = lag
+        self._matrix = None
+        self._stats = None
+        self._steps = 0
+        self._lock = threading.Lock()
+        # Статистика для замеров: сколько раз пересчитывали целиком / инкрементально
+        self.full_runs = 0
+        self.incremental_runs = 0
+
+    def advance(self, matrix: DiaryMatrix) -> "CorrelationResult":
+        with self._lock:
+            changed = self._changed(matrix)
+            if changed is None:
+                self._stats = full_stats(matrix, self.lag)
+                self._steps = 0
+                self.full_runs += 1
+                predict_logger.debug(f"[correlations] lag={self.lag}: полный пересчёт {matrix.shape}")
+            elif len(changed):
+                self._apply(self._matrix, matrix, changed)
+                self._steps += 1
+                self.incremental_runs += 1
+                predict_logger.debug(f"[correlations] lag={self.lag}: обновлено дней {len(changed)}")
+            self._matrix = matrix.detached()
+            return CorrelationResult(
+                keys=matrix.keys, method="pearson", lag=self.lag,
+                r=self._stats.correlation(), n=self._stats.n.copy(), nz=self._stats.nz.copy(),
+            )
+
+    def _changed(self, matrix: DiaryMatrix):
+        """Изменённые дни или None, если нужен полный пересчёт."""
+        old = self._matrix
+        if old is None or self._stats is None or old.keys != matrix.keys:
+            return None
+        if self._steps >= FULL_RECOMPUTE_EVERY:
+            return None
+        changed = old.changed_dates(matrix)
+        if len(changed) > INCREMENTAL_MAX_FRACTION * max(len(matrix), 1):
+            return None
+        return changed
+
+    def _apply(self, old: DiaryMatrix, new: DiaryMatrix, changed: np.ndarray):
+        # Изменённый день d входит в пары (d - lag, d) и (d, d + lag)
+        y_dates = changed if self.lag == 0 else np.union1d(changed, changed + np.timedelta64(self.lag, "D"))
+        x_dates, y_dates = _pairs(y_dates, self.lag)
+        for matrix, sign in ((old, -1.0), (new, 1.0)):
+            y = _rows(matrix, y_dates)
+            x = y if self.lag == 0 else _rows(matrix, x_dates)
+            self._stats.add(x, y, sign)
+
+
+# --------------------------------------------------------------------
+# 📊 Результат
+# --------------------------------------------------------------------
+
+class CorrelationResult:
+    """
+    Матрицы r / n / nz (ключи × ключи) для одного метода и лага.
+    Для lag > 0 строки — параметры за день d-lag, столбцы — за день d.
+    """
+
+    __slots__ = ("keys", "method", "lag", "r", "n", "nz", "_key_pos")
+
+    def __init__(self, keys, method: str, lag: int, r: np.ndarray, n: np.ndarray, nz: np.ndarray):
+        self.keys = list(keys)
+        self.method = method
+        self.lag = lag
+        self.r = r
+        self.n = n
+        self.nz = nz
+        self._key_pos = {key: i for i, key in enumerate(self.keys)}
+
+    def key_position(self, key: str) -> int | None:
+        return self._key_pos.get(key)
+
+    def masked_r(self, min_periods: int = MIN_PERIODS) -> np.ndarray:
+        return np.where(self.n >= min_periods, self.r, np.nan)
+
+    def top(self, target: str, min_periods: int = MIN_PERIODS, limit: int = 20) -> list[dict]:
+        """
+        Параметры, сильнее всего связанные с target (по |r|).
+        Для лага — значения параметров за день до target.
+        """
+        col = self.key_position(target)
+        if col is None:
+            return []
+        r = self.masked_r(min_periods)[:, col]
+        strength = np.where(np.isnan(r), -1.0, np.abs(r))
+        order = [i for i in np.argsort(-strength, kind="stable")
+                 if strength[i] >= 0 and (self.lag or i != col)]
+        return [
+            {"key": self.keys[i], "r": round(float(r[i]), 4), "n": int(self.n[i, col]), "nz": int(self.nz[i, col])}
+            for i in order[:limit]
+        ]
+
+    def top_pairs(self, min_periods: int = MIN_PERIODS, limit: int = 20) -> list[dict]:
+        """Самые сильные пары по всей матрице (для lag=0 — каждая пара один раз)."""
+        r = self.masked_r(min_periods)
+        if self.lag == 0:
+            r = np.where(np.triu(np.ones_like(r, dtype=bool), k=1), r, np.nan)
+        flat = np.where(np.isnan(r), -1.0, np.abs(r)).ravel()
+        size = len(self.keys)
+        pairs = []
+        for idx in np.argsort(-flat, kind="stable")[:limit]:
+            if flat[idx] < 0:
+                break
+            i, j = divmod(int(idx), size)
+            pairs.append({
+                "x": self.keys[i], "y": self.keys[j],
+                "r": round(float(r[i, j]), 4), "n": int(self.n[i, j]), "nz": int(self.nz[i, j]),
+            })
+        return pairs
+
+    def payload(self, min_periods: int = MIN_PERIODS) -> dict:
+        """Полные матрицы для API (NaN → null)."""
+        return {
+            "method": self.method,
+            "lag": self.lag,
+            "min_periods": min_periods,
+            "keys": self.keys,
+            "r": np.round(self.masked_r(min_periods), 4),
+            "n": self.n.astype(np.int64),
+            "nz": self.nz.astype(np.int64),
+        }
+
+
+# --------------------------------------------------------------------
+# 🗃️ Кэш на версию данных
+# --------------------------------------------------------------------
+
+def _dense_codes(values: np.ndarray, mask: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Номер значения среди различных значений своего столбца (по возрастанию)
+    и максимальное число различных значений. В пустых ячейках — 0 (не используются).
+    """
+    codes = np.zeros(values.shape, dtype=np.int64)
+    levels = 1
+    for j in range(values.shape[1]):
+        filled = mask[:, j]
+        if filled.any():
+            uniques, codes[filled, j] = np.unique(values[filled, j], return_inverse=True)
+            levels = max(levels, len(uniques))
+    return codes, levels
+
+
+def _subset_ranks(cols: np.ndarray, codes: np.ndarray, size: int, levels: int) -> np.ndarray:
+    """
+    Средние ранги значений внутри своего столбца по выбранным ячейкам (cols — столбец
+    каждой ячейки, codes — номер значения): ранг группы равных = cumsum - (count - 1) / 2.
+    """
+    flat = cols * levels + codes
+    counts = np.bincount(flat, minlength=size * levels).reshape(size, levels).astype(np.float64)
+    ranks = np.cumsum(counts, axis=1) - (counts - 1) / 2
+    return ranks.ravel()[flat]
+
+
+def _column_pearson(cols: np.ndarray, x: np.ndarray, y: np.ndarray, size: int) -> np.ndarray:
+    """Пирсон по ячейкам, сгруппированным по столбцу; NaN — нет дней или постоянный ряд."""
+    def total(weights=None):
+        return np.bincount(cols, weights=weights, minlength=size)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.where(total() > 0, total(), np.nan)
+        sx, sy = total(x), total(y)
+        cov = total(x * y) - sx * sy / n
+        var_x = total(x * x) - sx * sx / n
+        var_y = total(y * y) - sy * sy / n
+        eps = 1e-9 * np.maximum(np.nan_to_num(n), 1)
+        r = cov / np.sqrt(np.where(var_x > eps, var_x, np.nan) * np.where(var_y > eps, var_y, np.nan))
+    return np.clip(r, -1.0, 1.0)
+
+
+def spearman(matrix: DiaryMatrix, lag: int = 0) -> CorrelationResult:
+    """
+    Спирмен = Пирсон по рангам (средние ранги при равенстве). Ранги — по дням,
+    где заполнены оба параметра пары (как pandas corr("spearman")). Для
+    параметра x все пары (x, y) считаются за один шаг: ранг внутри подмножества
+    дней — это число меньших значений плюс середина группы равных, т.е. он
+    получается из счётчиков значений (bincount), без сортировки на каждую пару.
+    """
+    stats = full_stats(matrix, lag)
+    size = matrix.shape[1]
+    r = np.full((size, size), np.nan)
+    if len(matrix):
+        x_dates, y_dates = _pairs(matrix.dates, lag)
+        y_values, y_mask = _rows(matrix, y_dates)
+        x_values, x_mask = (y_values, y_mask) if lag == 0 else _rows(matrix, x_dates)
+        y_mask, x_mask = y_mask.astype(bool), x_mask.astype(bool)
+        y_codes, y_levels = _dense_codes(y_values, y_mask)
+        x_codes, x_levels = (y_codes, y_levels) if lag == 0 else _dense_codes(x_values, x_mask)
+        for i in np.flatnonzero(x_mask.any(axis=0)):
+            days, cols = np.nonzero(y_mask & x_mask[:, [i]])
+            if not len(cols):
+                continue
+            ry = _subset_ranks(cols, y_codes[days, cols], size, y_levels)
+            rx = _subset_ranks(cols, x_codes[days, i], size, x_levels)
+            r[i] = _column_pearson(cols, rx, ry, size)
+    return CorrelationResult(matrix.keys, "spearman", lag, r, stats.n, stats.nz)
+
+
+_accumulators: dict[int, PearsonAccumulator] = {}
+_accumulators_lock = threading.Lock()
+_cache = VersionedCache("correlations")
+
+
+def _accumulator(lag: int) -> PearsonAccumulator:
+    with _accumulators_lock:
+        if lag not in _accumulators:
+            _accumulators[lag] = PearsonAccumulator(lag)
+        return _accumulators[lag]
+
+
+def get_correlations(method: str = "pearson", lag: int = 0) -> CorrelationResult:
+    """
+    Корреляции по текущей матрице дневника; кэш до смены версии данных.
+    Пирсон при смене версии обновляется инкрементально (PearsonAccumulator).
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method}")
+    if not 0 <= lag <= MAX_LAG:
+        raise ValueError(f"lag must be in 0..{MAX_LAG}")
+
+    def compute(version):
+        from .utils import get_diary_matrix
+
+        matrix = get_diary_matrix()
+        if method == "spearman":
+            return spearman(matrix, lag)
+        return _accumulator(lag).advance(matrix)
+
+    return _cache.get((method, lag), compute)
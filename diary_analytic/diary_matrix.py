@@ -0,0 +1,334 @@
+# diary_analytic/diary_matrix.py
+
+"""
+🧮 diary_matrix.py — компактное представление дневника
+
+Значения параметров лежат в шкале 0–5, а около двух третей ячеек «дата × параметр»
+пустые. Плотный float64-pivot тратит 8 байт на каждую ячейку, поэтому здесь
+дневник хранится так:
+
+    - values: int8-массив (или float32, если встретились дробные значения);
+    - bits:   битовая маска заполненности (np.packbits, 1 бит на ячейку);
+    - dates:  фиксированный индекс дат (datetime64[D], отсортирован);
+    - keys:   фиксированный индекс параметров (Parameter.key, отсортирован).
+
+В pandas / float-массивы матрица превращается только на границе с моделью
+(`to_frame()`, `to_float_array()`).
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+# --------------------------------------------------------------------
+# 📦 Матрица дневника: даты × параметры
+# --------------------------------------------------------------------
+
+class DiaryMatrix:
+    """
+    Неизменяемая «широкая» таблица дневника в компактном виде.
+
+    Пример:
+        matrix = DiaryMatrix.from_db()
+        matrix.row(date(2025, 5, 12))   → {"toshn": 2.0, "ustalost": 1.0}
+        matrix.to_frame()               → pd.DataFrame (как get_diary_dataframe)
+    """
+
+    __slots__ = ("dates", "keys", "values", "bits", "_key_pos")
+
+    def __init__(self, dates, keys, values: np.ndarray, mask: np.ndarray):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.keys = list(keys)
+        self.values = values
+        # Маска хранится упакованной: 8 ячеек в одном байте
+        self.bits = np.packbits(np.asarray(mask, dtype=bool), axis=1)
+        self._key_pos = {key: i for i, key in enumerate(self.keys)}
+
+    # -----------------------------------------------------------------
+    # 🏗️ Конструкторы
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def empty(cls) -> "DiaryMatrix":
+        return cls([], [], np.zeros((0, 0), dtype=np.int8), np.zeros((0, 0), dtype=bool))
+
+    @classmethod
+    def from_packed(cls, dates, keys, values: np.ndarray, bits: np.ndarray) -> "DiaryMatrix":
+        """
+        Собирает матрицу из уже упакованной маски без копирования массивов
+        (используется для memmap-снимков, см. snapshot.py).
+        """
+        matrix = cls.__new__(cls)
+        matrix.dates = np.asarray(dates, dtype="datetime64[D]")
+        matrix.keys = list(keys)
+        matrix.values = values
+        matrix.bits = bits
+        matrix._key_pos = {key: i for i, key in enumerate(matrix.keys)}
+        return matrix
+
+    @classmethod
+    def from_triples(cls, dates, keys, values) -> "DiaryMatrix":
+        """
+        Строит матрицу из «узкого» формата: три параллельные последовательности
+        (дата, ключ параметра, значение) — ровно то, что отдаёт values_list().
+        """
+        if len(dates) == 0:
+            return cls.empty()
+
+        values = np.asarray(values, dtype=np.float64)
+
+        # Фиксированные индексы + позиции каждой тройки в них
+        rows, date_index = _sorted_factorize(dates)
+        cols, key_index = _sorted_factorize(keys)
+        date_index = np.asarray(date_index, dtype="datetime64[D]")
+
+        shape = (len(date_index), len(key_index))
+        dense = np.zeros(shape, dtype=_value_dtype(values))
+        mask = np.zeros(shape, dtype=bool)
+        dense[rows, cols] = values
+        mask[rows, cols] = True
+        return cls(date_index, [str(k) for k in key_index], dense, mask)
+
+    @classmethod
+    def from_db(cls) -> "DiaryMatrix":
+        """
+        Собирает матрицу одним запросом без создания объектов моделей
+        (+ значения архивных лет, см. archive.py).
+        """
+        from . import archive
+        from .models import EntryValue
+
+        triples = list(EntryValue.objects.values_list("entry__date", "parameter__key", "value"))
+        dates, keys, values = archive.union_triples(triples)
+        if not len(dates):
+            return cls.empty()
+        return cls.from_triples(dates, keys, values)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DiaryMatrix":
+        """
+        Обратное преобразование из широкого DataFrame (индекс — даты).
+        """
+        if df.empty:
+            return cls.empty()
+        df = df.sort_index().reindex(sorted(df.columns), axis=1)
+        floats = df.to_numpy(dtype=np.float64, na_value=np.nan)
+        mask = ~np.isnan(floats)
+        dense = np.where(mask, floats, 0).astype(_value_dtype(floats[mask]))
+        return cls(pd.to_datetime(df.index).values.astype("datetime64[D]"), list(df.columns), dense, mask)
+
+    # -----------------------------------------------------------------
+    # 📏 Свойства
+    # -----------------------------------------------------------------
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def mask(self) -> np.ndarray:
+        """Распакованная bool-маска заполненных ячеек (n_dates × n_keys)."""
+        return np.unpackbits(self.bits, axis=1, count=len(self.keys)).view(bool)
+
+    @property
+    def nnz(self) -> int:
+        return int(np.unpackbits(self.bits).sum()) if self.bits.size else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.bits.nbytes + self.dates.nbytes
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    # -----------------------------------------------------------------
+    # 🔎 Доступ к строкам и столбцам
+    # -----------------------------------------------------------------
+
+    def date_position(self, target_date) -> int | None:
+        """Позиция даты в индексе (бинарный поиск) или None."""
+        d = np.datetime64(target_date, "D")
+        pos = int(np.searchsorted(self.dates, d))
+        if pos < len(self.dates) and self.dates[pos] == d:
+            return pos
+        return None
+
+    def key_position(self, key: str) -> int | None:
+        return self._key_pos.get(key)
+
+    def row(self, target_date) -> dict:
+        """
+        Заполненные значения за день: {key: float}. Пустой dict, если дня нет.
+        """
+        pos = self.date_position(target_date)
+        if pos is None:
+            return {}
+        present = np.unpackbits(self.bits[pos], count=len(self.keys)).view(bool)
+        values = self.values[pos]
+        return {self.keys[i]: float(values[i]) for i in np.flatnonzero(present)}
+
+    def column(self, key: str, until=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        История одного параметра: (даты, значения float64) без пропусков.
+        :param until: если задано — только даты <= until
+        """
+        rows, values = self.column_rows(key, until=until)
+        return self.dates[rows], values
+
+    def column_rows(self, key: str, until=None, since=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        То же, что column(), но вместо дат — номера строк (позиции в self.dates).
+        Удобно, когда к датам уже есть готовое представление (например, ISO-строки).
+        since/until — границы дат включительно (None — без ограничения).
+        """
+        col = self.key_position(key)
+        if col is None:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.float64)
+        # Распаковываем только бит нужного столбца (packbits: старший бит — первый)
+        present = ((self.bits[:, col >> 3] >> (7 - (col & 7))) & 1).view(bool)
+        if until is not None:
+            present = present & (self.dates <= np.datetime64(until, "D"))
+        if since is not None:
+            present = present & (self.dates >= np.datetime64(since, "D"))
+        rows = np.flatnonzero(present)
+        return rows, self.values[rows, col].astype(np.float64)
+
+    def rows_for_dates(self, dates) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (values, bits) для произвольного набора дат: дни, которых в матрице
+        нет, — нулевые строки с пустой маской.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        values = np.zeros((len(dates), len(self.keys)), dtype=self.values.dtype)
+        bits = np.zeros((len(dates), self.bits.shape[1]), dtype=np.uint8)
+        if len(self.dates):
+            pos = np.minimum(np.searchsorted(self.dates, dates), len(self.dates) - 1)
+            found = self.dates[pos] == dates
+            values[found] = self.values[pos[found]]
+            bits[found] = self.bits[pos[found]]
+        return values, bits
+
+    def float_rows(self, dates, dtype=np.float64) -> np.ndarray:
+        """То же, что rows_for_dates(), но плотным float-массивом с NaN в пустых ячейках."""
+        values, bits = self.rows_for_dates(dates)
+        present = np.unpackbits(bits, axis=1, count=len(self.keys)).view(bool)
+        return np.where(present, values.astype(dtype), np.nan).astype(dtype, copy=False)
+
+    def changed_dates(self, other: "DiaryMatrix") -> np.ndarray:
+        """
+        Дни, строки которых в other отличаются от этой матрицы (в т.ч. появившиеся
+        и исчезнувшие). Набор ключей у матриц должен совпадать.
+        """
+        if len(self.dates) == len(other.dates) and np.array_equal(self.dates, other.dates):
+            dates = other.dates
+            old_values, old_bits, new_values, new_bits = self.values, self.bits, other.values, other.bits
+        else:
+            dates = np.union1d(self.dates, other.dates)
+            old_values, old_bits = self.rows_for_dates(dates)
+            new_values, new_bits = other.rows_for_dates(dates)
+        # В пустых ячейках значения всегда 0, поэтому при сравнении значений маска не нужна
+        changed = np.any(old_bits != new_bits, axis=1) | np.any(old_values != new_values, axis=1)
+        return dates[changed]
+
+    def detached(self) -> "DiaryMatrix":
+        """
+        Копия в памяти процесса. Memmap-снимок, из которого открыта матрица,
+        удаляется при сборке старых снимков — для долгого хранения нужна копия.
+        """
+        return DiaryMatrix.from_packed(self.dates.copy(), self.keys, np.array(self.values), np.array(self.bits))
+
+    # -----------------------------------------------------------------
+    # 🔁 Граница с моделями: float-массивы и pandas
+    # -----------------------------------------------------------------
+
+    def to_float_array(self, dtype=np.float64) -> np.ndarray:
+        """Плотный массив с NaN на месте пустых ячеек."""
+        out = self.values.astype(dtype)
+        out[~self.mask] = np.nan
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        DataFrame в том же виде, что раньше строил pivot в get_diary_dataframe():
+        индекс — datetime.date (имя "date"), столбцы — ключи параметров.
+        """
+        if not len(self.dates):
+            return pd.DataFrame()
+        index = pd.Index(self.dates.astype(object), name="date")
+        columns = pd.Index(self.keys, name="parameter")
+        return pd.DataFrame(self.to_float_array(), index=index, columns=columns)
+
+    def python_dates(self) -> list[date]:
+        return self.dates.astype(object).tolist()
+
+
+def _sorted_factorize(items):
+    """
+    Хеш-факторизация (быстрее сортировки строк) + перенумерация кодов так,
+    чтобы индекс уникальных значений был отсортирован.
+    """
+    codes, uniques = pd.factorize(np.asarray(items, dtype=object))
+    order = np.argsort(uniques)
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+    return remap[codes], uniques[order]
+
+
+def _value_dtype(values: np.ndarray):
+    """
+    int8, если все значения целые и помещаются в диапазон, иначе float32.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return np.int8
+    if np.all(np.mod(values, 1) == 0) and values.min() >= -128 and values.max() <= 127:
+        return np.int8
+    return np.float32
+
+
+# --------------------------------------------------------------------
+# 🔄 Инкрементальное обновление массивов, выровненных по датам
+# --------------------------------------------------------------------
+
+def update_aligned_rows(previous: DiaryMatrix, old_dates: np.ndarray, arrays: tuple, matrix: DiaryMatrix,
+                        compute, reach: int = 0, max_fraction: float = 0.25) -> tuple[tuple, np.ndarray] | None:
+    """
+    Общий шаг хранилищ, выровненных по датам матрицы (feature_store, taxonomy).
+    arrays — строки на даты old_dates, посчитанные по матрице previous. Находит
+    изменённые дни, переносит готовые строки на даты matrix и пересчитывает строки,
+    зависящие от изменённых дней (сам день и reach следующих) и новые даты.
+
+    compute(dates, rows) возвращает свежие строки на даты dates (позиции rows
+    в matrix) — кортеж в порядке arrays. Ключи previous и matrix должны совпадать.
+
+    :return: (массивы под matrix, пересчитанные даты) или None, если затронуто
+             больше max_fraction дней — тогда дешевле полный пересчёт
+    """
+    changed = previous.changed_dates(matrix)
+    if not len(changed):
+        return arrays, changed
+
+    following = (changed[:, None] + np.arange(reach + 1).astype("timedelta64[D]")).ravel()
+    affected = np.union1d(following, np.setdiff1d(matrix.dates, old_dates))
+    affected = affected[np.isin(affected, matrix.dates)]
+    if len(affected) > max_fraction * max(len(matrix), 1):
+        return None
+
+    if np.array_equal(old_dates, matrix.dates):
+        arrays = tuple(a.copy() for a in arrays)
+    else:
+        # Набор дат изменился — переносим готовые строки на новые позиции
+        keep = np.isin(matrix.dates, old_dates)
+        src = np.searchsorted(old_dates, matrix.dates[keep])
+        moved = []
+        for a in arrays:
+            b = np.empty((len(matrix.dates),) + a.shape[1:], dtype=a.dtype)
+            b[keep] = a[src]
+            moved.append(b)
+        arrays = tuple(moved)
+    rows = np.searchsorted(matrix.dates, affected)
+    for target, fresh in zip(arrays, compute(affected, rows)):
+        target[rows] = fresh
+    return arrays, affected
@@ -0,0 +1,46 @@
+# diary_analytic/dir_lock.py
+
+"""
+🔒 dir_lock.py — межпроцессный замок на каталоге
+
+Публикация поколений моделей (model_store.py) и снимков дневника (snapshot.py)
+переключает указатель `current`, и делать это могут несколько процессов сразу.
+Замок — каталог: mkdir атомарен на всех ОС и не требует fcntl. Замок, который
+держат дольше stale_seconds, считается брошенным упавшим процессом и снимается.
+
+Пример:
+    with dir_lock(os.path.join(root, ".publish.lock")):
+        ...  # прочитать указатель, записать новый
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from .loggers import db_logger
+
+# Пауза между попытками взять замок (сек)
+LOCK_WAIT = 0.01
+# Замок старше этого считается брошенным (публикация — миллисекунды)
+LOCK_STALE_SECONDS = 60
+
+
+@contextmanager
+def dir_lock(path: str, stale_seconds: float = LOCK_STALE_SECONDS):
+    while True:
+        try:
+            os.mkdir(path)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(path).st_mtime > stale_seconds:
+                    db_logger.warning(f"[dir_lock] ⚠️ Снят брошенный замок {path}")
+                    os.rmdir(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(LOCK_WAIT)
+    try:
+        yield
+    finally:
+        os.rmdir(path)
@@ -0,0 +1,73 @@
+# diary_analytic/downsample.py
+
+"""
+📉 downsample.py — прореживание длинных рядов для графиков (LTTB)
+
+График шириной 600 пикселей не покажет больше ~600 точек, а история
+параметра за несколько лет — это тысячи значений, которые нужно
+сериализовать, передать и отрисовать в Chart.js. Largest-Triangle-Three-Buckets
+(Steinarsson, 2013) оставляет заданное число точек, сохраняя форму ряда:
+пики и провалы не сглаживаются, как при усреднении.
+
+Алгоритм:
+    - первая и последняя точки сохраняются всегда;
+    - остальные делятся на max_points - 2 корзин равной длины;
+    - из каждой корзины берётся точка, образующая наибольший треугольник
+      с выбранной точкой предыдущей корзины и средним следующей.
+
+Выбор в корзине зависит от выбора в предыдущей, поэтому цикл по корзинам
+остаётся, но всё остальное (границы корзин, средние, площади внутри
+корзины) считается массивами NumPy: корзины выровнены в прямоугольную
+таблицу индексов, и на каждую корзину приходится одна векторная операция.
+
+Пример:
+    keep = lttb(x, y, 500)      # индексы точек, по возрастанию
+    x, y = x[keep], y[keep]
+"""
+
+import numpy as np
+
+MIN_POINTS = 3
+
+
+def lttb(x, y, max_points: int) -> np.ndarray:
+    """
+    :param x: возрастающие координаты (например, дни от начала ряда)
+    :param y: значения той же длины
+    :return: индексы сохраняемых точек (все, если len(x) <= max_points)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points должно быть не меньше {MIN_POINTS}")
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max_points - 2
+    # Границы корзин по внутренним точкам 1 .. n-2: [starts[i], ends[i])
+    edges = (np.arange(buckets + 1) * ((n - 2) / buckets)).astype(np.intp) + 1
+    edges[-1] = n - 1
+    starts, ends = edges[:-1], edges[1:]
+
+    # Среднее следующей корзины (для последней — последняя точка)
+    cx, cy = np.concatenate(([0.0], np.cumsum(x))), np.concatenate(([0.0], np.cumsum(y)))
+    sizes = ends - starts
+    avg_x = np.append((cx[ends] - cx[starts])[1:] / sizes[1:], x[-1])
+    avg_y = np.append((cy[ends] - cy[starts])[1:] / sizes[1:], y[-1])
+
+    # Прямоугольная таблица индексов: короткие корзины добиваются своей
+    # последней точкой (повтор не меняет argmax — берётся первое вхождение)
+    table = np.minimum(starts[:, None] + np.arange(sizes.max()), ends[:, None] - 1)
+    bx, by = x[table], y[table]
+
+    keep = np.empty(max_points, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    ax, ay = x[0], y[0]
+    for i in range(buckets):
+        # Удвоенная площадь треугольника (a, p, c) для всех p корзины
+        area = np.abs((ax - avg_x[i]) * (by[i] - ay) - (ax - bx[i]) * (avg_y[i] - ay))
+        j = int(area.argmax())
+        keep[i + 1] = table[i, j]
+        ax, ay = bx[i, j], by[i, j]
+    return keep
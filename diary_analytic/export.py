@@ -0,0 +1,129 @@
+# diary_analytic/export.py
+
+"""
+📤 export.py — потоковый экспорт дневника (CSV / XLSX)
+
+Раньше экспорт собирал всю таблицу в список dict, строил DataFrame и только
+потом писал файл, а XLSX держал в памяти обычную книгу openpyxl. Теперь:
+
+    - iter_export_rows() — строки таблицы из одного упорядоченного запроса
+                           (Entry LEFT JOIN EntryValue, новые даты сверху),
+                           читаются курсором порциями и группируются по дате;
+    - iter_csv()         — CSV по кускам (для StreamingHttpResponse и файла);
+    - write_xlsx()       — write-only книга openpyxl (строки сразу уходят на диск).
+
+Память не зависит от длины дневника: в каждый момент в Python живёт одна строка.
+Формат совпадает с прежним export.csv: «Дата» (ДД.ММ.ГГ) + столбцы по Parameter.name.
+Значения архивных лет (archive.py) подставляются по дате — распакован один год за раз.
+"""
+
+import csv
+from itertools import groupby
+
+from .archive import ArchivedValues
+from .models import Entry, Parameter
+
+# Порция строк, которую курсор читает из SQLite за раз
+CHUNK_SIZE = 2000
+
+DATE_FORMAT = "%d.%m.%y"
+DATA_SHEET = "Данные"
+DESCRIPTIONS_SHEET = "Описания параметров"
+DESCRIPTIONS_HEADER = ["Ключ", "Название", "Описание"]
+
+
+def export_parameters() -> list:
+    """Параметры в порядке столбцов экспорта (по name)."""
+    return list(Parameter.objects.order_by("name"))
+
+
+def export_header(parameters) -> list[str]:
+    return ["Дата"] + [p.name for p in parameters]
+
+
+def iter_export_rows(parameters, empty=""):
+    """
+    Строки экспорта: ["ДД.ММ.ГГ", значение или empty, ...] в порядке parameters.
+    Даты без значений тоже попадают в экспорт (строка из empty).
+    """
+    positions = {p.pk: i for i, p in enumerate(parameters)}
+    width = len(parameters)
+    archived = ArchivedValues()
+    rows = (
+        Entry.objects.order_by("-date")
+        .values_list("date", "entryvalue__parameter_id", "entryvalue__value")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for entry_date, group in groupby(rows, key=lambda row: row[0]):
+        row = [empty] * width
+        values = [(parameter_id, value) for _, parameter_id, value in group]
+        for parameter_id, value in archived.get(entry_date) + values:
+            pos = positions.get(parameter_id)
+            if pos is not None and value is not None:
+                row[pos] = int(value)
+        yield [entry_date.strftime(DATE_FORMAT)] + row
+
+
+def iter_descriptions(parameters):
+    for p in parameters:
+        yield [p.key, p.name, p.description or ""]
+
+
+# --------------------------------------------------------------------
+# 📄 CSV
+# --------------------------------------------------------------------
+
+class _Echo:
+    """Псевдо-файл для csv.writer: write() просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows, bom: bool = True, buffer_size: int = 64 * 1024):
+    """
+    CSV кусками str примерно по buffer_size символов
+    (utf-8-sig: BOM в первом куске — как раньше в to_csv).
+    """
+    writer = csv.writer(_Echo(), lineterminator="\n")
+    lines = [("\ufeff" if bom else "") + writer.writerow(header)]
+    size = 0
+    for row in rows:
+        line = writer.writerow(row)
+        lines.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield "".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+def write_csv(filepath: str, header, rows) -> None:
+    with open(filepath, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_csv(header, rows):
+            f.write(chunk)
+
+
+# --------------------------------------------------------------------
+# 📗 XLSX
+# --------------------------------------------------------------------
+
+def write_xlsx(target, parameters) -> None:
+    """
+    Пишет книгу в target (путь или бинарный файл) в write-only режиме:
+    лист «Данные» и лист «Описания параметров».
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    data = workbook.create_sheet(DATA_SHEET)
+    data.append(export_header(parameters))
+    for row in iter_export_rows(parameters, empty=None):
+        data.append(row)
+
+    descriptions = workbook.create_sheet(DESCRIPTIONS_SHEET)
+    descriptions.append(DESCRIPTIONS_HEADER)
+    for row in iter_descriptions(parameters):
+        descriptions.append(row)
+    workbook.save(target)
@@ -0,0 +1,175 @@
+# diary_analytic/feature_store.py
+
+"""
+⏪ feature_store.py — лаговые и скользящие признаки для всех параметров
+
+Еда сегодня часто отзывается симптомами завтра, а стратегии base/flags видят
+только столбцы того же дня. Считать сдвиги на каждый запрос через pandas
+shift/rolling дорого, поэтому признаки прошлых дней хранятся готовым массивом,
+выровненным по датам матрицы дневника:
+
+    key__lag1 .. key__lag3      — значение параметра 1..3 календарных дня назад;
+    key__mean3, key__sum3       — среднее / сумма заполненных значений за 3 прошлых дня;
+    key__mean7, key__sum7       — то же за 7 прошлых дней.
+
+Сам день в признаки не входит (только дни d-1 ... d-7), пустые дни — NaN.
+
+При смене версии данных массив не строится заново: изменённые дни находятся
+сравнением с прошлой матрицей (DiaryMatrix.changed_dates), и пересчитываются
+только строки, в окна которых они попадают (d+1 ... d+HORIZON).
+
+Пример:
+    features = get_lagged_features()
+    X = features.rows([date(2025, 5, 12)])     # 1 × len(features.columns), float32
+"""
+
+import threading
+
+import numpy as np
+
+from .diary_matrix import DiaryMatrix, update_aligned_rows
+from .loggers import predict_logger
+from .versioning import VersionedCache
+
+LAGS = (1, 2, 3)
+WINDOWS = (3, 7)
+# Сколько следующих дней зависит от значения одного дня
+HORIZON = max(max(LAGS), max(WINDOWS))
+KINDS = [f"lag{k}" for k in LAGS] + [f"{agg}{w}" for w in WINDOWS for agg in ("mean", "sum")]
+
+# Сколько дат считать за раз (окно HORIZON × даты × параметры в памяти)
+CHUNK_ROWS = 2048
+# Если затронута большая доля дней — дешевле пересчитать всё
+INCREMENTAL_MAX_FRACTION = 0.25
+
+
+def feature_columns(keys) -> list[str]:
+    """Имена признаков: блоки по видам (все lag1, потом все lag2, ...)."""
+    return [f"{key}__{kind}" for kind in KINDS for key in keys]
+
+
+def compute_rows(matrix: DiaryMatrix, dates) -> np.ndarray:
+    """
+    Признаки для произвольных дат (в т.ч. отсутствующих в матрице, например завтра).
+    :return: float32-массив len(dates) × (len(KINDS) * len(keys)), NaN — нет данных
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    width = len(matrix.keys)
+    out = np.empty((len(dates), len(KINDS) * width), dtype=np.float32)
+    for start in range(0, len(dates), CHUNK_ROWS):
+        chunk = dates[start:start + CHUNK_ROWS]
+        # Все нужные прошлые дни распаковываются один раз; past[o - 1] — значения за день d - o
+        wanted = chunk[None, :] - np.arange(1, HORIZON + 1)[:, None].astype("timedelta64[D]")
+        days, index = np.unique(wanted, return_inverse=True)
+        past = matrix.float_rows(days, dtype=np.float32)[index.reshape(wanted.shape)]
+        present = ~np.isnan(past)
+        sums = np.cumsum(np.where(present, past, np.float32(0)), axis=0)
+        counts = np.cumsum(present, axis=0)
+
+        blocks = [past[k - 1] for k in LAGS]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for w in WINDOWS:
+                s, n = sums[w - 1], counts[w - 1]
+                blocks.append(np.where(n > 0, s / n, np.nan))
+                blocks.append(np.where(n > 0, s, np.nan))
+        out[start:start + len(chunk)] = np.concatenate(blocks, axis=1)
+    return out
+
+
+# --------------------------------------------------------------------
+# 📦 Готовые признаки для одной версии данных
+# --------------------------------------------------------------------
+
+class LaggedFeatures:
+    """
+    Неизменяемый массив признаков, строка i — дата source.dates[i].
+    """
+
+    __slots__ = ("source", "keys", "columns", "dates", "values")
+
+    def __init__(self, source: DiaryMatrix, values: np.ndarray):
+        self.source = source
+        self.keys = source.keys
+        self.columns = feature_columns(source.keys)
+        self.dates = source.dates
+        self.values = values
+
+    def rows(self, dates) -> np.ndarray:
+        """
+        Признаки на даты: готовые строки для дат матрицы, остальные (например,
+        сегодня без записей) досчитываются по source.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        out = np.empty((len(dates), len(self.columns)), dtype=np.float32)
+        found = np.zeros(len(dates), dtype=bool)
+        if len(self.dates):
+            pos = np.minimum(np.searchsorted(self.dates, dates), len(self.dates) - 1)
+            found = self.dates[pos] == dates
+            out[found] = self.values[pos[found]]
+        if not found.all():
+            out[~found] = compute_rows(self.source, dates[~found])
+        return out
+
+
+class FeatureStore:
+    """
+    Держит последний LaggedFeatures и обновляет его под новую матрицу.
+    """
+
+    def __init__(self):
+        self._features = None
+        # Копия матрицы, по которой посчитан _features (для поиска изменённых дней)
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.full_runs = 0
+        self.incremental_runs = 0
+
+    def advance(self, matrix: DiaryMatrix) -> LaggedFeatures:
+        with self._lock:
+            values = self._incremental(matrix)
+            if values is None:
+                values = compute_rows(matrix, matrix.dates)
+                self.full_runs += 1
+                predict_logger.debug(f"[feature_store] полный пересчёт {values.shape}")
+            self._features = LaggedFeatures(matrix, values)
+            self._matrix = matrix.detached()
+            return self._features
+
+    def _incremental(self, matrix: DiaryMatrix) -> np.ndarray | None:
+        old = self._features
+        if old is None or old.keys != matrix.keys:
+            return None
+        # Значение дня входит в окна строк d+1 ... d+HORIZON
+        updated = update_aligned_rows(self._matrix, old.dates, (old.values,), matrix,
+                                      lambda dates, rows: (compute_rows(matrix, dates),),
+                                      reach=HORIZON, max_fraction=INCREMENTAL_MAX_FRACTION)
+        if updated is None:
+            return None
+        (values,), affected = updated
+        if len(affected):
+            self.incremental_runs += 1
+            predict_logger.debug(f"[feature_store] пересчитано строк {len(affected)}")
+        return values
+
+
+_store = FeatureStore()
+_cache = VersionedCache("lagged_features")
+
+
+def get_lagged_features() -> LaggedFeatures:
+    """Признаки для текущей матрицы дневника; кэш до смены версии данных."""
+    from .utils import get_diary_matrix
+
+    return _cache.get("features", lambda version: _store.advance(get_diary_matrix()))
+
+
+def features_for(matrix: DiaryMatrix, dates) -> np.ndarray:
+    """
+    Признаки на даты для матрицы matrix: из хранилища, если это текущая
+    матрица дневника, иначе (синтетика, бэктест) — прямым расчётом.
+    """
+    from .utils import get_diary_matrix
+
+    if matrix is get_diary_matrix():
+        return get_lagged_features().rows(dates)
+    return compute_rows(matrix, dates)
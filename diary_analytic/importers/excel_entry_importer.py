@@ -1,3 +1,4 @@
+from diary_analytic import archive, changelog
 from diary_analytic.models import Entry, EntryValue, Parameter
 from slugify import slugify
 import pandas as pd
@@ -18,7 +19,7 @@ def import_excel_dataframe(df, message_callback=None):
     if len(columns) < 2:
         raise ValueError("Файл должен содержать дату и хотя бы один параметр")
 
-    param_cache = {p.name_ru.strip(): p for p in Parameter.objects.all()}
+    param_cache = {p.name.strip(): p for p in Parameter.objects.all()}
     param_counter = len(param_cache)
     entries = {}
     entry_values_to_create = []
@@ -36,6 +37,11 @@ def import_excel_dataframe(df, message_callback=None):
             if message_callback:
                 message_callback(f"⚠️ Пропущена строка с некорректной датой '{date_str}': {e}")
             continue
+        period = archive.archived_period(entry_date)
+        if period is not None:
+            if message_callback:
+                message_callback(f"⚠️ Пропущена строка {entry_date}: год {period} в архиве")
+            continue
 
         if entry_date not in entries:
             entries[entry_date], _ = Entry.objects.get_or_create(date=entry_date)
@@ -72,4 +78,12 @@ def import_excel_dataframe(df, message_callback=None):
     if entry_values_to_update:
         EntryValue.objects.bulk_update(entry_values_to_update, ["value"])
 
+    # bulk-операции не вызывают сигналы — снимок и экспорт обновляем явно
+    from diary_analytic.signals import schedule_data_refresh
+    schedule_data_refresh(entries.keys())
+    changelog.record_values(
+        (ev.entry.date, ev.parameter.key, ev.value)
+        for ev in entry_values_to_create + entry_values_to_update
+    )
+
     return len(entry_values_to_create), len(entry_values_to_update)
@@ -0,0 +1,140 @@
+# diary_analytic/json_response.py
+
+"""
+📦 json_response.py — быстрые JSON-ответы для числовых данных
+
+Раньше API строили списки Python (strftime на каждую дату, .tolist() значений)
+и отдавали их через JsonResponse со стандартным json. Здесь:
+
+    - dumps(obj)          — сериализация в bytes; NumPy-массивы, скаляры и даты
+                            кодируются напрямую. Если установлен orjson — он,
+                            иначе стандартный json (компактные разделители);
+    - iso_dates(matrix)   — ISO-строки дат матрицы, считаются один раз на версию данных;
+    - series_payload(...) — ряд «даты → значения» в обычной или колоночной схеме;
+    - FastJsonResponse    — HttpResponse с уже сериализованным телом.
+
+Колоночная схема (schema=columnar) вместо списка дат отдаёт начальную дату
+и смещения в днях — это в разы короче для длинной истории:
+
+    {"start": "2025-01-01", "offsets": [0, 1, 3], "values": [2.0, 3.0, 1.0]}
+
+Дата i-го значения = start + offsets[i] дней.
+"""
+
+import datetime
+import json
+
+import numpy as np
+from django.http import HttpResponse
+
+from .versioning import VersionedCache
+
+try:  # Необязательная зависимость: в разы быстрее стандартного json
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+# Допустимые схемы для series_payload()
+SCHEMAS = ("rows", "columnar")
+
+
+# --------------------------------------------------------------------
+# 🔤 Сериализация
+# --------------------------------------------------------------------
+
+def _default(obj):
+    """Типы, которые стандартный json не умеет (и orjson без опций)."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "M":
+            return obj.astype("datetime64[D]").astype(str).tolist()
+        if obj.dtype.kind == "f" and np.isnan(obj).any():
+            # NaN в JSON недопустим → null
+            return np.where(np.isnan(obj), None, obj).tolist()
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        if isinstance(obj, np.datetime64):
+            return str(obj.astype("datetime64[D]"))
+        value = obj.item()
+        return None if value != value else value
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _numpy_dates(obj):
+    """
+    orjson с OPT_SERIALIZE_NUMPY сам кодирует datetime64 как "2025-05-10T00:00:00"
+    и до default не доходит, поэтому даты NumPy заменяются на "YYYY-MM-DD" заранее.
+    Обходятся только контейнеры — числовые массивы не копируются.
+    """
+    if isinstance(obj, dict):
+        return {key: _numpy_dates(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_numpy_dates(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.datetime64)) and obj.dtype.kind == "M":
+        return _default(obj)
+    return obj
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(_numpy_dates(obj), default=_default, option=_ORJSON_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Аналог JsonResponse, но тело сериализуется через dumps() (NumPy без .tolist()).
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
+
+
+# --------------------------------------------------------------------
+# 📅 ISO-даты, посчитанные один раз на версию данных
+# --------------------------------------------------------------------
+
+_iso_cache = VersionedCache("iso_dates")
+
+
+def iso_dates(matrix) -> np.ndarray:
+    """
+    Массив ISO-строк ("YYYY-MM-DD") для matrix.dates.
+    Пересчитывается только при смене версии данных (или другой матрице).
+    """
+    def compute(version):
+        return matrix.dates, matrix.dates.astype(str).astype(object)
+
+    dates, iso = _iso_cache.get("dates", compute)
+    if dates is not matrix.dates:
+        # В кэше даты другой матрицы (например, синтетической) — не подменяем
+        return compute(None)[1]
+    return iso
+
+
+# --------------------------------------------------------------------
+# 📈 Ряд «даты → значения»
+# --------------------------------------------------------------------
+
+def series_payload(matrix, rows: np.ndarray, values: np.ndarray, schema: str = "rows") -> dict:
+    """
+    Ответ с историей по строкам матрицы rows (см. DiaryMatrix.column_rows).
+
+    :param schema: "rows"     — {"dates": [...], "values": [...]} (как раньше);
+                   "columnar" — {"start": ..., "offsets": [...], "values": [...]}
+    """
+    if schema == "columnar":
+        if not len(rows):
+            return {"start": None, "offsets": [], "values": []}
+        days = matrix.dates[rows]
+        offsets = (days - days[0]).astype(np.int64)
+        return {"start": iso_dates(matrix)[rows[0]], "offsets": offsets, "values": values}
+    return {"dates": iso_dates(matrix)[rows], "values": values}
@@ -0,0 +1,61 @@
+"""
+🧊 manage.py archive — перенос закрытых лет из EntryValue в архив (см. archive.py)
+
+Примеры:
+    python manage.py archive                 # все годы до текущего
+    python manage.py archive 2022 2023
+    python manage.py archive --vacuum        # + VACUUM: файл БД уменьшится
+    python manage.py archive --list          # что уже в архиве
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from diary_analytic import archive
+
+
+class Command(BaseCommand):
+    help = "Переносит значения закрытых лет в сжатый столбцовый архив"
+
+    def add_arguments(self, parser):
+        parser.add_argument("years", nargs="*", type=int, help="Годы (по умолчанию — все до текущего)")
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM после архивации")
+        parser.add_argument("--list", action="store_true", help="Показать архивные периоды и выйти")
+
+    def handle(self, *args, **options):
+        if archive.archive_dir() is None:
+            raise CommandError("У этой БД нет каталога архива (БД в памяти?)")
+        if options["list"]:
+            self._list()
+            return
+
+        years = options["years"] or archive.closed_years()
+        if not years:
+            self.stdout.write("Нет закрытых лет с живыми значениями")
+            return
+        for year in sorted(years):
+            try:
+                part = archive.archive_year(year, today=date.today())
+            except ValueError as e:
+                raise CommandError(str(e))
+            if part is None:
+                self.stdout.write(f"— {year}: значений нет")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"🧊 {year}: {part['rows']} значений, {part['days']} дней → {part['file']} ({part['bytes']} байт)"
+                ))
+
+        if options["vacuum"]:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+            self.stdout.write("🧹 VACUUM выполнен")
+
+    def _list(self):
+        parts = archive.partitions()
+        if not parts:
+            self.stdout.write(f"Архив пуст ({archive.archive_dir()})")
+        for part in parts:
+            self.stdout.write(f"{part['period']}: {part['from']} … {part['to']}, {part['rows']} значений, "
+                              f"{part['days']} дней, {part['bytes']} байт — {part['file']}")
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diary_analytic.backtest import STRATEGIES, run_backtest
+from diary_analytic.utils import get_diary_matrix
+
+
+class Command(BaseCommand):
+    help = 'Walk-forward бэктест прогнозов: MAE/RMSE по каждому параметру и стратегии'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategy', action='append', choices=STRATEGIES,
+                            help='Только указанные стратегии (можно несколько раз)')
+        parser.add_argument('--target', action='append', help='Только указанные параметры (ключи)')
+        parser.add_argument('--min-train', type=int, default=3, help='Минимум обучающих дней до отсечки')
+        parser.add_argument('--json', action='store_true', help='Вывести полный результат в JSON')
+
+    def handle(self, *args, **options):
+        if options['min_train'] < 1:
+            raise CommandError('--min-train должен быть не меньше 1')
+        results = run_backtest(
+            get_diary_matrix(),
+            strategies=options['strategy'],
+            min_train=options['min_train'],
+            targets=options['target'],
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+
+        for strategy, result in results.items():
+            summary = result['summary']
+            self.stdout.write(self.style.SUCCESS(
+                f"📉 {strategy}: параметров {summary['targets']}, прогнозов {summary['n']}, "
+                f"MAE={summary['mae']}, RMSE={summary['rmse']}"
+            ))
+            for key, m in sorted(result['targets'].items(), key=lambda kv: kv[1]['mae']):
+                self.stdout.write(f"  {key}: n={m['n']} MAE={m['mae']} RMSE={m['rmse']} (среднее: MAE={m['baseline_mae']})")
@@ -0,0 +1,701 @@
+"""
+⏱️ manage.py benchmark — замеры производительности подсистем дневника
+
+Примеры:
+    python manage.py benchmark matrix
+    python manage.py benchmark matrix --scales 1 10 100
+    python manage.py benchmark json
+    python manage.py benchmark async --scales 1 3
+    python manage.py benchmark writes --scales 1 4
+    python manage.py benchmark search --scales 1 10 100
+    python manage.py benchmark correlations --scales 1 10 100
+    python manage.py benchmark features --scales 1 10 100
+    python manage.py benchmark history --scales 1 10 100
+    python manage.py benchmark categories --scales 1 10 100
+    python manage.py benchmark static
+
+Синтетические данные строятся по плотности текущей базы (~100 дней × ~100
+параметров, ~1/3 ячеек заполнена), поэтому замеры не трогают реальную БД.
+Исключение — набор async: он только читает текущую БД через тестовые клиенты,
+и набор writes: он пишет в копию БД во временном каталоге (отдельный процесс).
+Набор search строит таблицу дней с комментариями в отдельной SQLite в памяти.
+Набор static (без масштабов) считает байты одной загрузки страницы по текущей БД.
+"""
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django.http import JsonResponse
+
+from diary_analytic import correlations, downsample, feature_store, json_response, search, taxonomy, versioning
+from diary_analytic.diary_matrix import DiaryMatrix
+
+# Базовый размер «сегодняшнего» дневника
+BASE_DAYS = 100
+BASE_PARAMS = 100
+BASE_DENSITY = 0.33
+
+
+def synthetic_triples(scale: int, seed: int = 0):
+    """
+    Узкий формат (даты, ключи, значения) размера scale × сегодняшний:
+    число дней растёт в scale раз, набор параметров прежний.
+    """
+    rng = np.random.default_rng(seed)
+    days = BASE_DAYS * scale
+    cells = rng.random((days, BASE_PARAMS)) < BASE_DENSITY
+    rows, cols = np.nonzero(cells)
+    dates = np.datetime64("2020-01-01") + rows.astype("timedelta64[D]")
+    keys = np.array([f"param_{i:03d}" for i in range(BASE_PARAMS)], dtype=object)[cols]
+    values = rng.integers(0, 6, size=len(rows)).astype(np.float64)
+    return dates, keys, values
+
+
+def timed(fn, repeat: int = 3):
+    """Лучшее время из repeat запусков (сек) и результат последнего."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# --------------------------------------------------------------------
+# 🧮 Suite: DiaryMatrix против плотного pandas-pivot
+# --------------------------------------------------------------------
+
+def bench_matrix(scales):
+    results = []
+    for scale in scales:
+        dates, keys, values = synthetic_triples(scale)
+        python_dates = dates.astype(object)
+
+        def pandas_pivot():
+            # Так раньше работал get_diary_dataframe(): список dict → pivot
+            rows = [{"date": d, "parameter": k, "value": v} for d, k, v in zip(python_dates, keys, values)]
+            return pd.DataFrame(rows).pivot(index="date", columns="parameter", values="value")
+
+        def matrix_build():
+            return DiaryMatrix.from_triples(python_dates, keys, values)
+
+        pivot_time, frame = timed(pandas_pivot)
+        matrix_time, matrix = timed(matrix_build)
+        results.append({
+            "scale": scale,
+            "cells": int(frame.size),
+            "values": int(len(values)),
+            "pandas_pivot_s": round(pivot_time, 4),
+            "pandas_bytes": int(frame.memory_usage(deep=True).sum()),
+            "matrix_build_s": round(matrix_time, 4),
+            "matrix_bytes": int(matrix.nbytes),
+            "matrix_dtype": str(matrix.values.dtype),
+        })
+    return results
+
+
+# --------------------------------------------------------------------
+# 📦 Suite: JSON-ответы с полной историей параметров
+# --------------------------------------------------------------------
+
+def bench_json(scales):
+    """
+    Полная история всех параметров (как parameter_history по каждому ключу):
+    прежний путь (strftime + tolist + JsonResponse) против json_response.
+    """
+    # Как внутри запроса: версия данных уже зафиксирована middleware (без обращения к БД)
+    versioning._request_version.set(0)
+    results = []
+    for scale in scales:
+        dates, keys, values = synthetic_triples(scale)
+        matrix = DiaryMatrix.from_triples(dates.astype(object), keys, values)
+        json_response._iso_cache.clear()
+
+        def legacy():
+            body = 0
+            for key in matrix.keys:
+                days, vals = matrix.column(key)
+                payload = {
+                    "dates": [d.strftime("%Y-%m-%d") for d in days.astype(object)],
+                    "values": vals.tolist(),
+                }
+                body += len(JsonResponse(payload).content)
+            return body
+
+        def fast(schema):
+            def run():
+                body = 0
+                for key in matrix.keys:
+                    rows, vals = matrix.column_rows(key)
+                    body += len(json_response.dumps(json_response.series_payload(matrix, rows, vals, schema)))
+                return body
+            return run
+
+        legacy_time, legacy_bytes = timed(legacy)
+        rows_time, rows_bytes = timed(fast("rows"))
+        columnar_time, columnar_bytes = timed(fast("columnar"))
+        results.append({
+            "scale": scale,
+            "encoder": "orjson" if json_response.orjson else "json",
+            "payloads": len(matrix.keys),
+            "legacy_s": round(legacy_time, 4),
+            "legacy_bytes": legacy_bytes,
+            "rows_s": round(rows_time, 4),
+            "rows_bytes": rows_bytes,
+            "columnar_s": round(columnar_time, 4),
+            "columnar_bytes": columnar_bytes,
+        })
+    return results
+
+
+# --------------------------------------------------------------------
+# ⚡ Suite: async-вьюхи (ASGI) против синхронных (WSGI-воркеры)
+# --------------------------------------------------------------------
+
+# Сколько синхронных воркеров обслуживают WSGI-путь (как gunicorn.conf.py по умолчанию)
+WSGI_WORKERS = 4
+
+
+def _latency_stats(latencies, wall) -> dict:
+    latencies = np.sort(np.asarray(latencies))
+    return {
+        "wall_s": round(wall, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        "max_ms": round(float(latencies[-1]) * 1000, 1),
+    }
+
+
+def _wsgi_fanout(paths) -> dict:
+    from django.test import Client
+
+    def fetch(path):
+        # Время с момента отправки всех запросов: включает ожидание свободного воркера
+        status = Client(HTTP_HOST="localhost").get(path).status_code
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(WSGI_WORKERS) as pool:
+        results = list(pool.map(fetch, paths))
+    return _latency_stats([r[0] for r in results], time.perf_counter() - start)
+
+
+def _asgi_fanout(paths) -> dict:
+    from django.test import AsyncClient
+
+    async def run():
+        client = AsyncClient()
+
+        async def fetch(path):
+            await client.get(path)
+            return time.perf_counter() - start
+
+        return await asyncio.gather(*(fetch(path) for path in paths))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run())
+    return _latency_stats(latencies, time.perf_counter() - start)
+
+
+def bench_async(scales):
+    """
+    Разом N запросов истории (как diary.js при открытии дня, ~100 параметров × scale)
+    и блок прогнозов без предрасчёта (стратегии считаются на лету).
+    """
+    from django.conf import settings
+    from django.test import override_settings
+
+    # AsyncClient всегда шлёт Host: testserver
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+        return _bench_async(scales)
+
+
+def _bench_async(scales):
+    from django.test import override_settings
+
+    from diary_analytic.utils import get_diary_matrix
+
+    matrix = get_diary_matrix()
+    day = str(matrix.python_dates()[-1]) if len(matrix) else "2025-01-01"
+    results = []
+    for scale in scales:
+        keys = (list(matrix.keys) * scale)[: max(1, len(matrix.keys)) * scale]
+        history = [f"/api/parameter_history/?param={k}&date={day}" for k in keys]
+        results.append({
+            "scale": scale,
+            "case": "history",
+            "requests": len(history),
+            "wsgi": _wsgi_fanout(history),
+            "asgi": _asgi_fanout(["/async" + p for p in history]),
+        })
+
+    # Прогнозы всех стратегий на лету: последовательно (WSGI) против gather (ASGI)
+    with override_settings(DIARY_PRECOMPUTE_PREDICTIONS=False):
+        from diary_analytic import async_views, views
+
+        sync_time, _ = timed(lambda: views.get_predictions_by_models(matrix.python_dates()[-1]), repeat=3)
+        async_time, _ = timed(lambda: asyncio.run(async_views.predictions_by_models(matrix.python_dates()[-1])), repeat=3)
+    results.append({"case": "predictions_all_strategies", "sync_s": round(sync_time, 4), "async_s": round(async_time, 4)})
+    return results
+
+
+# --------------------------------------------------------------------
+# ✍️ Suite: очередь записи против прямых транзакций (50 одновременных писателей)
+# --------------------------------------------------------------------
+
+WRITERS = 50
+
+# Каждый писатель — поток с тестовым клиентом, шлёт /update_value/ по кругу
+# по 20 параметрам одного дня (как серия быстрых кликов)
+WRITES_SCRIPT = """
+import django, json, sys, threading, time
+django.setup()
+from django.test import Client
+from diary_analytic.models import Parameter
+writers, per_writer, day = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+keys = list(Parameter.objects.order_by("key").values_list("key", flat=True)[:20])
+latencies, statuses = [], {}
+lock = threading.Lock()
+barrier = threading.Barrier(writers)
+def writer(i):
+    client = Client(HTTP_HOST="localhost")
+    barrier.wait()
+    for j in range(per_writer):
+        body = json.dumps({"parameter": keys[(i + j) % len(keys)], "value": (i + j) % 6, "date": day})
+        start = time.perf_counter()
+        status = client.post("/update_value/", body, content_type="application/json").status_code
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+start = time.perf_counter()
+threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+[t.start() for t in threads]
+[t.join() for t in threads]
+wall = time.perf_counter() - start
+from diary_analytic.write_queue import _coordinator
+print(json.dumps({
+    "wall": wall, "latencies": latencies, "statuses": statuses,
+    "batches": _coordinator.batches if _coordinator else None,
+}))
+"""
+
+
+def _run_writers(per_writer: int, use_queue: bool) -> dict:
+    from django.conf import settings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "db.sqlite3")
+        shutil.copy(settings.DATABASES["default"]["NAME"], db_path)
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings"),
+            DIARY_DB_PATH=db_path,
+            DIARY_SNAPSHOT_DIR=os.path.join(tmp, "snapshots"),
+            DIARY_EXPORT_PATH=os.path.join(tmp, "export.csv"),
+            DIARY_WRITE_QUEUE="1" if use_queue else "0",
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", WRITES_SCRIPT, str(WRITERS), str(per_writer), "2031-01-01"],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+    data = json.loads(out.stdout.strip().splitlines()[-1])
+    stats = _latency_stats(data["latencies"], data["wall"])
+    stats["writes_per_s"] = round(len(data["latencies"]) / data["wall"], 1)
+    stats["statuses"] = data["statuses"]
+    if data["batches"] is not None:
+        stats["batches"] = data["batches"]
+    return stats
+
+
+def bench_writes(scales):
+    """scale — сколько записей делает каждый из WRITERS писателей."""
+    results = []
+    for scale in scales:
+        results.append({
+            "scale": scale,
+            "writes": WRITERS * scale,
+            "direct": _run_writers(scale, use_queue=False),
+            "queue": _run_writers(scale, use_queue=True),
+        })
+    return results
+
+
+# --------------------------------------------------------------------
+# 🔎 Suite: поиск по комментариям — FTS5 против LIKE
+# --------------------------------------------------------------------
+
+# Искомые слова редкие (~1% слов комментариев), остальное — «фоновый» словарь
+COMMENT_WORDS = (
+    "тошнота головная боль кофе сон прогулка усталость тревога работа спорт "
+    "йога дождь жара простуда лекарство молоко сладкое стресс отпуск дорога"
+).split()
+FILLER_WORDS = [f"слово{i}" for i in range(5000)]
+SEARCH_QUERIES = ["тошн", "головная боль", "кофе сон", "отпуск"]
+
+
+def _synthetic_comment(rng) -> str:
+    size = rng.integers(5, 40)
+    rare = rng.random(size) < 0.01
+    filler = rng.zipf(1.3, size=size) % len(FILLER_WORDS)
+    return " ".join(
+        COMMENT_WORDS[rng.integers(len(COMMENT_WORDS))] if is_rare else FILLER_WORDS[f]
+        for is_rare, f in zip(rare, filler)
+    )
+
+
+def _search_db(days: int, seed: int = 0) -> sqlite3.Connection:
+    """SQLite в памяти: diary_analytic_entry с комментариями и FTS5-индекс по схеме из миграции."""
+    rng = np.random.default_rng(seed)
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE diary_analytic_entry (id INTEGER PRIMARY KEY, date TEXT UNIQUE, comment TEXT)")
+    for statement in search.FTS_SCHEMA:
+        db.execute(statement)
+    start = np.datetime64("2000-01-01")
+    db.executemany(
+        "INSERT INTO diary_analytic_entry (date, comment) VALUES (?, ?)",
+        ((str(start + i), _synthetic_comment(rng)) for i in range(days)),
+    )
+    db.commit()
+    return db
+
+
+def bench_search(scales):
+    results = []
+    for scale in scales:
+        days = BASE_DAYS * scale
+        db = _search_db(days)
+        for q in SEARCH_QUERIES:
+            words = q.split()
+
+            def like():
+                sql = "SELECT date, comment FROM diary_analytic_entry WHERE " + " AND ".join(["comment LIKE ?"] * len(words))
+                return db.execute(sql + " ORDER BY date DESC LIMIT 20", [f"%{w}%" for w in words]).fetchall()
+
+            def fts():
+                return db.execute(
+                    f"SELECT e.date, snippet({search.FTS_TABLE}, 0, '<mark>', '</mark>', '…', 12)"
+                    f" FROM {search.FTS_TABLE} JOIN diary_analytic_entry e ON e.id = {search.FTS_TABLE}.rowid"
+                    f" WHERE {search.FTS_TABLE} MATCH ? ORDER BY bm25({search.FTS_TABLE}) LIMIT 20",
+                    [search.build_match_query(q)],
+                ).fetchall()
+
+            t_like, _ = timed(like)
+            t_fts, found = timed(fts)
+            results.append({
+                "scale": scale,
+                "days": days,
+                "query": q,
+                "like_ms": round(t_like * 1000, 3),
+                "fts_ms": round(t_fts * 1000, 3),
+                "found": len(found),
+            })
+        db.close()
+    return results
+
+
+# --------------------------------------------------------------------
+# 🔗 Suite: корреляции — pandas.corr против сумм и инкрементального шага
+# --------------------------------------------------------------------
+
+def bench_correlations(scales):
+    results = []
+    for scale in scales:
+        dates, keys, values = synthetic_triples(scale)
+        matrix = DiaryMatrix.from_triples(dates, keys, values)
+        frame = matrix.to_frame()
+
+        # Правка одного значения: та же матрица с другим значением в одной ячейке
+        edited_values = np.array(matrix.values)
+        edited_values[len(matrix) // 2, 0] = (edited_values[len(matrix) // 2, 0] + 1) % 6
+        mask = matrix.mask
+        mask[len(matrix) // 2, 0] = True
+        edited = DiaryMatrix(matrix.dates, matrix.keys, edited_values, mask)
+
+        def incremental(lag):
+            def run():
+                accumulator = correlations.PearsonAccumulator(lag)
+                accumulator.advance(matrix)
+                start = time.perf_counter()
+                accumulator.advance(edited)
+                return time.perf_counter() - start
+            return run
+
+        row = {
+            "scale": scale,
+            "shape": list(matrix.shape),
+            "pandas_corr_s": round(timed(lambda: frame.corr(min_periods=correlations.MIN_PERIODS))[0], 4),
+            "pandas_spearman_s": round(timed(lambda: frame.corr(method="spearman", min_periods=correlations.MIN_PERIODS))[0], 4),
+            "spearman_s": round(timed(lambda: correlations.spearman(matrix))[0], 4),
+        }
+        for lag in (0, 1):
+            row[f"full_lag{lag}_s"] = round(timed(lambda: correlations.full_stats(matrix, lag).correlation())[0], 4)
+            row[f"incremental_lag{lag}_s"] = round(min(incremental(lag)() for _ in range(3)), 4)
+        results.append(row)
+    return results
+
+
+# --------------------------------------------------------------------
+# ⏪ Suite: лаговые признаки — pandas shift/rolling против feature_store
+# --------------------------------------------------------------------
+
+def bench_features(scales):
+    results = []
+    for scale in scales:
+        dates, keys, values = synthetic_triples(scale)
+        matrix = DiaryMatrix.from_triples(dates, keys, values)
+        frame = matrix.to_frame()
+
+        def pandas_features():
+            calendar = frame.set_axis(pd.to_datetime(frame.index)).asfreq("D")
+            past = calendar.shift(1)
+            blocks = [calendar.shift(k) for k in feature_store.LAGS]
+            for w in feature_store.WINDOWS:
+                rolling = past.rolling(w, min_periods=1)
+                blocks += [rolling.mean(), rolling.sum()]
+            return pd.concat(blocks, axis=1).loc[pd.to_datetime(frame.index)]
+
+        # Правка одного значения в середине дневника
+        edited_values = np.array(matrix.values)
+        middle = len(matrix) // 2
+        edited_values[middle, 0] = (edited_values[middle, 0] + 1) % 6
+        mask = matrix.mask
+        mask[middle, 0] = True
+        edited = DiaryMatrix(matrix.dates, matrix.keys, edited_values, mask)
+
+        def incremental():
+            store = feature_store.FeatureStore()
+            store.advance(matrix)
+            start = time.perf_counter()
+            store.advance(edited)
+            return time.perf_counter() - start
+
+        results.append({
+            "scale": scale,
+            "shape": list(matrix.shape),
+            "features": len(feature_store.feature_columns(matrix.keys)),
+            "pandas_s": round(timed(pandas_features)[0], 4),
+            "full_s": round(timed(lambda: feature_store.compute_rows(matrix, matrix.dates))[0], 4),
+            "incremental_s": round(min(incremental() for _ in range(3)), 4),
+        })
+    return results
+
+
+# --------------------------------------------------------------------
+# 📉 Suite: история параметра целиком против прореживания LTTB
+# --------------------------------------------------------------------
+
+# Типичная ширина графика истории (пикселей)
+HISTORY_WIDTH = 600
+
+
+def bench_history(scales):
+    versioning._request_version.set(0)
+    results = []
+    for scale in scales:
+        dates, keys, values = synthetic_triples(scale)
+        matrix = DiaryMatrix.from_triples(dates, keys, values)
+        rows, vals = matrix.column_rows(matrix.keys[0])
+        days = matrix.dates[rows].astype(np.int64)
+
+        def full():
+            return len(json_response.dumps(json_response.series_payload(matrix, rows, vals, "rows")))
+
+        def downsampled():
+            keep = downsample.lttb(days, vals, HISTORY_WIDTH)
+            return len(json_response.dumps(json_response.series_payload(matrix, rows[keep], vals[keep], "rows")))
+
+        full_time, full_bytes = timed(full)
+        lttb_time, lttb_bytes = timed(downsampled)
+        results.append({
+            "scale": scale,
+            "points": len(rows),
+            "max_points": HISTORY_WIDTH,
+            "full_s": round(full_time, 4),
+            "full_bytes": full_bytes,
+            "lttb_s": round(lttb_time, 4),
+            "lttb_bytes": lttb_bytes,
+        })
+    return results
+
+
+# --------------------------------------------------------------------
+# 🗂️ Suite: сводки категорий — полный и инкрементальный пересчёт, ряд группы
+# --------------------------------------------------------------------
+
+# Синтетическая иерархия: 5 разделов × 4 подраздела, по 5 параметров
+def synthetic_taxonomy(keys) -> "taxonomy.Taxonomy":
+    return taxonomy.Taxonomy(
+        (key, f"Р{i % 5}-П{i // 5 % 4} :: Параметр {i} :: {{all}} p{i % 5}") for i, key in enumerate(keys)
+    )
+
+
+def bench_categories(scales):
+    results = []
+    for scale in scales:
+        dates, keys, values = synthetic_triples(scale)
+        matrix = DiaryMatrix.from_triples(dates, keys, values)
+        index = synthetic_taxonomy(matrix.keys)
+        membership = index.membership(matrix.keys)
+        positions = np.arange(len(matrix.dates))
+
+        # Одна запись в последний день — как update_value
+        changed = matrix.detached()
+        last = changed.values.shape[0] - 1
+        changed.values[last, 0] = (changed.values[last, 0] + 1) % 6
+        changed.bits[last, 0] |= 0x80
+
+        def incremental():
+            store = taxonomy.RollupStore()
+            store.advance(matrix, index)
+            start = time.perf_counter()
+            store.advance(changed, index)
+            return time.perf_counter() - start
+
+        category = index.categories[0]
+        members = index.members[category]
+
+        def member_series():
+            return sum(
+                len(json_response.dumps(json_response.series_payload(matrix, *matrix.column_rows(key), "rows")))
+                for key in members
+            )
+
+        rollups = taxonomy.RollupStore().advance(matrix, index)
+
+        def category_series():
+            return len(json_response.dumps(json_response.series_payload(matrix, *rollups.series(category), "rows")))
+
+        full_time, _ = timed(lambda: taxonomy.compute_rows(matrix, membership, positions))
+        inc_time = min(incremental() for _ in range(3))
+        members_time, members_bytes = timed(member_series)
+        category_time, category_bytes = timed(category_series)
+        results.append({
+            "scale": scale,
+            "days": len(matrix.dates),
+            "categories": len(index.categories),
+            "full_s": round(full_time, 4),
+            "incremental_s": round(inc_time, 4),
+            "members": len(members),
+            "members_s": round(members_time, 4),
+            "members_bytes": members_bytes,
+            "category_s": round(category_time, 4),
+            "category_bytes": category_bytes,
+        })
+    return results
+
+
+# --------------------------------------------------------------------
+# 🗜️ Suite: байты на загрузку страницы — без сжатия против gzip/предсжатой статики
+# --------------------------------------------------------------------
+
+_ASSET_RE = re.compile(r'(?:src|href)="/static/([^"?]+)')
+
+
+def bench_static(scales):
+    """
+    Одно открытие /add/ как в diary.js: HTML, статика, прогнозы и история
+    всех параметров (график с max_points + полная для сумм). Повторная
+    загрузка: не запрашивается только статика, отданная с immutable —
+    то есть хэшированная (DEBUG=False после collectstatic); остальная
+    считается загруженной заново.
+    """
+    from django.contrib.staticfiles import finders
+    from django.test import Client
+
+    from diary_analytic.static_assets import transfer_sizes
+    from diary_analytic.utils import get_diary_matrix
+
+    client = Client(HTTP_HOST="localhost")
+    matrix = get_diary_matrix()
+    day = str(matrix.python_dates()[-1]) if len(matrix) else "2025-01-01"
+
+    def fetch(path):
+        raw = client.get(path)
+        gz = client.get(path, HTTP_ACCEPT_ENCODING="gzip")
+        return {"raw": len(raw.content), "gzip": len(gz.content)}
+
+    def total(items):
+        return {enc: sum(item[enc] for item in items) for enc in ("raw", "gzip")}
+
+    html = client.get(f"/add/?date={day}").content
+    assets, immutable = {}, []
+    for name in sorted(set(_ASSET_RE.findall(html.decode("utf-8", "replace")))):
+        path = finders.find(name) or os.path.join(settings.STATIC_ROOT, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                assets[name] = transfer_sizes(f.read())
+            # Кэшируется ли файл без перепроверки — по фактическому ответу сервера
+            response = client.get(f"/static/{name}")
+            if "immutable" in response.get("Cache-Control", ""):
+                immutable.append(name)
+            if hasattr(response, "close"):
+                response.close()
+
+    history = []
+    for key in matrix.keys:
+        history.append(fetch(f"/api/parameter_history/?param={key}&date={day}&max_points=600"))
+        history.append(fetch(f"/api/parameter_history/?param={key}&date={day}"))
+
+    page = {
+        "html": fetch(f"/add/?date={day}"),
+        "static": total(assets.values()),
+        "predictions": fetch(f"/get_predictions/?date={day}"),
+        "history": total(history),
+    }
+    first = total(page.values())
+    cached = total([assets[name] for name in immutable])
+    return [{
+        "day": day,
+        "debug": settings.DEBUG,
+        "history_requests": len(history),
+        "assets": assets,
+        "immutable_assets": immutable,
+        "first_load": {**page, "total": first},
+        # Повторно: immutable-статика из кэша браузера без перепроверки, остальное — заново
+        "repeat_load_gzip": first["gzip"] - cached["gzip"],
+        "repeat_load_raw_before": first["raw"],
+    }]
+
+
+SUITES = {
+    "matrix": bench_matrix,
+    "json": bench_json,
+    "async": bench_async,
+    "writes": bench_writes,
+    "search": bench_search,
+    "correlations": bench_correlations,
+    "features": bench_features,
+    "history": bench_history,
+    "categories": bench_categories,
+    "static": bench_static,
+}
+
+
+class Command(BaseCommand):
+    help = "Замеры производительности подсистем дневника (синтетические данные)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("suite", choices=sorted(SUITES), help="Что замерять")
+        parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100],
+                            help="Размер данных относительно текущего дневника")
+
+    def handle(self, *args, **options):
+        suite = SUITES.get(options["suite"])
+        if suite is None:
+            raise CommandError(f"Неизвестный набор замеров: {options['suite']}")
+        results = suite(options["scales"])
+        self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
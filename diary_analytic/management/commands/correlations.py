@@ -0,0 +1,46 @@
+"""
+🔗 manage.py correlations — самые сильные связи между параметрами
+
+Примеры:
+    python manage.py correlations                          # топ пар (Пирсон, тот же день)
+    python manage.py correlations --lag 1 --target toshn   # что вчера связано с тошнотой сегодня
+    python manage.py correlations --method spearman --output corr.csv   # полная матрица r в CSV
+"""
+
+import json
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from diary_analytic.correlations import MAX_LAG, METHODS, MIN_PERIODS, get_correlations
+
+
+class Command(BaseCommand):
+    help = "Попарные корреляции и совместная встречаемость параметров дневника"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--method", choices=METHODS, default="pearson")
+        parser.add_argument("--lag", type=int, default=0, help=f"Сдвиг в днях (0..{MAX_LAG})")
+        parser.add_argument("--min-periods", type=int, default=MIN_PERIODS, help="Минимум общих дней")
+        parser.add_argument("--target", help="Ключ параметра: только связанные с ним")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--output", help="Сохранить полную матрицу r в CSV")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["lag"] <= MAX_LAG:
+            raise CommandError(f"--lag должен быть в диапазоне 0..{MAX_LAG}")
+        result = get_correlations(options["method"], options["lag"])
+        min_periods = options["min_periods"]
+
+        if options["output"]:
+            pd.DataFrame(result.masked_r(min_periods), index=result.keys, columns=result.keys).to_csv(options["output"])
+            self.stdout.write(self.style.SUCCESS(f"✅ Матрица {len(result.keys)}×{len(result.keys)} → {options['output']}"))
+            return
+
+        if options["target"]:
+            if result.key_position(options["target"]) is None:
+                raise CommandError(f"Параметр не найден: {options['target']}")
+            rows = result.top(options["target"], min_periods, options["limit"])
+        else:
+            rows = result.top_pairs(min_periods, options["limit"])
+        self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
@@ -0,0 +1,407 @@
+"""
+🏋️ manage.py loadtest — нагрузочный прогон «как в браузере» на одноразовой копии
+
+Примеры:
+    python manage.py loadtest
+    python manage.py loadtest --users 20 --duration 60
+    python manage.py loadtest --seed synthetic --days 1000 --params 100
+    python manage.py loadtest --seed export --export-file other/export.csv
+    python manage.py loadtest --server gunicorn --workers 4 --output report.json
+    python manage.py loadtest --server asgi --api async
+
+Приложение поднимается отдельным процессом на локальном порту с собственной
+БД, снимками, экспортом, моделями и метриками во временном каталоге, так что
+рабочая база не меняется. Источник данных (--seed):
+    copy      — копия текущей БД и моделей (по умолчанию);
+    synthetic — пустая БД + случайный дневник --days × --params;
+    export    — пустая БД + импорт CSV/XLSX из --export-file (формат export.csv).
+
+Каждый пользователь — поток, который повторяет то, что делает diary.js:
+    - открывает /add/?date=... и берёт ключи параметров из страницы;
+    - запрашивает прогнозы и разом историю всех параметров (график + суммы,
+      не больше BROWSER_CONNECTIONS запросов одновременно, как браузер);
+    - серией кликов меняет значения (/update_value/ + перезагрузка прогнозов);
+    - изредка нажимает «переобучить модели» (--retrain-prob на итерацию).
+
+Итог — JSON: пропускная способность, p50/p95/p99 и доля ошибок по каждому
+эндпоинту.
+"""
+
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from diary_analytic import archive
+
+# Браузер держит не больше 6 соединений на хост
+BROWSER_CONNECTIONS = 6
+# Ширина графика истории в пикселях (max_points, см. diary.js)
+CHART_WIDTH = 600
+# Сколько ждать запуска сервера (сек)
+STARTUP_TIMEOUT = 90
+# Из скольких последних дней дневника пользователи выбирают день
+RECENT_DAYS = 30
+
+_KEY_RE = re.compile(r'class="parameter-block[^"]*"[^>]*data-key="([^"]+)"')
+
+SYNTHETIC_SCRIPT = """
+import django, sys
+django.setup()
+import numpy as np
+from datetime import date, timedelta
+from django.db import transaction
+from diary_analytic.models import Entry, EntryValue, Parameter
+from diary_analytic.signals import schedule_data_refresh
+days, params, density = int(sys.argv[1]), int(sys.argv[2]), float(sys.argv[3])
+rng = np.random.default_rng(0)
+groups = ["ЕДА-ПНК 🍽️", "ЖВТ-ОБЩ 🫀", "СОН 😴", "НАСТР 🙂", "СПОРТ 🏃"]
+today = date.today()
+with transaction.atomic():
+    parameters = Parameter.objects.bulk_create([
+        Parameter(key=f"param_{i:03d}", name=f"{groups[i % len(groups)]} :: Параметр {i} :: p2")
+        for i in range(params)
+    ])
+    entries = Entry.objects.bulk_create([Entry(date=today - timedelta(days=d)) for d in range(days)])
+    rows, cols = np.nonzero(rng.random((days, params)) < density)
+    values = rng.integers(0, 6, size=len(rows))
+    EntryValue.objects.bulk_create(
+        [EntryValue(entry=entries[r], parameter=parameters[c], value=float(v)) for r, c, v in zip(rows, cols, values)],
+        batch_size=5000,
+    )
+    schedule_data_refresh()
+print(len(rows))
+"""
+
+EXPORT_SCRIPT = """
+import django, sys
+django.setup()
+import pandas as pd
+from django.db import transaction
+from diary_analytic.importers.excel_entry_importer import import_excel_dataframe
+path = sys.argv[1]
+df = pd.read_excel(path) if path.endswith(".xlsx") else pd.read_csv(path, encoding="utf-8-sig")
+# В export.csv даты ДД.ММ.ГГ — переводим в ISO, чтобы не перепутать день и месяц
+dates = pd.to_datetime(df.iloc[:, 0].astype(str), format="%d.%m.%y", errors="coerce")
+df.iloc[:, 0] = dates.dt.strftime("%Y-%m-%d")
+df = df[dates.notna()]
+with transaction.atomic():
+    created, updated = import_excel_dataframe(df)
+print(created)
+"""
+
+
+# --------------------------------------------------------------------
+# 🗄️ Одноразовое окружение
+# --------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _disposable_env(tmp: str) -> dict:
+    return dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings"),
+        DIARY_DB_PATH=os.path.join(tmp, "db.sqlite3"),
+        DIARY_SNAPSHOT_DIR=os.path.join(tmp, "snapshots"),
+        DIARY_EXPORT_PATH=os.path.join(tmp, "export.csv"),
+        DIARY_MODELS_DIR=os.path.join(tmp, "models"),
+        DIARY_METRICS_DIR=os.path.join(tmp, "metrics"),
+        # Архив — рядом с копией БД (<db>.archive), а не общий каталог
+        DIARY_ARCHIVE_DIR="",
+        PYTHONUNBUFFERED="1",
+    )
+
+
+def _run(env: dict, *args) -> str:
+    result = subprocess.run(
+        [sys.executable, *args], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f"Ошибка подготовки данных: {result.stderr.strip()[-2000:]}")
+    return result.stdout.strip()
+
+
+def seed(env: dict, options) -> str:
+    """Наполняет одноразовую БД; возвращает описание источника для отчёта."""
+    tmp_db = env["DIARY_DB_PATH"]
+    if options["seed"] == "copy":
+        shutil.copy(settings.DATABASES["default"]["NAME"], tmp_db)
+        # Архив закрытых лет (archive.py) лежит рядом с файлом БД и едет вместе с ней
+        archive_dir = archive.archive_dir()
+        if archive_dir is not None and archive_dir.is_dir():
+            shutil.copytree(archive_dir, f"{tmp_db}.archive")
+        models_dir = settings.DIARY_MODELS_DIR
+        if os.path.isdir(models_dir):
+            shutil.copytree(models_dir, env["DIARY_MODELS_DIR"], symlinks=True,
+                            ignore=shutil.ignore_patterns(".tmp-*", "*.csv"))
+        _run(env, "manage.py", "migrate", "--noinput", "-v", "0")
+        return "copy"
+
+    os.makedirs(env["DIARY_MODELS_DIR"], exist_ok=True)
+    _run(env, "manage.py", "migrate", "--noinput", "-v", "0")
+    if options["seed"] == "synthetic":
+        count = _run(env, "-c", SYNTHETIC_SCRIPT, str(options["days"]), str(options["params"]), str(options["density"]))
+        return f"synthetic ({options['days']} days × {options['params']} params, {count} values)"
+
+    export_file = options["export_file"]
+    if not export_file or not os.path.exists(export_file):
+        raise CommandError("Для --seed export нужен существующий --export-file")
+    count = _run(env, "-c", EXPORT_SCRIPT, os.path.abspath(export_file))
+    return f"export ({export_file}, {count} values)"
+
+
+def last_day(env: dict) -> date:
+    """Последний день с записью в одноразовой БД (пользователи открывают дни около него)."""
+    conn = sqlite3.connect(env["DIARY_DB_PATH"])
+    try:
+        value = conn.execute("SELECT MAX(date) FROM diary_analytic_entry").fetchone()[0]
+    finally:
+        conn.close()
+    return date.fromisoformat(value) if value else date.today()
+
+
+def start_server(env: dict, options, port: int, log_path: str) -> subprocess.Popen:
+    server = options["server"]
+    if server == "runserver":
+        cmd = [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"]
+    elif server == "gunicorn":
+        if importlib.util.find_spec("gunicorn") is None:
+            raise CommandError("gunicorn не установлен: pip install gunicorn")
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+               "--bind", f"127.0.0.1:{port}", "--workers", str(options["workers"])]
+    else:
+        if importlib.util.find_spec("uvicorn") is None:
+            raise CommandError("uvicorn не установлен: pip install uvicorn")
+        cmd = [sys.executable, "manage.py", "runasgi", "--port", str(port), "--workers", str(options["workers"])]
+    log = open(log_path, "w")
+    return subprocess.Popen(cmd, env=env, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(process: subprocess.Popen, base: str, log_path: str):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as f:
+                raise CommandError(f"Сервер завершился при запуске:\n{f.read()[-2000:]}")
+        try:
+            with urllib.request.urlopen(base + "/metrics", timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise CommandError(f"Сервер не ответил за {STARTUP_TIMEOUT} с")
+
+
+# --------------------------------------------------------------------
+# 👤 Пользователь, повторяющий diary.js
+# --------------------------------------------------------------------
+
+class Recorder:
+    """Результаты всех запросов: (эндпоинт, время, ошибка или None)."""
+
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, latency: float, error: str | None):
+        with self.lock:
+            self.samples.append((endpoint, latency, error))
+
+
+class SimulatedUser:
+    def __init__(self, base: str, recorder: Recorder, options, last: date, seed: int):
+        self.base = base
+        self.last = last
+        self.recorder = recorder
+        self.api = "/async" if options["api"] == "async" else ""
+        self.retrain_prob = options["retrain_prob"]
+        self.think = options["think"]
+        self.timeout = options["timeout"]
+        self.rng = random.Random(seed)
+        self.pool = ThreadPoolExecutor(BROWSER_CONNECTIONS)
+
+    def request(self, endpoint: str, path: str, body: dict | None = None) -> bytes | None:
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base + path, data=data, method="POST" if data is not None else "GET")
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        start = time.perf_counter()
+        error, content = None, None
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                content = response.read()
+        except urllib.error.HTTPError as e:
+            error = str(e.code)
+        except Exception as e:
+            error = type(e).__name__
+        self.recorder.add(endpoint, time.perf_counter() - start, error)
+        return content
+
+    def pause(self):
+        time.sleep(self.rng.uniform(0, 2 * self.think))
+
+    def open_day(self, day: str) -> list[str]:
+        html = self.request("add_entry", f"/add/?date={day}")
+        keys = _KEY_RE.findall(html.decode("utf-8", "replace")) if html else []
+        self.load_predictions(day)
+
+        # Графики (прореженные) и суммы (полная история) по всем параметрам разом
+        min_date = (date.fromisoformat(day) - timedelta(days=365)).isoformat()
+        history = f"{self.api}/api/parameter_history/?date={day}&param="
+        paths = [history + keys[0]] if keys else []
+        paths += [f"{history}{key}&from={min_date}&max_points={CHART_WIDTH}" for key in keys]
+        paths += [history + key for key in keys]
+        list(self.pool.map(lambda p: self.request("parameter_history", p), paths))
+        return keys
+
+    def load_predictions(self, day: str):
+        self.request("get_predictions", f"{self.api}/get_predictions/?date={day}")
+
+    def click_burst(self, day: str, keys: list[str]):
+        for _ in range(self.rng.randint(1, 5)):
+            value = None if self.rng.random() < 0.1 else self.rng.randint(0, 5)
+            self.request("update_value", "/update_value/", {"parameter": self.rng.choice(keys), "value": value, "date": day})
+            self.load_predictions(day)
+            time.sleep(self.rng.uniform(0, self.think / 2))
+
+    def run(self, deadline: float):
+        try:
+            while time.monotonic() < deadline:
+                day = (self.last - timedelta(days=self.rng.randrange(RECENT_DAYS))).isoformat()
+                keys = self.open_day(day)
+                self.pause()
+                if keys and time.monotonic() < deadline:
+                    self.click_burst(day, keys)
+                if self.rng.random() < self.retrain_prob and time.monotonic() < deadline:
+                    self.request("retrain_models_all", "/retrain_models_all/", {})
+                self.pause()
+        finally:
+            self.pool.shutdown()
+
+
+# --------------------------------------------------------------------
+# 📋 Отчёт
+# --------------------------------------------------------------------
+
+def summarize(samples, wall: float) -> dict:
+    endpoints = {}
+    for name in sorted({s[0] for s in samples}):
+        rows = [s for s in samples if s[0] == name]
+        latencies = np.array([s[1] for s in rows]) * 1000
+        errors = {}
+        for _, _, error in rows:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        endpoints[name] = {
+            "requests": len(rows),
+            "rps": round(len(rows) / wall, 2),
+            "errors": errors,
+            "error_rate": round(sum(errors.values()) / len(rows), 4),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(float(latencies.max()), 1),
+        }
+    failed = sum(1 for s in samples if s[2] is not None)
+    return {
+        "wall_s": round(wall, 2),
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "error_rate": round(failed / len(samples), 4) if samples else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный прогон: одноразовая копия приложения + пользователи, повторяющие diary.js"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Одновременных пользователей")
+        parser.add_argument("--duration", type=float, default=30, help="Длительность, сек")
+        parser.add_argument("--think", type=float, default=0.5, help="Средняя пауза пользователя, сек")
+        parser.add_argument("--retrain-prob", type=float, default=0.02,
+                            help="Вероятность переобучения на итерацию пользователя")
+        parser.add_argument("--timeout", type=float, default=120, help="Таймаут одного запроса, сек")
+        parser.add_argument("--server", choices=["runserver", "gunicorn", "asgi"], default="runserver")
+        parser.add_argument("--workers", type=int, default=4, help="Воркеры gunicorn/uvicorn")
+        parser.add_argument("--api", choices=["sync", "async"], default="sync",
+                            help="Прогнозы и история через /... или /async/...")
+        parser.add_argument("--port", type=int, default=0, help="Порт (0 — свободный)")
+        parser.add_argument("--seed", choices=["copy", "synthetic", "export"], default="copy")
+        parser.add_argument("--days", type=int, default=365, help="synthetic: дней")
+        parser.add_argument("--params", type=int, default=100, help="synthetic: параметров")
+        parser.add_argument("--density", type=float, default=0.33, help="synthetic: доля заполненных ячеек")
+        parser.add_argument("--export-file", help="export: CSV/XLSX в формате export.csv")
+        parser.add_argument("--output", help="Куда записать JSON-отчёт (по умолчанию stdout)")
+        parser.add_argument("--keep", action="store_true", help="Не удалять временный каталог (БД, лог сервера)")
+
+    def handle(self, *args, **options):
+        tmp = tempfile.mkdtemp(prefix="diary-loadtest-")
+        env = _disposable_env(tmp)
+        port = options["port"] or _free_port()
+        base = f"http://127.0.0.1:{port}"
+        log_path = os.path.join(tmp, "server.log")
+        process = None
+        try:
+            source = seed(env, options)
+            self.stderr.write(f"🗄️ Данные: {source}; сервер {options['server']} на {base}")
+            process = start_server(env, options, port, log_path)
+            wait_ready(process, base, log_path)
+
+            recorder = Recorder()
+            deadline = time.monotonic() + options["duration"]
+            last = last_day(env)
+            users = [SimulatedUser(base, recorder, options, last, seed=i) for i in range(options["users"])]
+            threads = [threading.Thread(target=user.run, args=(deadline,), daemon=True) for user in users]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            if options["keep"]:
+                self.stderr.write(f"📁 Временный каталог: {tmp}")
+            else:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+        report = {
+            "server": options["server"],
+            "api": options["api"],
+            "seed": source,
+            "users": options["users"],
+            "duration_s": options["duration"],
+            **summarize(recorder.samples, wall),
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(text)
+        self.stdout.write(text)
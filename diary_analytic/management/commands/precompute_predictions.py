@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from diary_analytic.prediction_store import STRATEGIES, precompute_predictions
+
+
+class Command(BaseCommand):
+    help = 'Предрасчитывает прогнозы всех стратегий на все даты дневника (+ сегодня)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategy', action='append', choices=STRATEGIES,
+                            help='Только указанные стратегии (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        written = precompute_predictions(options['strategy'])
+        for strategy, count in written.items():
+            self.stdout.write(self.style.SUCCESS(f'✅ {strategy}: записано прогнозов — {count}'))
@@ -0,0 +1,23 @@
+"""
+🔎 manage.py rebuild_search_index — пересборка FTS5-индекса комментариев
+
+Примеры:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --recreate   # заново создать таблицу и триггеры
+"""
+
+from django.core.management.base import BaseCommand
+
+from diary_analytic.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс комментариев дней (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recreate', action='store_true',
+                            help='Удалить и заново создать индекс и триггеры (например, после восстановления БД)')
+
+    def handle(self, *args, **options):
+        count = rebuild_index(recreate=options['recreate'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Индекс комментариев пересобран: {count} дней'))
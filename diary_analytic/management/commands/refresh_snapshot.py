@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from diary_analytic.snapshot import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает memmap-снимок дневника из БД'
+
+    def handle(self, *args, **kwargs):
+        matrix = refresh_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'✅ Снимок дневника обновлён: {matrix.shape[0]} дней × {matrix.shape[1]} параметров'))
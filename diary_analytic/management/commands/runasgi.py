@@ -0,0 +1,39 @@
+"""
+⚡ manage.py runasgi — локальный запуск под ASGI (uvicorn)
+
+Примеры:
+    python manage.py runasgi
+    python manage.py runasgi --port 8001 --workers 2
+
+Async-вьюхи (async_views.py) работают и под runserver/gunicorn, но только под
+ASGI-сервером один процесс обслуживает много одновременных запросов.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Запускает приложение под ASGI-сервером uvicorn (config.asgi:application)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--log-level", default="info")
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("uvicorn не установлен: pip install uvicorn")
+
+        self.stdout.write(f"⚡ ASGI: http://{options['host']}:{options['port']}/ (workers={options['workers']})")
+        uvicorn.run(
+            "config.asgi:application",
+            host=options["host"],
+            port=options["port"],
+            workers=options["workers"],
+            log_level=options["log_level"],
+            # lifespan у Django нет
+            lifespan="off",
+        )
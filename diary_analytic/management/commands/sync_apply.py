@@ -0,0 +1,54 @@
+"""
+📥 manage.py sync_apply — применение дельт другого устройства (см. changelog.py)
+
+Примеры:
+    python manage.py sync_apply sync/deltas/                 # все новые дельты каталога
+    python manage.py sync_apply delta-laptop-000000001-000000042.json.gz
+    python manage.py sync_apply sync/deltas/ --again         # и уже применённые (идемпотентно)
+"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diary_analytic import changelog
+
+
+class Command(BaseCommand):
+    help = "Применяет дельты журнала изменений (последняя запись побеждает)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="Файлы или каталоги дельт (по умолчанию DIARY_SYNC_DIR)")
+        parser.add_argument("--again", action="store_true", help="Применить и уже применённые файлы")
+
+    def handle(self, *args, **options):
+        files = []
+        for raw in options["paths"] or [changelog.sync_dir()]:
+            path = Path(raw)
+            if path.is_dir():
+                files.extend(sorted(path.glob(f"{changelog.DELTA_PREFIX}*{changelog.DELTA_SUFFIX}")))
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f"Нет такого файла или каталога: {path}")
+
+        device = changelog.device_id()
+        state = changelog.read_state()
+        applied = set(state["applied"])
+        for path in files:
+            if path.name in applied and not options["again"]:
+                continue
+            try:
+                body = changelog.read_delta(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"{path}: {e}")
+            if body["origin"] == device:
+                continue  # своя дельта
+            stats = changelog.apply_delta(body)
+            applied.add(path.name)
+            self.stdout.write(self.style.SUCCESS(f"📥 {path.name}: {stats.as_dict()}"))
+
+        state = changelog.read_state()
+        state["applied"] = sorted(applied)
+        changelog.write_state(state)
+        self.stdout.write(f"Устройство: {device}")
@@ -0,0 +1,44 @@
+"""
+📤 manage.py sync_export — дельта журнала изменений для другого устройства (см. changelog.py)
+
+Примеры:
+    python manage.py sync_export --peer laptop              # с прошлого экспорта для laptop
+    python manage.py sync_export --peer laptop --since 0    # всё, что есть в журнале
+    python manage.py sync_export --output /mnt/usb/deltas
+"""
+
+from django.core.management.base import BaseCommand
+
+from diary_analytic import changelog
+
+
+class Command(BaseCommand):
+    help = "Пишет изменения журнала после курсора в сжатый файл дельты"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--peer", default="default",
+                            help="Имя получателя: курсор хранится для каждого отдельно")
+        parser.add_argument("--exclude-origin", default=None,
+                            help="id устройства получателя (см. sync_apply): его же изменения назад "
+                                 "не отправляются. Без него они придут как duplicate")
+        parser.add_argument("--since", type=int, default=None,
+                            help="Курсор (ChangeLog.id), по умолчанию — сохранённый для peer")
+        parser.add_argument("--output", default=None, help="Каталог дельт (по умолчанию DIARY_SYNC_DIR)")
+        parser.add_argument("--dry-run", action="store_true", help="Не сдвигать сохранённый курсор")
+
+    def handle(self, *args, **options):
+        peer = options["peer"]
+        state = changelog.read_state()
+        since = options["since"] if options["since"] is not None else state["exported"].get(peer, 0)
+
+        path, cursor, count = changelog.export_delta(since, exclude_origin=options["exclude_origin"], output=options["output"])
+        if not options["dry_run"] and cursor != since:
+            state = changelog.read_state()
+            state["exported"][peer] = cursor
+            changelog.write_state(state)
+        if path is None:
+            self.stdout.write(f"Нет изменений для {peer} после курсора {since}")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"📤 {path.name}: изменений — {count}, курсор {since} → {cursor} ({path.stat().st_size} байт)"
+        ))
@@ -0,0 +1,35 @@
+"""
+♨️ manage.py unarchive — возврат архивных лет в EntryValue (см. archive.py)
+
+Примеры:
+    python manage.py unarchive 2023
+    python manage.py unarchive --all
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diary_analytic import archive
+
+
+class Command(BaseCommand):
+    help = "Возвращает значения архивных лет в живую таблицу (снова доступны для записи)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("years", nargs="*", type=int, help="Годы из архива")
+        parser.add_argument("--all", action="store_true", help="Все архивные годы")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            years = [int(part["period"]) for part in archive.partitions()]
+        else:
+            years = options["years"]
+        if not years:
+            raise CommandError("Укажите годы или --all")
+
+        archived = {part["period"] for part in archive.partitions()}
+        for year in sorted(years):
+            if str(year) not in archived:
+                self.stdout.write(f"— {year}: нет в архиве")
+                continue
+            restored = archive.unarchive_year(year)
+            self.stdout.write(self.style.SUCCESS(f"♨️ {year}: возвращено значений — {restored}"))
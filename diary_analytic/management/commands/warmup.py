@@ -0,0 +1,112 @@
+"""
+🔥 manage.py warmup — прогрев процесса (то же, что делает gunicorn.conf.py до fork)
+
+Примеры:
+    python manage.py warmup
+    python manage.py warmup --measure   # воркер без preload против fork прогретого мастера:
+                                        # первые запросы и память воркера
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from diary_analytic.models import EntryValue
+from diary_analytic.warmup import memory_usage, prepare_fork, revalidate, warmup
+
+
+# Воркер без preload: отдельный интерпретатор сам импортирует Django и всё остальное
+COLD_WORKER_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.test import Client
+from diary_analytic.warmup import memory_usage
+result = {"setup_s": round(time.perf_counter() - start, 4), "requests": []}
+client = Client(HTTP_HOST="localhost")
+for path in sys.argv[1:]:
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    result["requests"].append({"path": path, "status": status, "s": round(time.perf_counter() - t, 4)})
+result["memory"] = memory_usage()
+print(json.dumps(result))
+"""
+
+
+def _cold_worker(paths) -> dict:
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings"))
+    out = subprocess.run(
+        [sys.executable, "-c", COLD_WORKER_SCRIPT, *paths],
+        env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _first_requests_in_child(paths, after_fork=None) -> dict:
+    """
+    fork → (after_fork) → по одному запросу на каждый путь через тестовый клиент.
+    Возвращает времена запросов и память дочернего процесса (как у воркера gunicorn).
+    """
+    prepare_fork()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - дочерний процесс
+        os.close(read_fd)
+        try:
+            from django.test import Client
+
+            result = {"revalidate": after_fork() if after_fork else None, "requests": []}
+            client = Client(HTTP_HOST="localhost")
+            for path in paths:
+                start = time.perf_counter()
+                status = client.get(path).status_code
+                result["requests"].append({"path": path, "status": status, "s": round(time.perf_counter() - start, 4)})
+            result["memory"] = memory_usage()
+        except Exception as e:
+            result = {"error": repr(e)}
+        os.write(write_fd, json.dumps(result, default=str).encode("utf-8"))
+        os._exit(0)
+
+    os.close(write_fd)
+    chunks = []
+    while chunk := os.read(read_fd, 65536):
+        chunks.append(chunk)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return json.loads(b"".join(chunks))
+
+
+class Command(BaseCommand):
+    help = "Прогревает стратегии, модели и матрицу дневника (для gunicorn --preload)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strategy", action="append", help="Стратегия (можно несколько раз; по умолчанию все)")
+        parser.add_argument("--measure", action="store_true",
+                            help="Сравнить первые запросы и память воркера без preload и после fork прогретого процесса")
+
+    def handle(self, *args, **options):
+        strategies = options["strategy"]
+        if not options["measure"]:
+            report = warmup(strategies)
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        # Последний день со значениями: страница дня, прогнозы и история параметра
+        last = EntryValue.objects.order_by("-entry__date").values_list("entry__date", "parameter__key").first()
+        day, key = last or (time.strftime("%Y-%m-%d"), "")
+        paths = [
+            f"/add/?date={day}",
+            f"/get_predictions/?date={day}",
+            f"/api/parameter_history/?param={key}&date={day}",
+        ]
+
+        result = {"cold_worker": _cold_worker(paths)}
+        result["warmup"] = warmup(strategies)
+        result["warm_worker"] = _first_requests_in_child(paths, after_fork=lambda: revalidate(strategies))
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,469 @@
+# diary_analytic/metrics.py
+
+"""
+📊 metrics.py — метрики работы приложения в формате Prometheus (GET /metrics)
+
+До этого о работе сервера можно было судить только по DEBUG-логам в logs/*.log.
+Здесь — счётчики и гистограммы, которые дёшево обновлять из горячих путей:
+
+    - HTTP_REQUESTS / HTTP_SECONDS / DB_QUERIES — запросы по вьюхам (MetricsMiddleware);
+    - MODEL_LOAD_SECONDS / PREDICT_SECONDS       — загрузка моделей и прогнозы по стратегиям;
+    - TRAIN_SECONDS / TRAIN_TARGET_SECONDS       — обучение стратегии и каждого target;
+    - REFRESH_SECONDS                            — снимок, экспорт и прогнозы после записи (signals.py);
+    - CACHE_REQUESTS                             — попадания/промахи внутренних кэшей.
+
+Несколько процессов (воркеры gunicorn):
+    значения живут в памяти процесса (обновление — словарь под своим локом),
+    а раз в FLUSH_INTERVAL секунд процесс пишет их в DIARY_METRICS_DIR/<pid>-<start>.json
+    (атомарно, через os.replace; start — время запуска, чтобы новый процесс с тем же
+    pid не перезаписал файл завершившегося). /metrics складывает файлы всех процессов.
+    Файл завершившегося процесса «усыновляет» первый, кто его встретит:
+    значения прибавляются к своим, так счётчики не уменьшаются после
+    перезапуска воркеров. DIARY_METRICS_DIR включает только gunicorn.conf.py —
+    тесты и команды manage.py не смешивают свои значения с сервером;
+    без него — только текущий процесс.
+
+Пример:
+    with metrics.PREDICT_SECONDS.time(strategy="base"):
+        ...
+    metrics.cache_hit("models")
+"""
+
+import atexit
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# Как часто процесс сбрасывает свои значения на диск (сек)
+FLUSH_INTERVAL = 1.0
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Все метрики процесса в порядке объявления
+_registry: dict[str, "Metric"] = {}
+
+
+# --------------------------------------------------------------------
+# 🧮 Типы метрик
+# --------------------------------------------------------------------
+
+class Metric:
+    """
+    Метрика с метками. Значение для набора меток — список чисел,
+    которые при объединении процессов складываются поэлементно.
+    """
+
+    kind = ""
+    # Окончание имени семейства в экспозиции (у счётчиков — "_total")
+    family_suffix = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _empty(self) -> list:
+        return [0.0]
+
+    def snapshot(self) -> dict[tuple, list]:
+        with self._lock:
+            return {key: list(value) for key, value in self._values.items()}
+
+    def merge(self, key: tuple, value: list):
+        with self._lock:
+            current = self._values.setdefault(key, self._empty())
+            if len(current) == len(value):
+                for i, v in enumerate(value):
+                    current[i] += v
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self, values: dict[tuple, list]):
+        """Строки экспозиции: (суффикс имени, метки, значение)."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+    family_suffix = "_total"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                self._values[key] = [amount]
+            else:
+                value[0] += amount
+
+    def samples(self, values):
+        for key, (value,) in values.items():
+            yield "", key, (), value
+
+
+class Summary(Metric):
+    """Только сумма и число наблюдений (без корзин) — для меток с большим числом значений."""
+
+    kind = "summary"
+
+    def _empty(self) -> list:
+        return [0.0, 0.0]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            current = self._values.setdefault(key, self._empty())
+            current[0] += value
+            current[1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self, values):
+        for key, (total, count) in values.items():
+            yield "_sum", key, (), total
+            yield "_count", key, (), count
+
+
+class Histogram(Summary):
+    """Корзины хранятся без накопления: [в каждой корзине..., выше последней, сумма, число]."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _empty(self) -> list:
+        return [0.0] * (len(self.buckets) + 3)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            current = self._values.setdefault(key, self._empty())
+            current[index] += 1
+            current[-2] += value
+            current[-1] += 1
+
+    def samples(self, values):
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for key, value in values.items():
+            cumulative = 0.0
+            for bound, count in zip(bounds, value[:-2]):
+                cumulative += count
+                yield "_bucket", key, (("le", bound),), cumulative
+            yield "_sum", key, (), value[-2]
+            yield "_count", key, (), value[-1]
+
+
+# --------------------------------------------------------------------
+# 📋 Метрики приложения
+# --------------------------------------------------------------------
+
+HTTP_REQUESTS = Counter(
+    "diary_http_requests", "HTTP-запросы по вьюхам", ("view", "method", "status"))
+HTTP_SECONDS = Histogram(
+    "diary_http_request_duration_seconds", "Время обработки запроса", ("view",))
+DB_QUERIES = Counter(
+    "diary_db_queries", "SQL-запросы, выполненные при обработке HTTP-запросов", ("view",))
+MODEL_LOAD_SECONDS = Histogram(
+    "diary_model_load_seconds", "Чтение поколения моделей с диска", ("strategy",))
+PREDICT_SECONDS = Histogram(
+    "diary_predict_seconds", "Векторный прогноз стратегии (predict_matrix)", ("strategy",))
+TRAIN_SECONDS = Histogram(
+    "diary_train_seconds", "Обучение всех target стратегии", ("strategy",),
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+TRAIN_TARGET_SECONDS = Summary(
+    "diary_train_target_seconds", "Обучение и сохранение модели одного target", ("strategy", "target"))
+REFRESH_SECONDS = Histogram(
+    "diary_refresh_seconds", "Обновление после записи: snapshot, export, predictions", ("stage",))
+CACHE_REQUESTS = Counter(
+    "diary_cache_requests", "Обращения к внутренним кэшам", ("cache", "result"))
+PREDICTION_FALLBACKS = Counter(
+    "diary_prediction_fallbacks", "Прогнозы, посчитанные моделью на запросе (нет предрасчёта)", ("strategy",))
+
+
+def cache_hit(cache: str):
+    CACHE_REQUESTS.inc(cache=cache, result="hit")
+
+
+def cache_miss(cache: str):
+    CACHE_REQUESTS.inc(cache=cache, result="miss")
+
+
+# --------------------------------------------------------------------
+# 💾 Файлы процессов
+# --------------------------------------------------------------------
+
+_flush_lock = threading.Lock()
+_next_flush = 0.0
+
+
+def metrics_dir() -> Path | None:
+    path = getattr(settings, "DIARY_METRICS_DIR", None)
+    return Path(path) if path else None
+
+
+def _new_process_name() -> str:
+    """Имя файла процесса: pid + время запуска (pid переиспользуется системой)."""
+    return f"{os.getpid()}-{time.time_ns()}"
+
+
+_process_name = _new_process_name()
+
+
+def _dump() -> dict:
+    return {
+        name: [[list(key), value] for key, value in metric.snapshot().items()]
+        for name, metric in _registry.items()
+    }
+
+
+def _load(data: dict, into: dict):
+    """Прибавляет значения из файла процесса к into: {name: {key: values}}."""
+    for name, items in data.items():
+        metric = _registry.get(name)
+        if metric is None:
+            continue  # метрика из другой версии кода
+        target = into.setdefault(name, {})
+        for key, value in items:
+            key = tuple(key)
+            current = target.get(key)
+            if current is None:
+                target[key] = list(value)
+            elif len(current) == len(value):
+                target[key] = [a + b for a, b in zip(current, value)]
+
+
+def flush():
+    """Записывает значения текущего процесса в DIARY_METRICS_DIR/<pid>-<start>.json."""
+    global _next_flush
+    directory = metrics_dir()
+    if directory is None:
+        return
+    with _flush_lock:
+        _next_flush = time.monotonic() + FLUSH_INTERVAL
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{_process_name}.json"
+            tmp = directory / f".{_process_name}.json.tmp"
+            tmp.write_text(json.dumps(_dump()), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            pass  # метрики не должны ломать запросы
+
+
+def maybe_flush():
+    """Дешёвая проверка после запроса: пишет файл не чаще FLUSH_INTERVAL."""
+    if time.monotonic() >= _next_flush:
+        flush()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _orphaned(stem: str) -> bool:
+    """Файл процесса, который уже завершился (в т.ч. прежнего процесса с нашим pid)."""
+    pid = stem.partition("-")[0]
+    if stem == _process_name or not pid.isdigit():
+        return False
+    return int(pid) == os.getpid() or not _alive(int(pid))
+
+
+def _adopt(path: Path):
+    """Забирает файл завершившегося процесса и прибавляет его значения к своим."""
+    claimed = path.with_name(f"{path.name}.adopt-{os.getpid()}")
+    try:
+        os.rename(path, claimed)  # только один процесс переименует файл
+    except OSError:
+        return
+    try:
+        data = json.loads(claimed.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    merged = {}
+    _load(data, merged)
+    for name, values in merged.items():
+        for key, value in values.items():
+            _registry[name].merge(key, value)
+    claimed.unlink(missing_ok=True)
+    flush()
+
+
+def collect() -> dict:
+    """Значения всех процессов: {name: {key: values}}."""
+    directory = metrics_dir()
+    if directory is None:
+        return {name: metric.snapshot() for name, metric in _registry.items()}
+
+    flush()
+    for path in directory.glob("*.json"):
+        if _orphaned(path.stem):
+            _adopt(path)
+    merged = {}
+    for path in directory.glob("*.json"):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue  # файл удалён или усыновлён между glob и чтением
+        _load(data, merged)
+    return merged
+
+
+# --------------------------------------------------------------------
+# 📝 Текстовый формат Prometheus
+# --------------------------------------------------------------------
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    values = collect()
+    lines = []
+    for name, metric in _registry.items():
+        # В текстовом формате 0.0.4 TYPE относится к имени семейства, а не к базовому:
+        # у счётчика это diary_http_requests_total, как и у его строк
+        family = name + metric.family_suffix
+        lines.append(f"# HELP {family} {metric.help}")
+        lines.append(f"# TYPE {family} {metric.kind}")
+        for suffix, key, extra, value in metric.samples(values.get(name, {})):
+            pairs = list(zip(metric.labelnames, key)) + list(extra)
+            labels = ",".join(f'{label}="{_escape(v)}"' for label, v in pairs)
+            lines.append(f"{family}{suffix}{{{labels}}} {_format_value(value)}" if labels
+                         else f"{family}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --------------------------------------------------------------------
+# 🧭 Middleware: запросы, время и число SQL-запросов по вьюхам
+# --------------------------------------------------------------------
+
+# Счётчик SQL-запросов текущего HTTP-запроса (список из одного числа, общий
+# для потоков async-вьюх: run_blocking копирует контекст вместе с этим списком)
+_query_count: contextvars.ContextVar[list | None] = contextvars.ContextVar("diary_query_count", default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+connection_created.connect(_install_query_counter)
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Считает запросы, время ответа и SQL-запросы по имени маршрута.
+    Ставится первым в MIDDLEWARE, чтобы время включало остальные middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _query_count.set([0])
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._record(request, response, start)
+            _query_count.reset(token)
+
+    async def __acall__(self, request):
+        token = _query_count.set([0])
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._record(request, response, start)
+            _query_count.reset(token)
+
+    @staticmethod
+    def _record(request, response, start: float):
+        view = _view_name(request)
+        HTTP_SECONDS.observe(time.perf_counter() - start, view=view)
+        HTTP_REQUESTS.inc(view=view, method=request.method,
+                          status=response.status_code if response is not None else 500)
+        DB_QUERIES.inc(_query_count.get()[0], view=view)
+        maybe_flush()
+
+
+# --------------------------------------------------------------------
+# 🔀 fork и завершение процесса
+# --------------------------------------------------------------------
+
+def _after_fork_in_child():
+    """Дочерний процесс (воркер gunicorn) начинает с нуля: значения мастера — в его файле."""
+    global _next_flush, _process_name
+    _process_name = _new_process_name()
+    for metric in _registry.values():
+        metric.reset()
+    _next_flush = 0.0
+
+
+os.register_at_fork(before=flush, after_in_child=_after_fork_in_child)
+atexit.register(flush)
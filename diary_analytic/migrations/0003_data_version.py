@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:34
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    DataVersion = apps.get_model('diary_analytic', 'DataVersion')
+    DataVersion.objects.get_or_create(pk=1, defaults={'version': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_analytic', '0002_parameter_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
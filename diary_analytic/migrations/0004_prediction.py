@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_analytic', '0003_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy', models.CharField(max_length=50)),
+                ('target', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('value', models.FloatField(null=True)),
+                ('model_version', models.BigIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'strategy'], name='diary_analy_date_0ba85c_idx')],
+                'unique_together': {('strategy', 'target', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_analytic', '0005_entry_comment_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=64)),
+                ('changed_at', models.DateTimeField()),
+                ('kind', models.CharField(max_length=20)),
+                ('date', models.DateField(null=True)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('value', models.FloatField(null=True)),
+                ('payload', models.JSONField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'date', 'key'], name='diary_analy_kind_86cf31_idx')],
+            },
+        ),
+    ]
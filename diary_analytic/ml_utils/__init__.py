@@ -1,8 +1,10 @@
-from . import base_model, flags_model  # Добавляй сюда другие модели по мере необходимости
+from . import base_model, flags_model, lagged_model  # Добавляй сюда другие модели по мере необходимости
 
 def get_model(name: str):
     if name == "base":
         return base_model
     elif name == "flags":
         return flags_model
+    elif name == "lagged":
+        return lagged_model
     raise ValueError(f"Неизвестная модель: {name}")
@@ -0,0 +1,121 @@
+"""
+🧱 features.py — общая матрица признаков для всех стратегий
+
+Раньше каждая стратегия для каждого target заново делала reset_index(),
+удаляла столбцы, проверяла каждую ячейку через isinstance и строила маски NaN.
+Теперь FeatureMatrix строится один раз на переобучение:
+
+    - типы столбцов проверяются один раз (по dtype, а не по ячейкам);
+    - значения лежат в одном непрерывном float64-массиве (даты × параметры);
+    - маска пропусков и число пропусков в строке считаются один раз;
+    - стратегии получают этот же объект и берут из него нужные строки/столбцы.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Служебные столбцы, которые никогда не являются признаками
+DROP_ALWAYS = ["date", "Дата", "дата", "index", "comment"]
+
+
+class FeatureMatrix:
+    """
+    Пример:
+        fm = FeatureMatrix.from_frame(get_diary_dataframe())
+        X, y, features = fm.design("toshn")
+    """
+
+    def __init__(self, values: np.ndarray, columns: list[str], dates: np.ndarray, source=None):
+        # DiaryMatrix, из которой построена матрица (если известна) — для признаков прошлых дней
+        self.source = source
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.columns = list(columns)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self._positions = {c: i for i, c in enumerate(self.columns)}
+        # Маска пропусков и их число в каждой строке — один раз на матрицу
+        self.missing = np.isnan(self.values)
+        self.missing_per_row = self.missing.sum(axis=1)
+
+    # -----------------------------------------------------------------
+    # 🏗️ Конструкторы
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "FeatureMatrix":
+        """
+        Из широкого DataFrame (индекс или столбец "date" — даты).
+        Нечисловые столбцы (в т.ч. с датами) отбрасываются по dtype.
+        """
+        if df.empty:
+            return cls(np.zeros((0, 0)), [], np.array([], dtype="datetime64[D]"))
+        if "date" in df.columns:
+            dates = df["date"]
+        else:
+            dates = df.index
+        dates = pd.to_datetime(pd.Index(dates)).values.astype("datetime64[D]")
+
+        columns = [
+            c for c in df.columns
+            if c not in DROP_ALWAYS and pd.api.types.is_numeric_dtype(df[c].dtype)
+        ]
+        values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        return cls(values, columns, dates)
+
+    @classmethod
+    def from_matrix(cls, matrix) -> "FeatureMatrix":
+        """Из компактной DiaryMatrix (см. diary_matrix.py)."""
+        return cls(matrix.to_float_array(), matrix.keys, matrix.dates, source=matrix)
+
+    def before(self, day) -> "FeatureMatrix":
+        """
+        Только строки с датой < day. Даты отсортированы, поэтому это срез-представление
+        (без копирования данных).
+        """
+        stop = int(np.searchsorted(self.dates, np.datetime64(day, "D")))
+        sub = FeatureMatrix.__new__(FeatureMatrix)
+        sub.source = self.source
+        sub.values = self.values[:stop]
+        sub.columns = self.columns
+        sub.dates = self.dates[:stop]
+        sub._positions = self._positions
+        sub.missing = self.missing[:stop]
+        sub.missing_per_row = self.missing_per_row[:stop]
+        return sub
+
+    # -----------------------------------------------------------------
+    # 🔎 Доступ
+    # -----------------------------------------------------------------
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.values.shape
+
+    def __contains__(self, column) -> bool:
+        return column in self._positions
+
+    def position(self, column) -> int | None:
+        return self._positions.get(column)
+
+    def column(self, column) -> np.ndarray:
+        """Столбец-представление (без копирования)."""
+        return self.values[:, self._positions[column]]
+
+    def design(self, target: str, exclude=()):
+        """
+        Обучающая выборка для target (та же семантика, что была в train_model):
+            - признаки — все остальные столбцы, кроме exclude;
+            - строки без y и строки с пропусками в признаках отбрасываются.
+
+        :return: (X, y, features) — X и y уже без пропусков
+        """
+        t = self._positions[target]
+        excluded = {t} | {self._positions[c] for c in exclude if c in self._positions}
+        feature_idx = [i for i in range(len(self.columns)) if i not in excluded]
+
+        # Пропуски в признаках = все пропуски строки минус пропуски в исключённых столбцах
+        missing_in_features = self.missing_per_row - self.missing[:, sorted(excluded)].sum(axis=1)
+        rows = ~self.missing[:, t] & (missing_in_features == 0)
+
+        X = self.values[np.ix_(rows, feature_idx)]
+        y = self.values[rows, t]
+        return X, y, [self.columns[i] for i in feature_idx]
@@ -1,9 +1,10 @@
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 import logging
-import datetime
 import os
 
+from .features import FeatureMatrix
+
 logger = logging.getLogger(__name__)
 
 # Логгер для отладки входных данных
@@ -36,94 +37,44 @@ try:
 except Exception as e:
     flags_model_logger.error("Ошибка при создании my_test_handler: %s", e)
 
-DROP_ALWAYS = ["date", "Дата", "дата", "index"]
-
 def train_model(
-    df: pd.DataFrame,
+    df,
     target: str,
     *,
     exclude: list[str] | None = None,
 ):
+    """
+    Обучает LinearRegression для target.
+
+    :param df: FeatureMatrix (строится один раз на переобучение в PredictorManager.train)
+               или широкий DataFrame — тогда матрица строится здесь
+    """
     flags_model_logger.info("=== train_model вызван для target=%s ===", target)
     my_test_logger.debug("=== train_model вызван для target=%s ===", target)
     if exclude is None:
         exclude = []
-    df = df.reset_index()
-    drop_cols = DROP_ALWAYS + exclude + [target]
-    X = df.drop(columns=drop_cols, errors="ignore")
-
-    # Логируем shape и типы исходных данных
-    flags_model_logger.debug(f"=== train_model: target={target} ===")
-    flags_model_logger.debug(f"df.shape: {df.shape}")
-    flags_model_logger.debug(f"df.dtypes: {df.dtypes}")
-    flags_model_logger.debug(f"df.head():\n{df.head()}\n")
-    flags_model_logger.debug(f"X.shape: {X.shape}")
-    flags_model_logger.debug(f"X.dtypes: {X.dtypes}")
-    flags_model_logger.debug(f"X.head():\n{X.head()}\n")
-    flags_model_logger.debug(f"X unique types: {[set(type(x) for x in X[col]) for col in X.columns]}")
-
-    # Удаляем все столбцы, где есть хотя бы одно значение типа date/datetime
-    def has_date_value(series):
-        return any(isinstance(x, (datetime.date, datetime.datetime)) for x in series)
-    date_cols = [col for col in X.columns if has_date_value(X[col])]
-    if date_cols:
-        logger.warning("Удаляю столбцы с датами: %s", date_cols)
-        X = X.drop(columns=date_cols)
-        my_test_logger.debug(f"Удалены столбцы с датами: {date_cols}")
-
-    # Оставляем только числовые признаки
-    # X = X.select_dtypes(include=["number"]).fillna(0.0)
-    y = df[target]
+    fm = df if isinstance(df, FeatureMatrix) else FeatureMatrix.from_frame(df)
 
-    # Удаляем строки, где y == NaN
-    mask_y = ~y.isna()
-    X = X[mask_y]
-    y = y[mask_y]
-
-    # ⛔️ Удаляем строки, где хотя бы один признак X — NaN
-    mask_X = ~X.isna().any(axis=1)
-    X = X[mask_X]
-    y = y[mask_X]
-    flags_model_logger.debug(f"Удалено строк с NaN в признаках: {len(mask_y) - mask_X.sum()}")
-    my_test_logger.debug(f"Удалено строк с NaN в признаках: {len(mask_y) - mask_X.sum()}")
-
-    my_test_logger.debug(f"y.name: {y.name}")
-    my_test_logger.debug(f"y.dtype: {y.dtype}")
-    my_test_logger.debug(f"y.head():\n{y.head()}\n")
-    my_test_logger.debug(f"y unique types: {set(type(x) for x in y)}")
-    my_test_logger.debug(f"--- END train_model: target={target} ---\n")
-
-    # 🛡 Если целевая переменная не числовая — пропускаем
-    if not pd.api.types.is_numeric_dtype(df[target]):
-        logger.warning("train_model: Целевая переменная %s не числовая (тип %s), обучение пропущено", target, df[target].dtype)
+    # 🛡 Если целевая переменная не числовая (или её нет) — пропускаем
+    if target not in fm:
+        logger.warning("train_model: Целевая переменная %s не числовая или отсутствует, обучение пропущено", target)
         return {"model": None, "features": []}
 
-    logger.debug("train_model: target=%s, X_shape=%s, exclude=%s", target, X.shape, exclude)
-    logger.debug("train_model: X.columns = %s", list(X.columns))
+    # ⛔️ Строки без y и строки с NaN в признаках отбрасываются внутри design()
+    X, y, features = fm.design(target, exclude)
+    flags_model_logger.debug(f"=== train_model: target={target}, X.shape={X.shape} ===")
+    flags_model_logger.debug(f"Удалено строк с NaN: {fm.shape[0] - len(y)}")
+    my_test_logger.debug(f"Удалено строк с NaN: {fm.shape[0] - len(y)}")
 
-    for h in logger.handlers:
-        try:
-            h.flush()
-        except Exception:
-            pass
+    logger.debug("train_model: target=%s, X_shape=%s, exclude=%s", target, X.shape, exclude)
 
     if X.shape[1] == 0:
         logger.warning("train_model: Пропущено обучение для '%s' — нет признаков (X пуст)", target)
-        for h in logger.handlers:
-            try:
-                h.flush()
-            except Exception:
-                pass
         return {"model": None, "features": []}
 
+    # DataFrame-обёртка без копирования — чтобы модель помнила имена признаков
     model = LinearRegression()
-    model.fit(X, y)
+    model.fit(pd.DataFrame(X, columns=features, copy=False), y)
 
     logger.debug("trained %s: intercept=%.3f", target, model.intercept_)
-    for h in logger.handlers:
-        try:
-            h.flush()
-        except Exception:
-            pass
-
-    return {"model": model, "features": X.columns.tolist()} 
\ No newline at end of file
+    return {"model": model, "features": features}
@@ -0,0 +1,97 @@
+"""
+⏪ lagged_model.py — стратегия «lagged»: прогноз по прошлым дням
+
+Признаки — лаги 1..3 и скользящие среднее/сумма за 3 и 7 дней по всем
+параметрам (diary_analytic/feature_store.py); значения того же дня не
+используются. Признаков в разы больше, чем дней, поэтому вместо
+LinearRegression — Ridge, а пропуски (нет записей в те дни) заменяются на 0.0,
+как и при прогнозе в PredictorManager.
+
+Хуки, которые PredictorManager вызывает, если они есть у модуля стратегии:
+    - prepare_features(fm)          — данные для train_model вместо FeatureMatrix;
+    - feature_rows(matrix, dates)   — строки признаков для прогноза;
+    - LOOKBACK_DAYS                 — сколько следующих дней зависит от одного дня.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+
+from diary_analytic import feature_store
+from diary_analytic.diary_matrix import DiaryMatrix
+
+from .features import FeatureMatrix
+
+logger = logging.getLogger(__name__)
+
+ALPHA = 1.0
+# Минимум дней с известным target для обучения
+MIN_ROWS = 3
+# Прогноз дня зависит от значений за столько предыдущих дней
+LOOKBACK_DAYS = feature_store.HORIZON
+
+
+class LaggedDesign:
+    """Значения того же дня (для y) + признаки прошлых дней, строки выровнены."""
+
+    def __init__(self, fm: FeatureMatrix, values: np.ndarray, columns: list[str]):
+        self.fm = fm
+        self.values = values
+        self.features = columns
+        # Перебор target в PredictorManager идёт по столбцам того же дня
+        self.columns = fm.columns
+        self.shape = fm.shape
+
+
+def feature_rows(matrix, dates) -> tuple[np.ndarray, list[str]]:
+    """Признаки на даты для прогноза: (X с пропусками → 0.0, имена признаков)."""
+    X = feature_store.features_for(matrix, dates).astype(np.float64)
+    return np.nan_to_num(X, nan=0.0), feature_store.feature_columns(matrix.keys)
+
+
+def prepare_features(fm) -> LaggedDesign:
+    """Признаки прошлых дней для всех дат fm (один раз на переобучение)."""
+    fm = fm if isinstance(fm, FeatureMatrix) else FeatureMatrix.from_frame(fm)
+    matrix = fm.source
+    if matrix is None:
+        matrix = DiaryMatrix(fm.dates, fm.columns, np.where(fm.missing, 0.0, fm.values), ~fm.missing)
+    X, columns = feature_rows(matrix, fm.dates)
+    return LaggedDesign(fm, X, columns)
+
+
+def train_model(
+    df,
+    target: str,
+    *,
+    exclude: list[str] | None = None,
+):
+    """
+    Обучает Ridge для target по признакам прошлых дней.
+
+    :param df: LaggedDesign (PredictorManager.train строит его один раз через prepare_features),
+               FeatureMatrix или широкий DataFrame
+    :param exclude: параметры, чьи признаки не используются
+    """
+    design = df if isinstance(df, LaggedDesign) else prepare_features(df)
+    fm = design.fm
+    if target not in fm:
+        logger.warning("train_model: Целевая переменная %s не числовая или отсутствует, обучение пропущено", target)
+        return {"model": None, "features": []}
+
+    y = fm.column(target)
+    rows = ~np.isnan(y)
+    if rows.sum() < MIN_ROWS:
+        logger.warning("train_model: Для '%s' слишком мало дней (%d)", target, rows.sum())
+        return {"model": None, "features": []}
+
+    excluded = {f"{key}__" for key in exclude or []}
+    keep = [i for i, f in enumerate(design.features) if not any(f.startswith(p) for p in excluded)]
+    features = [design.features[i] for i in keep]
+    X = design.values[np.ix_(rows, keep)] if excluded else design.values[rows]
+
+    model = Ridge(alpha=ALPHA)
+    model.fit(pd.DataFrame(X, columns=features, copy=False), y[rows])
+    logger.debug("trained %s (lagged): X_shape=%s, intercept=%.3f", target, X.shape, model.intercept_)
+    return {"model": model, "features": features}
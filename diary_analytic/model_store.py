@@ -0,0 +1,154 @@
+# diary_analytic/model_store.py
+
+"""
+🗄️ model_store.py — поколения обученных моделей на диске
+
+Раньше переобучение перезаписывало trained_models/<strategy>/<key>.pkl по одному
+файлу, а прогнозы в это же время читали тот же каталог: можно было получить
+смесь старых и новых моделей или недописанный .pkl. Теперь каждое обучение
+пишет новое поколение целиком и публикует его атомарной заменой указателя:
+
+    trained_models/<strategy>/
+        current            ← имя актуального поколения ("gen-7"), меняется через os.replace
+        gen-6/             ← предыдущее (его ещё могут дочитывать запросы)
+        gen-7/
+            <key>.pkl
+        csv/               ← коэффициенты для анализа (не участвуют в прогнозе)
+
+Опубликованное поколение больше не меняется, поэтому читателю достаточно один
+раз прочитать `current` (закрепить поколение) — без блокировок.
+Если указателя нет — читается старая плоская раскладка (<strategy>/<key>.pkl).
+"""
+
+import os
+import shutil
+import time
+
+from django.conf import settings
+
+from .dir_lock import dir_lock
+from .loggers import predict_logger
+
+POINTER_FILE = "current"
+GENERATION_PREFIX = "gen-"
+# Сколько поколений хранить: актуальное + предыдущие для запросов, закрепивших их
+KEEP_GENERATIONS = 3
+
+# Публикация сериализуется каталогом-замком (см. dir_lock.py)
+LOCK_DIR = ".publish.lock"
+
+
+def get_models_root() -> str:
+    return str(getattr(
+        settings, "DIARY_MODELS_DIR",
+        os.path.join(settings.BASE_DIR, "diary_analytic", "trained_models"),
+    ))
+
+
+def strategy_dir(strategy: str) -> str:
+    return os.path.join(get_models_root(), strategy)
+
+
+def _generation_number(name: str) -> int | None:
+    if not name.startswith(GENERATION_PREFIX):
+        return None
+    try:
+        return int(name[len(GENERATION_PREFIX):])
+    except ValueError:
+        return None
+
+
+# --------------------------------------------------------------------
+# 📖 Чтение
+# --------------------------------------------------------------------
+
+def current_generation(strategy: str) -> int | None:
+    """
+    Номер опубликованного поколения стратегии или None (плоская раскладка / нет моделей).
+    """
+    try:
+        with open(os.path.join(strategy_dir(strategy), POINTER_FILE), encoding="utf-8") as f:
+            return _generation_number(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def generation_dir(strategy: str, generation: int | None) -> str:
+    """Каталог с .pkl поколения (None → старая плоская раскладка)."""
+    if generation is None:
+        return strategy_dir(strategy)
+    return os.path.join(strategy_dir(strategy), f"{GENERATION_PREFIX}{generation}")
+
+
+# --------------------------------------------------------------------
+# 💾 Запись нового поколения
+# --------------------------------------------------------------------
+
+def begin_generation(strategy: str) -> str:
+    """
+    Создаёт скрытый временный каталог для нового поколения и возвращает путь.
+    Пока он не опубликован через publish_generation(), читатели его не видят.
+    """
+    root = strategy_dir(strategy)
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".tmp-{GENERATION_PREFIX}{time.time_ns()}-{os.getpid()}")
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def _publish_lock(root: str):
+    """
+    Без замка два параллельных обучения могли отвести указатель назад:
+    A → gen-5, B → gen-6, B пишет current, A перезаписывает его на gen-5,
+    а сборка мусора B удаляет поколение, которое ещё нужно.
+    """
+    return dir_lock(os.path.join(root, LOCK_DIR))
+
+
+def publish_generation(strategy: str, tmp_dir: str) -> int:
+    """
+    Переименовывает временный каталог в gen-N (N = последнее + 1) и атомарно
+    переключает указатель `current`. Возвращает N.
+    Публикации одной стратегии идут по очереди; указатель только растёт.
+    """
+    root = strategy_dir(strategy)
+    with _publish_lock(root):
+        generation = max(_existing_generations(root), default=0) + 1
+        os.rename(tmp_dir, generation_dir(strategy, generation))
+
+        # Защита и от процессов без замка (старая версия кода): назад не переключаем
+        current = current_generation(strategy)
+        if current is None or generation > current:
+            pointer_tmp = os.path.join(root, f".{POINTER_FILE}-{os.getpid()}-{time.time_ns()}")
+            with open(pointer_tmp, "w", encoding="utf-8") as f:
+                f.write(f"{GENERATION_PREFIX}{generation}")
+            os.replace(pointer_tmp, os.path.join(root, POINTER_FILE))
+        else:
+            predict_logger.warning(
+                f"[model_store] ⚠️ {strategy}: поколение {generation} не новее текущего {current}, указатель не изменён"
+            )
+        _collect_garbage(strategy, max(generation, current or 0))
+    predict_logger.info(f"[model_store] 📦 {strategy}: опубликовано поколение {generation}")
+    return generation
+
+
+def discard_generation(tmp_dir: str):
+    """Удаляет неопубликованный каталог (обучение не дало ни одной модели или упало)."""
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _existing_generations(root: str) -> list[int]:
+    if not os.path.isdir(root):
+        return []
+    numbers = (_generation_number(name) for name in os.listdir(root))
+    return sorted(n for n in numbers if n is not None)
+
+
+def _collect_garbage(strategy: str, current: int):
+    """
+    Удаляет старые поколения, оставляя KEEP_GENERATIONS последних до current.
+    Поколения новее current (их публикует параллельное обучение) не трогаются.
+    """
+    older = [n for n in _existing_generations(strategy_dir(strategy)) if n < current]
+    for old in older[: max(0, len(older) - (KEEP_GENERATIONS - 1))]:
+        shutil.rmtree(generation_dir(strategy, old), ignore_errors=True)
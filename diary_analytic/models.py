@@ -68,3 +68,86 @@ class EntryValue(models.Model):
 
     # Пример: EntryValue(entry=Entry(...), parameter=Parameter(...), value=3.0)
 
+
+
+# ------------------------------------------------------------
+# 🔢 Модель DataVersion (общий счётчик версии данных)
+# ------------------------------------------------------------
+
+class DataVersion(models.Model):
+    # Единственная строка (pk=1). Счётчик монотонно растёт при каждой записи
+    # EntryValue/Parameter и при сохранении обученных моделей — по нему все
+    # процессы (gunicorn-воркеры, команды) понимают, что локальные кэши устарели.
+    version = models.BigIntegerField(default=0)
+
+    # Время последнего увеличения счётчика
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"DataVersion {self.version}"
+
+
+# ------------------------------------------------------------------
+# 🔮 Модель Prediction (предрасчитанный прогноз на дату)
+# ------------------------------------------------------------------
+
+class Prediction(models.Model):
+    # Стратегия прогнозирования ("base", "flags", ...)
+    strategy = models.CharField(max_length=50)
+
+    # Ключ прогнозируемого параметра (Parameter.key)
+    target = models.CharField(max_length=100)
+
+    # Дата, для которой посчитан прогноз
+    date = models.DateField()
+
+    # Прогноз (None — модель не смогла посчитать)
+    value = models.FloatField(null=True)
+
+    # Версия набора моделей, которым посчитан прогноз
+    model_version = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('strategy', 'target', 'date')
+        indexes = [models.Index(fields=['date', 'strategy'])]
+
+    def __str__(self):
+        # Отображение в админке: "base:toshn = 2.1 (2025-05-12)"
+        return f"{self.strategy}:{self.target} = {self.value} ({self.date})"
+
+
+# ------------------------------------------------------------------
+# 🔁 Модель ChangeLog (журнал изменений для синхронизации устройств)
+# ------------------------------------------------------------------
+
+class ChangeLog(models.Model):
+    # Виды изменений (см. diary_analytic/changelog.py)
+    VALUE = "value"                        # значение параметра за день (value=None — удалено)
+    COMMENT = "comment"                    # комментарий дня (payload.comment)
+    ENTRY_DELETE = "entry_delete"          # день удалён целиком
+    PARAMETER = "parameter"                # параметр создан/изменён (payload: name, ..., old_key)
+    PARAMETER_DELETE = "parameter_delete"  # параметр удалён
+
+    # Устройство, на котором изменение сделано (при применении чужой дельты — чужое)
+    origin = models.CharField(max_length=64)
+
+    # Время изменения на исходном устройстве — по нему «последняя запись побеждает»
+    changed_at = models.DateTimeField()
+
+    kind = models.CharField(max_length=20)
+
+    # День и ключ параметра (что из них есть — зависит от kind)
+    date = models.DateField(null=True)
+    key = models.CharField(max_length=100, blank=True, default="")
+
+    value = models.FloatField(null=True)
+
+    # Остальные поля изменения (комментарий, имя параметра и т.п.)
+    payload = models.JSONField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'date', 'key'])]
+
+    def __str__(self):
+        # Отображение в админке: "#12 value 2025-05-12 toshn = 3.0 @laptop"
+        return f"#{self.pk} {self.kind} {self.date or ''} {self.key} = {self.value} @{self.origin}"
@@ -0,0 +1,170 @@
+# diary_analytic/prediction_store.py
+
+"""
+🔮 prediction_store.py — предрасчитанные прогнозы
+
+Раньше `add_entry` и `/get_predictions/` запускали модели на каждый запрос.
+Теперь после обучения (и при изменении значений дня) прогнозы считаются
+заранее одним векторным проходом и складываются в таблицу Prediction:
+
+    - precompute_predictions()        — все сохранённые даты + сегодня, все стратегии;
+    - refresh_predictions_for_dates() — пересчёт только затронутых дат;
+    - invalidate_dates(dates)         — удаление устаревших прогнозов в транзакции записи;
+    - get_stored_predictions(date)    — быстрый поиск по индексу (date, strategy)
+                                        с прогнозами только текущей версии моделей;
+    - note_fallback(strategy, date)   — учёт прогнозов, посчитанных на запросе без предрасчёта.
+
+Включается настройкой DIARY_PRECOMPUTE_PREDICTIONS (по умолчанию включено).
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .loggers import predict_logger
+from .metrics import PREDICTION_FALLBACKS
+from .ml_utils import get_model
+from .models import Prediction
+from .predictor_manager import PredictorManager
+from .profiling import profiled
+
+# Стратегии, для которых хранятся прогнозы
+STRATEGIES = ["base", "flags", "lagged"]
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "DIARY_PRECOMPUTE_PREDICTIONS", True)
+
+
+# --------------------------------------------------------------------
+# 🧮 Расчёт и запись
+# --------------------------------------------------------------------
+
+def _store(strategy: str, dates, targets, values, model_version: int) -> int:
+    rows = [
+        Prediction(
+            strategy=strategy,
+            target=target,
+            date=d,
+            value=None if values[i, j] != values[i, j] else round(float(values[i, j]), 2),
+            model_version=model_version,
+        )
+        for i, d in enumerate(dates)
+        for j, target in enumerate(targets)
+    ]
+    Prediction.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["strategy", "target", "date"],
+        update_fields=["value", "model_version"],
+    )
+    return len(rows)
+
+
+@profiled("precompute_predictions")
+def precompute_predictions(strategies=None) -> dict:
+    """
+    Полный пересчёт: прогнозы для всех дат дневника и сегодняшней даты
+    по всем стратегиям. Прогнозы от прежних версий моделей удаляются.
+
+    :return: {strategy: число записанных прогнозов}
+    """
+    from .utils import get_diary_matrix
+
+    matrix = get_diary_matrix()
+    dates = sorted(set(matrix.python_dates()) | {date.today()})
+    written = {}
+    for strategy in strategies or STRATEGIES:
+        manager = PredictorManager(strategy)
+        models = manager.load_models()
+        version = manager.model_version()
+        targets, values = manager.predict_matrix(matrix, dates, models=models)
+        with transaction.atomic():
+            Prediction.objects.filter(strategy=strategy).exclude(model_version=version).delete()
+            written[strategy] = _store(strategy, dates, targets, values, version)
+        predict_logger.info(f"[precompute] ✅ {strategy}: {written[strategy]} прогнозов на {len(dates)} дат")
+    return written
+
+
+def refresh_predictions_for_dates(dates, strategies=None):
+    """
+    Инкрементальный пересчёт: только даты, у которых изменились входные значения.
+    """
+    dates = sorted(set(dates))
+    if not dates or not is_enabled():
+        return
+    from .utils import get_diary_matrix
+
+    matrix = get_diary_matrix()
+    known_dates = set(matrix.python_dates()) | {date.today()}
+    for strategy in strategies or STRATEGIES:
+        manager = PredictorManager(strategy)
+        models = manager.load_models()
+        if not models:
+            continue
+        # Для стратегий с признаками прошлых дней изменение дня задевает и следующие
+        strategy_dates = manager.affected_dates(dates, known_dates)
+        targets, values = manager.predict_matrix(matrix, strategy_dates, models=models)
+        _store(strategy, strategy_dates, targets, values, manager.model_version())
+    predict_logger.debug(f"[precompute] 🔁 Пересчитаны прогнозы для дат: {dates}")
+
+
+def invalidate_dates(dates) -> int:
+    """
+    Удаляет прогнозы дат, входные значения которых изменились (для стратегий с
+    признаками прошлых дней — и LOOKBACK_DAYS следующих). Вызывается в транзакции
+    записи: пока фоновое обновление (signals._Refresher) не пересчитало прогнозы,
+    чтение не находит строк и считает прогноз моделью по новым значениям.
+    :return: число удалённых строк
+    """
+    # Даты могут прийти строками (Entry.date до refresh_from_db)
+    dates = {np.datetime64(d, "D").astype(object) for d in dates}
+    if not dates or not is_enabled():
+        return 0
+    stale = Q()
+    for strategy in STRATEGIES:
+        lookback = getattr(get_model(strategy), "LOOKBACK_DAYS", 0)
+        strategy_dates = {d + timedelta(days=k) for d in dates for k in range(lookback + 1)}
+        stale |= Q(strategy=strategy, date__in=strategy_dates)
+    deleted, _ = Prediction.objects.filter(stale).delete()
+    return deleted
+
+
+# --------------------------------------------------------------------
+# 🔎 Чтение
+# --------------------------------------------------------------------
+
+def note_fallback(strategy: str, target_date):
+    """
+    Прогноз пришлось считать моделью на запросе. При включённом предрасчёте
+    это промах: день только что изменён и фоновое обновление ещё не дошло,
+    модели переобучены без предрасчёта или обновление упало. Частоту показывает
+    счётчик diary_prediction_fallbacks на /metrics.
+    """
+    PREDICTION_FALLBACKS.inc(strategy=strategy)
+    if is_enabled():
+        predict_logger.info(f"[precompute] ⏳ Нет предрасчёта {strategy} на {target_date} — модель на запросе")
+    else:
+        predict_logger.debug(f"[precompute] ⏳ Предрасчёт выключен — {strategy} на {target_date} считается на запросе")
+
+
+def get_stored_predictions(target_date, strategies=None) -> dict:
+    """
+    Прогнозы из таблицы: {strategy: {target: value}}.
+    Стратегии без сохранённых прогнозов на эту дату в ответ не попадают, как и
+    прогнозы другой версии моделей (после переобучения, пока precompute_predictions
+    не закончил или если он упал) — такие стратегии считаются моделью на запросе.
+    """
+    strategies = strategies or STRATEGIES
+    current = Q()
+    for strategy in strategies:
+        current |= Q(strategy=strategy, model_version=PredictorManager(strategy).model_version())
+    rows = Prediction.objects.filter(current, date=target_date).values_list("strategy", "target", "value")
+    result = {}
+    for strategy, target, value in rows:
+        result.setdefault(strategy, {})[target] = value
+    return result
@@ -15,12 +15,33 @@
 """
 
 from diary_analytic.ml_utils import get_model
+from diary_analytic.ml_utils.features import FeatureMatrix
 from .loggers import predict_logger
 import os
+import threading
+import time
+from datetime import timedelta
+import numpy as np
 import pandas as pd
 from pprint import pformat
 import joblib
 from diary_analytic.models import Parameter
+from .versioning import bump_data_version
+from . import metrics, model_store
+from .profiling import profiled
+
+
+# -------------------------------------------------------------
+# 🗃️ Загруженные поколения моделей: (strategy, generation) → {key: (model, features)}
+#
+# Опубликованное поколение не меняется (см. model_store.py), поэтому кэш не
+# нужно сверять с файлами. Под gunicorn --preload его заполняет мастер
+# (warmup.py), и воркеры делят эти объекты copy-on-write.
+# -------------------------------------------------------------
+_loaded_generations: dict = {}
+_loaded_lock = threading.Lock()
+# Собранные веса линейных моделей: (strategy, generation, targets, columns) → (W, b)
+_linear_weights: dict = {}
 
 
 # -------------------------------------------------------------
@@ -32,15 +53,29 @@ class PredictorManager:
     Класс, управляющий вызовом нужной модели в зависимости от стратегии.
     """
 
-    def __init__(self, strategy: str):
+    def __init__(self, strategy: str, generation: int | None = None):
+        """
+        :param generation: поколение моделей (см. model_store.py). По умолчанию
+                           опубликованное на момент создания менеджера — оно
+                           закрепляется, и все чтения этого менеджера (один запрос)
+                           видят один и тот же набор моделей, даже если рядом идёт
+                           переобучение.
+        """
         self.strategy = strategy
         self.model_module = get_model(strategy)
+        self.generation = generation if generation is not None else model_store.current_generation(strategy)
+
+    @property
+    def model_dir(self) -> str:
+        """Папка с .pkl-моделями закреплённого поколения стратегии."""
+        return model_store.generation_dir(self.strategy, self.generation)
 
-    def save_model(self, model, features, target):
+    def save_model(self, model, features, target, model_dir: str | None = None):
         """
         Сохраняет модель и признаки в .pkl-файл.
+        :param model_dir: каталог нового поколения (по умолчанию — закреплённый)
         """
-        model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "diary_analytic", "trained_models", self.strategy)
+        model_dir = model_dir or self.model_dir
         os.makedirs(model_dir, exist_ok=True)
         file_path = os.path.join(model_dir, f"{target}.pkl")
         joblib.dump({"model": model, "features": features}, file_path)
@@ -62,10 +97,7 @@ class PredictorManager:
                     "coef": model.coef_
                 })
                 coef_df["intercept"] = model.intercept_
-                export_dir = os.path.join(
-                    os.path.dirname(os.path.dirname(__file__)),
-                    "diary_analytic", "trained_models", self.strategy, "csv"
-                )
+                export_dir = os.path.join(model_store.strategy_dir(self.strategy), "csv")
                 os.makedirs(export_dir, exist_ok=True)
                 export_path = os.path.join(export_dir, f"{target}_{self.strategy}_coefs.csv")
                 predict_logger.info(f"[save_model_coefs] Сохраняю CSV по пути: {export_path}")
@@ -76,24 +108,51 @@ class PredictorManager:
         else:
             predict_logger.warning(f"[save_model_coefs] Модель не имеет coef_ или model=None. model: {type(model)}, features: {features}")
 
+    @profiled("train")
     def train(self, df):
         """
         Обучает все параметры (кроме служебных) по выбранной стратегии.
-        :param df: датафрейм всех записей пользователя
+        :param df: FeatureMatrix или датафрейм всех записей пользователя
+                   (тогда матрица признаков строится здесь, один раз на все target)
         :return: список результатов по каждому target
         """
+        fm = df if isinstance(df, FeatureMatrix) else FeatureMatrix.from_frame(df)
+        # Стратегия может строить свои признаки (например, lagged — по прошлым дням)
+        prepare = getattr(self.model_module, "prepare_features", None)
+        if prepare is not None:
+            fm = prepare(fm)
+        predict_logger.info(f"[train] ▶️ Стратегия: {self.strategy}, матрица признаков {fm.shape}, columns={fm.columns}")
+        # Модели пишутся в новое (ещё невидимое) поколение и публикуются разом в конце
+        new_dir = model_store.begin_generation(self.strategy)
+        saved = 0
         results = []
-        for target in df.columns:
-            if target in ("date", "Дата", "comment"):
-                continue
-            predict_logger.info(f"[train] ▶️ Стратегия: {self.strategy}, target={target}, df.columns={list(df.columns)}")
+        try:
+            with metrics.TRAIN_SECONDS.time(strategy=self.strategy):
+                saved = self._train_targets(fm, new_dir, results)
+        finally:
+            if saved:
+                self.generation = model_store.publish_generation(self.strategy, new_dir)
+            else:
+                model_store.discard_generation(new_dir)
+
+        # Новые модели на диске → кэши прогнозов в других процессах устарели
+        bump_data_version()
+        return results
+
+    def _train_targets(self, fm, new_dir: str, results: list) -> int:
+        """Обучает все target в каталог new_dir; возвращает число сохранённых моделей."""
+        saved = 0
+        for target in fm.columns:
+            predict_logger.info(f"[train] ▶️ Стратегия: {self.strategy}, target={target}")
+            start = time.perf_counter()
             try:
-                result = self.model_module.train_model(df.copy(), target=target, exclude=[])
+                result = self.model_module.train_model(fm, target=target, exclude=[])
                 model = result.get("model")
                 features = result.get("features")
                 if model:
-                    self.save_model(model, features, target)
+                    self.save_model(model, features, target, model_dir=new_dir)
                     self.save_model_coefs(model, features, target)
+                    saved += 1
                     msg = f"[{self.strategy}] ✅ Обучено и сохранено: {target}"
                     predict_logger.info("[train] " + msg)
                     results.append(msg)
@@ -105,7 +164,8 @@ class PredictorManager:
                 msg = f"[{self.strategy}] ❌ Ошибка при обучении {target}: {e}"
                 predict_logger.exception("[train] " + msg)
                 results.append(msg)
-        return results
+            metrics.TRAIN_TARGET_SECONDS.observe(time.perf_counter() - start, strategy=self.strategy, target=target)
+        return saved
 
     # -----------------------------------------------------------------
     # 🔮 Прогнозирование текущего дня по выбранной стратегии
@@ -134,46 +194,211 @@ class PredictorManager:
             predict_logger.error(f"🔥 Ошибка в predict_today (стратегия: {strategy}) — {str(e)}")
             return None
 
+    @profiled("predict_for_date")
     def predict_for_date(self, date):
         """
         Возвращает прогнозы по всем параметрам для выбранной даты.
+        Считается тем же векторным проходом, что и предрасчёт (predict_matrix):
+        пропуски дня → 0.0, модель, которая не смогла дать прогноз, → None.
         :param date: дата (datetime.date)
         :return: dict {param_key: value, ...}
         """
-        from diary_analytic.utils import get_today_row
-        import os
-        import joblib
-        import pandas as pd
-        row = get_today_row(date)
-        predictions = {}
-        # Путь к папке с моделями данной стратегии
-        model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "diary_analytic", "trained_models", self.strategy)
+        from diary_analytic.utils import get_diary_matrix
+        targets, values = self.predict_matrix(get_diary_matrix(), [date])
+        return {
+            param_key: None if np.isnan(value) else round(float(value), 2)
+            for param_key, value in zip(targets, values[0])
+        }
+
+    # -----------------------------------------------------------------
+    # 📦 Загрузка моделей и векторный прогноз сразу на много дат
+    # -----------------------------------------------------------------
+
+    def load_models(self) -> dict:
+        """
+        Все модели закреплённого поколения стратегии: {param_key: (model, features)}.
+        features = None, если модель сохранена без списка признаков.
+        Поколение читается с диска один раз на процесс; результат не изменять.
+        """
+        if self.generation is None:
+            # Старая плоская раскладка может меняться на месте — не кэшируем
+            return self._read_models()[0]
+        key = (self.strategy, self.generation)
+        with _loaded_lock:
+            models = _loaded_generations.get(key)
+        if models is not None:
+            metrics.cache_hit("models")
+        else:
+            metrics.cache_miss("models")
+            models, complete = self._read_models()
+            if not complete:
+                # Часть файлов не прочиталась — в кэш не кладём, попробуем в следующий раз
+                return models
+            with _loaded_lock:
+                # Держим только текущее и предыдущее поколение стратегии
+                for old in [k for k in _loaded_generations if k[0] == self.strategy and k[1] < self.generation - 1]:
+                    del _loaded_generations[old]
+                _loaded_generations[key] = models
+        return models
+
+    def _read_models(self) -> tuple[dict, bool]:
+        """Читает .pkl каталога поколения: (модели, прочитались ли все файлы)."""
+        with metrics.MODEL_LOAD_SECONDS.time(strategy=self.strategy):
+            return self._read_model_files()
+
+    def _read_model_files(self) -> tuple[dict, bool]:
+        models = {}
+        complete = True
+        model_dir = self.model_dir
         if not os.path.exists(model_dir):
-            return predictions
-        for fname in os.listdir(model_dir):
+            return models, complete
+        for fname in sorted(os.listdir(model_dir)):
             if not fname.endswith(".pkl"):
                 continue
             param_key = fname.replace(".pkl", "")
             model_path = os.path.join(model_dir, fname)
             try:
                 model_dict = joblib.load(model_path)
-                if isinstance(model_dict, dict) and "model" in model_dict:
-                    model = model_dict["model"]
-                    features = model_dict.get("features", None)
-                else:
-                    model = model_dict
-                    features = None
-                # Формируем вход для модели
-                if features is not None:
-                    X = pd.DataFrame([{f: row.get(f, 0.0) for f in features}])
-                    value = float(model.predict(X)[0])
-                elif hasattr(model, 'feature_names_in_'):
-                    X = pd.DataFrame([{f: row.get(f, 0.0) for f in model.feature_names_in_}])
-                    value = float(model.predict(X)[0])
-                else:
-                    X = pd.DataFrame([row])
-                    value = float(model.predict(X)[0])
-                predictions[param_key] = round(value, 2)
             except Exception as e:
-                predictions[param_key] = None
-        return predictions
+                predict_logger.error(f"[load_models] ❌ Не удалось загрузить {model_path}: {e}")
+                complete = False
+                continue
+            if isinstance(model_dict, dict) and "model" in model_dict:
+                models[param_key] = (model_dict["model"], model_dict.get("features", None))
+            else:
+                models[param_key] = (model_dict, None)
+        return models, complete
+
+    def model_version(self) -> int:
+        """
+        Версия набора моделей стратегии — номер закреплённого поколения
+        (для старой плоской раскладки — время последнего изменения .pkl, нс).
+        Сохраняется вместе с предрасчитанными прогнозами (Prediction.model_version).
+        """
+        if self.generation is not None:
+            return self.generation
+        model_dir = self.model_dir
+        if not os.path.exists(model_dir):
+            return 0
+        mtimes = [
+            os.stat(os.path.join(model_dir, f)).st_mtime_ns
+            for f in os.listdir(model_dir) if f.endswith(".pkl")
+        ]
+        return max(mtimes, default=0)
+
+    def feature_rows(self, matrix, dates) -> tuple[np.ndarray, list[str]]:
+        """
+        Признаки на даты для прогноза: (X, имена столбцов), пропуски → 0.0.
+        По умолчанию — значения того же дня (base/flags); стратегия может
+        задать свои признаки функцией feature_rows(matrix, dates) в модуле.
+        """
+        custom = getattr(self.model_module, "feature_rows", None)
+        if custom is not None:
+            return custom(matrix, dates)
+        # Строки матрицы под запрошенные даты; распаковываются только они
+        X = np.zeros((len(dates), len(matrix.keys)))
+        positions = [matrix.date_position(d) for d in dates]
+        found = [i for i, pos in enumerate(positions) if pos is not None]
+        if found:
+            rows = [positions[i] for i in found]
+            present = np.unpackbits(matrix.bits[rows], axis=1, count=len(matrix.keys)).view(bool)
+            X[found] = np.where(present, matrix.values[rows], 0)
+        return X, matrix.keys
+
+    def affected_dates(self, dates, known_dates) -> list:
+        """
+        Даты, прогнозы которых зависят от изменённых дат dates. Для стратегий
+        с признаками прошлых дней (LOOKBACK_DAYS в модуле) — ещё и следующие дни
+        из known_dates.
+        """
+        lookback = getattr(self.model_module, "LOOKBACK_DAYS", 0)
+        if not lookback:
+            return sorted(set(dates))
+        # Даты могут прийти строками (Entry.date до refresh_from_db)
+        dates = {np.datetime64(d, "D").astype(object) for d in dates}
+        following = {d + timedelta(days=k) for d in dates for k in range(1, lookback + 1)}
+        return sorted(dates | (following & set(known_dates)))
+
+    def _linear_weights(self, linear: list, targets: list, columns: list) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Веса линейных моделей в одной матрице W (столбцы X + нулевой столбец
+        для неизвестных признаков) и вектор b. Для опубликованного поколения
+        собирается один раз на набор моделей и столбцов.
+        """
+        key = None
+        if self.generation is not None:
+            key = (self.strategy, self.generation, tuple(targets[j] for j, _, _ in linear), tuple(columns))
+            with _loaded_lock:
+                cached = _linear_weights.get(key)
+            if cached is not None:
+                metrics.cache_hit("linear_weights")
+                return cached
+            metrics.cache_miss("linear_weights")
+
+        positions = {name: i for i, name in enumerate(columns)}
+        zero_col = len(columns)
+        W = np.zeros((zero_col + 1, len(linear)))
+        b = np.zeros(len(linear))
+        for col, (j, model, features) in enumerate(linear):
+            for f, coef in zip(features, model.coef_):
+                W[positions.get(f, zero_col), col] += coef
+            b[col] = model.intercept_
+
+        if key is not None:
+            with _loaded_lock:
+                # Держим только последние наборы (поколение и столбцы меняются редко)
+                if len(_linear_weights) >= 8:
+                    _linear_weights.clear()
+                _linear_weights[key] = (W, b)
+        return W, b
+
+    @profiled("predict_matrix")
+    def predict_matrix(self, matrix, dates, models: dict | None = None):
+        """
+        Прогнозы всех моделей стратегии сразу на много дат.
+
+        Линейные модели (coef_/intercept_) складываются в одну матрицу весов W,
+        и прогноз считается одним умножением X @ W + b. Пропуски, как и в
+        predict_for_date, заменяются на 0.0.
+
+        :param matrix: DiaryMatrix
+        :param dates: список дат (datetime.date); даты без записей → нулевая строка
+        :return: (targets, values) — список ключей и массив len(dates) × len(targets)
+        """
+        if models is None:
+            models = self.load_models()
+        with metrics.PREDICT_SECONDS.time(strategy=self.strategy):
+            return self._predict_matrix(matrix, dates, models)
+
+    def _predict_matrix(self, matrix, dates, models: dict):
+        targets = list(models)
+        out = np.full((len(dates), len(targets)), np.nan)
+        if not targets:
+            return targets, out
+
+        X, columns = self.feature_rows(matrix, dates)
+
+        linear, other = [], []
+        for j, target in enumerate(targets):
+            model, features = models[target]
+            if features is None and hasattr(model, "feature_names_in_"):
+                features = list(model.feature_names_in_)
+            if features is not None and hasattr(model, "coef_") and np.ndim(model.coef_) == 1:
+                linear.append((j, model, features))
+            else:
+                other.append((j, model, features))
+
+        if linear:
+            W, b = self._linear_weights(linear, targets, columns)
+            X_ext = np.hstack([X, np.zeros((len(dates), 1))])
+            out[:, [j for j, _, _ in linear]] = X_ext @ W + b
+
+        for j, model, features in other:
+            # Нелинейные модели — обычный predict по всему блоку дат
+            try:
+                rows = [dict(zip(columns, x)) for x in X]
+                frame = pd.DataFrame([{f: r.get(f, 0.0) for f in features} for r in rows]) if features else pd.DataFrame(rows)
+                out[:, j] = np.asarray(model.predict(frame), dtype=np.float64)
+            except Exception as e:
+                predict_logger.error(f"[predict_matrix] ⚠️ Ошибка прогноза {targets[j]} ({self.strategy}): {e}")
+        return targets, out
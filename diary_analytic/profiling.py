@@ -0,0 +1,363 @@
+# diary_analytic/profiling.py
+
+"""
+🔬 profiling.py — профилирование по запросу: cProfile + tracemalloc
+
+Когда retrain_models_all или add_entry начинают тормозить, метрики
+(metrics.py) показывают только «сколько», но не «где». Здесь профиль
+снимается без правки кода:
+
+    - запрос staff-пользователя с заголовком X-Diary-Profile: 1 или с
+      ?_profile=1 (ProfilingMiddleware) — профилируется весь запрос;
+    - запуск команды с DIARY_PROFILE=1, например
+          DIARY_PROFILE=1 python manage.py precompute_predictions
+      — профилируется весь процесс команды (см. apps.ready).
+
+Тяжёлые функции (PredictorManager.train, get_diary_dataframe,
+get_diary_matrix, прогнозы) обёрнуты в @profiled(name): вне профиля это
+одна проверка contextvar, внутри — отдельная строка в отчёте с временем и
+приростом памяти этого шага.
+
+На каждый профиль в DIARY_PROFILES_DIR пишутся:
+    <stem>.prof — статистика cProfile (snakeviz, python -m pstats);
+    <stem>.txt  — отчёт: шаги, топ функций по cumulative, топ аллокаций;
+    <stem>.json — сводка для страницы админки /admin/profiles/.
+
+cProfile видит только поток, в котором включён: работа очереди записи
+(write_queue.py) и пулов потоков в статистику функций не попадает. Шаги
+@profiled профиля запроса пишутся только из его потока, профиля команды —
+из всех потоков процесса.
+"""
+
+import atexit
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .loggers import web_logger
+
+PROFILE_HEADER = "X-Diary-Profile"
+PROFILE_PARAM = "_profile"
+PROFILE_ENV = "DIARY_PROFILE"
+# Заголовок ответа с именем сохранённого профиля
+REPORT_HEADER = "X-Diary-Profile-Report"
+
+# Сколько строк в отчёте и сколько кадров стека хранит tracemalloc
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACE_FRAMES = 5
+# Старые профили удаляются, чтобы каталог не рос бесконечно
+MAX_PROFILES = 50
+
+# Команды-серверы работают бесконечно — профиль процесса для них бессмыслен
+SERVER_COMMANDS = frozenset({"runserver", "runasgi", "shell", "dbshell"})
+
+SUFFIXES = (".prof", ".txt", ".json")
+_NAME_RE = re.compile(r"^[\w.-]+$")
+
+_active = contextvars.ContextVar("diary_profile", default=None)
+# tracemalloc общий на процесс: профили в разных потоках могут пересекаться,
+# поэтому трассировку включает первый активный профиль, а выключает последний
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+# Профиль всей команды (DIARY_PROFILE=1): виден из любого потока процесса
+_process_capture = None
+
+
+def profiles_dir() -> Path:
+    return Path(getattr(settings, "DIARY_PROFILES_DIR", None) or Path(settings.BASE_DIR) / "profiles")
+
+
+# --------------------------------------------------------------------
+# 📸 Один профиль
+# --------------------------------------------------------------------
+
+class Capture:
+    """
+    cProfile + tracemalloc на время одного запроса или команды и шаги
+    @profiled внутри: (name, seconds, allocated_bytes).
+    """
+
+    __slots__ = ("label", "profiler", "spans", "started_at", "stem", "_start", "_spans_lock")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.profiler = cProfile.Profile()
+        self.spans = []
+        self.started_at = datetime.now()
+        # Имя сохранённых файлов (после stop)
+        self.stem = None
+        self._start = None
+        # Профиль команды общий для всех потоков процесса (писатель, фоновое обновление)
+        self._spans_lock = threading.Lock()
+
+    def start(self):
+        _acquire_tracing()
+        self._start = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self) -> str:
+        """Останавливает профиль и сохраняет файлы; возвращает stem."""
+        self.profiler.disable()
+        seconds = time.perf_counter() - self._start
+        try:
+            # Пик общий: при пересекающихся профилях это пик процесса за время обоих
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+        finally:
+            _release_tracing()
+        self.stem = save(self, seconds, peak, snapshot)
+        return self.stem
+
+    @contextmanager
+    def span(self, name: str):
+        traced = tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if traced else 0
+        # Место в списке занимается сразу — шаги идут в порядке начала, внешний перед вложенными
+        with self._spans_lock:
+            slot = len(self.spans)
+            self.spans.append((name, 0.0, 0))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            after = tracemalloc.get_traced_memory()[0] if traced else 0
+            self.spans[slot] = (name, time.perf_counter() - start, after - before)
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0:
+            # tracemalloc мог включить кто-то ещё (python -X tracemalloc) — тогда не выключаем
+            _tracing_owned = not tracemalloc.is_tracing()
+            if _tracing_owned:
+                tracemalloc.start(TRACE_FRAMES)
+            # Пик сбрасывается, только если других профилей нет — иначе он испортит их пик
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+@contextmanager
+def capture(label: str):
+    """
+    Профилирует блок. Внутри уже идущего профиля (например, train внутри
+    профилируемого запроса) становится его шагом — cProfile в одном потоке
+    может быть только один.
+    """
+    current = _active.get() or _process_capture
+    if current is not None:
+        with current.span(label):
+            yield current
+        return
+    cap = Capture(label)
+    token = _active.set(cap)
+    cap.start()
+    try:
+        yield cap
+    finally:
+        cap.stop()
+        _active.reset(token)
+
+
+def profiled(name: str):
+    """
+    Декоратор тяжёлых функций: шаг в отчёте текущего профиля (если он есть).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current = _active.get() or _process_capture
+            if current is None:
+                return func(*args, **kwargs)
+            with current.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --------------------------------------------------------------------
+# 💾 Файлы профилей
+# --------------------------------------------------------------------
+
+def _stem(cap: Capture) -> str:
+    label = re.sub(r"[^\w.-]+", "-", cap.label).strip("-") or "profile"
+    started = cap.started_at
+    return f"{started:%Y%m%d-%H%M%S}-{started.microsecond // 1000:03d}-{os.getpid()}-{label[:60]}"
+
+
+def save(cap: Capture, seconds: float, peak: int, snapshot) -> str:
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = _stem(cap)
+    cap.profiler.dump_stats(str(directory / f"{stem}.prof"))
+
+    allocations = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    stats_out = io.StringIO()
+    pstats.Stats(cap.profiler, stream=stats_out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    report = [
+        f"# {cap.label}",
+        f"started: {cap.started_at.isoformat(timespec='seconds')}  pid: {os.getpid()}",
+        f"wall: {seconds:.3f} s  peak traced memory: {peak / 2**20:.1f} MiB",
+        "",
+        "## Шаги (@profiled)",
+    ]
+    report += [f"{s:9.4f} s  {b / 2**20:+9.2f} MiB  {n}" for n, s, b in cap.spans] or ["(нет)"]
+    report += ["", f"## Топ-{TOP_ALLOCATIONS} аллокаций (живые на конец профиля)"]
+    report += [
+        f"{stat.size / 2**10:10.1f} KiB  {stat.count:8d} блоков  {stat.traceback[0]}" for stat in allocations
+    ]
+    report += ["", f"## Топ-{TOP_FUNCTIONS} функций по cumulative", stats_out.getvalue()]
+    (directory / f"{stem}.txt").write_text("\n".join(report), encoding="utf-8")
+
+    meta = {
+        "stem": stem,
+        "label": cap.label,
+        "started": cap.started_at.isoformat(timespec="seconds"),
+        "pid": os.getpid(),
+        "seconds": round(seconds, 4),
+        "peak_bytes": peak,
+        "spans": [{"name": n, "seconds": round(s, 4), "bytes": b} for n, s, b in cap.spans],
+    }
+    (directory / f"{stem}.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    web_logger.info(f"[profiling] 🔬 Профиль «{cap.label}» сохранён: {directory / stem}.*")
+    prune(directory)
+    return stem
+
+
+def prune(directory: Path, keep: int = MAX_PROFILES):
+    """Удаляет профили сверх keep самых новых."""
+    metas = sorted(directory.glob("*.json"), key=lambda p: p.name, reverse=True)
+    for meta in metas[keep:]:
+        for suffix in SUFFIXES:
+            meta.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    """Сводки сохранённых профилей, новые первыми."""
+    directory = profiles_dir()
+    if not directory.is_dir():
+        return []
+    out = []
+    for path in sorted(directory.glob("*.json"), key=lambda p: p.name, reverse=True):
+        try:
+            meta = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        meta["files"] = [
+            {"name": path.stem + s, "kind": s[1:]} for s in SUFFIXES[:2] if path.with_suffix(s).exists()
+        ]
+        out.append(meta)
+    return out
+
+
+def profile_path(name: str) -> Path | None:
+    """Путь к файлу профиля по имени (только .prof/.txt внутри каталога профилей)."""
+    if not _NAME_RE.match(name) or not name.endswith(SUFFIXES[:2]):
+        return None
+    path = profiles_dir() / name
+    return path if path.is_file() else None
+
+
+# --------------------------------------------------------------------
+# 🌐 Профиль запроса
+# --------------------------------------------------------------------
+
+def wants_profile(request) -> bool:
+    if not (request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)):
+        return False
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос staff-пользователя по заголовку или ?_profile=1.
+    Ставится после AuthenticationMiddleware (нужен request.user).
+    Async-запросы не профилируются: cProfile видел бы все корутины цикла
+    событий вперемешку — для профиля есть WSGI-вариант того же эндпоинта.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not wants_profile(request):
+            return self.get_response(request)
+        with capture(f"{request.method} {request.path}") as cap:
+            response = self.get_response(request)
+        # Внутри профиля команды запрос — лишь шаг, своих файлов у него нет
+        if cap.stem:
+            response[REPORT_HEADER] = cap.stem
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+# --------------------------------------------------------------------
+# 🛠️ Профиль команды (DIARY_PROFILE=1 python manage.py ...)
+# --------------------------------------------------------------------
+
+def command_label(argv=None) -> str | None:
+    """Имя профиля для запуска manage.py, если профиль команды включён."""
+    argv = sys.argv if argv is None else argv
+    if os.environ.get(PROFILE_ENV, "") in ("", "0"):
+        return None
+    if len(argv) < 2 or os.path.basename(argv[0]) != "manage.py" or argv[1] in SERVER_COMMANDS:
+        return None
+    return "cmd " + " ".join(argv[1:3])
+
+
+def start_command_profile():
+    """Включает профиль всего процесса команды; сохраняется при выходе."""
+    global _process_capture
+    label = command_label()
+    if label is None or _process_capture is not None:
+        return
+    _process_capture = Capture(label)
+    _process_capture.start()
+    atexit.register(_finish_command_profile)
+
+
+def _finish_command_profile():
+    global _process_capture
+    cap, _process_capture = _process_capture, None
+    if cap is not None:
+        cap.stop()
@@ -0,0 +1,157 @@
+# diary_analytic/search.py
+
+"""
+🔎 search.py — полнотекстовый поиск по комментариям дней (SQLite FTS5)
+
+Раньше комментарии искались только через search_fields админки (LIKE '%…%',
+полный просмотр таблицы). Теперь рядом с diary_analytic_entry живёт
+FTS5-индекс с внешним содержимым (content=...), который поддерживают
+триггеры на INSERT/UPDATE/DELETE — любая запись через ORM, админку или
+импорт сразу попадает в индекс.
+
+    - search_comments(q, ...) — ранжирование bm25, подсветка snippet(), фильтр по датам;
+    - rebuild_index()         — пересобрать индекс (manage.py rebuild_search_index);
+    - fts_available()         — есть ли индекс (для других СУБД — поиск через icontains).
+
+Запрос пользователя не передаётся в MATCH как есть: из него берутся слова,
+каждое ищется как префикс ("тошн" найдёт «тошнота»), все слова обязательны.
+"""
+
+import html
+import importlib
+import re
+import time
+
+from django.db import connection
+
+from .models import Entry
+
+# Схема индекса живёт только в миграции 0005_entry_comment_fts: пересборка
+# выполняет ровно тот же SQL (последняя команда — 'rebuild' из diary_analytic_entry)
+_migration = importlib.import_module("diary_analytic.migrations.0005_entry_comment_fts")
+FTS_TABLE = _migration.FTS_TABLE
+FTS_SCHEMA = _migration.CREATE_SQL
+DROP_SCHEMA = _migration.DROP_SQL
+
+MAX_LIMIT = 100
+SNIPPET_TOKENS = 12
+
+# Маркеры подсветки внутри snippet(): управляющие символы, которых нет в тексте,
+# чтобы экранировать комментарий и только потом вставить <mark>
+_OPEN, _CLOSE = "\x02", "\x03"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_available() -> bool:
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def build_match_query(q: str) -> str:
+    """
+    Слова запроса → выражение MATCH: "слово"* AND "слово"* ...
+    Спецсимволы FTS5 (кавычки, NEAR, скобки и т.п.) в выражение не попадают.
+    """
+    return " AND ".join(f'"{word}"*' for word in _WORD.findall(q.lower()))
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+# --------------------------------------------------------------------
+# 🔎 Поиск
+# --------------------------------------------------------------------
+
+def search_comments(q: str, date_from=None, date_to=None, limit: int = 20, offset: int = 0) -> dict:
+    """
+    :return: {
+        "query": ..., "took_ms": ...,
+        "results": [{"date": "YYYY-MM-DD", "snippet": "...<mark>слово</mark>...", "rank": float}, ...]
+    }
+    Чем меньше rank (bm25), тем релевантнее; результаты отсортированы по нему.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    offset = max(0, int(offset))
+    start = time.perf_counter()
+    match = build_match_query(q)
+    if not match:
+        results = []
+    elif fts_available():
+        results = _search_fts(match, date_from, date_to, limit, offset)
+    else:
+        results = _search_like(q, date_from, date_to, limit, offset)
+    return {
+        "query": q,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        "results": results,
+    }
+
+
+def _search_fts(match: str, date_from, date_to, limit: int, offset: int) -> list:
+    sql = [
+        f"SELECT e.date, snippet({FTS_TABLE}, 0, %s, %s, '…', %s), bm25({FTS_TABLE})",
+        f"FROM {FTS_TABLE} JOIN diary_analytic_entry e ON e.id = {FTS_TABLE}.rowid",
+        f"WHERE {FTS_TABLE} MATCH %s",
+    ]
+    params = [_OPEN, _CLOSE, SNIPPET_TOKENS, match]
+    if date_from:
+        sql.append("AND e.date >= %s")
+        params.append(str(date_from))
+    if date_to:
+        sql.append("AND e.date <= %s")
+        params.append(str(date_to))
+    sql.append(f"ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s")
+    params += [limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute("\n".join(sql), params)
+        rows = cursor.fetchall()
+    return [
+        {"date": str(d), "snippet": _highlight(snippet), "rank": round(rank, 4)}
+        for d, snippet, rank in rows
+    ]
+
+
+def _search_like(q: str, date_from, date_to, limit: int, offset: int) -> list:
+    """Запасной путь без FTS5: все слова через icontains, без ранжирования (новые сверху)."""
+    words = _WORD.findall(q)
+    qs = Entry.objects.all()
+    for word in words:
+        qs = qs.filter(comment__icontains=word)
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    pattern = re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+    results = []
+    for d, comment in qs.order_by("-date").values_list("date", "comment")[offset:offset + limit]:
+        marked = pattern.sub(lambda m: f"{_OPEN}{m.group(0)}{_CLOSE}", comment)
+        results.append({"date": str(d), "snippet": _highlight(marked), "rank": None})
+    return results
+
+
+# --------------------------------------------------------------------
+# 🔧 Обслуживание индекса
+# --------------------------------------------------------------------
+
+def rebuild_index(recreate: bool = False) -> int:
+    """
+    Пересобирает индекс из diary_analytic_entry. recreate=True — сначала
+    пересоздать таблицу и триггеры (например, после восстановления БД из копии).
+    :return: число проиндексированных дней
+    """
+    if connection.vendor != "sqlite":
+        return 0
+    with connection.cursor() as cursor:
+        if recreate:
+            for statement in DROP_SCHEMA:
+                cursor.execute(statement)
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute("SELECT COUNT(*) FROM diary_analytic_entry")
+        return cursor.fetchone()[0]
@@ -1,17 +1,239 @@
-from django.db.models.signals import post_save, post_delete
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import EntryValue
+from . import changelog
+from .loggers import db_logger
+from .models import ChangeLog, Entry, EntryValue
 from .models import Parameter
+from .metrics import REFRESH_SECONDS
+from .snapshot import refresh_snapshot
+from .taxonomy import get_category_rollups
 from .utils import export_diary_to_csv
+from .versioning import bump_data_version
+
+# -------------------------------------------------------------------
+# 🔁 Обновление производных данных после коммита
+#
+# Сигналы срабатывают на каждую строку, а снимок и экспорт достаточно
+# перестроить один раз на транзакцию: первое изменение в транзакции
+# регистрирует on_commit-пачку, последующие только дописывают в неё даты.
+# -------------------------------------------------------------------
+
+def _refresh(dates):
+    """Снимок, экспорт, прогнозы изменённых дат и сводки по категориям."""
+    from .prediction_store import refresh_predictions_for_dates
+
+    with REFRESH_SECONDS.time(stage="snapshot"):
+        refresh_snapshot()
+    with REFRESH_SECONDS.time(stage="export"):
+        export_diary_to_csv()
+    with REFRESH_SECONDS.time(stage="predictions"):
+        refresh_predictions_for_dates(dates)
+    with REFRESH_SECONDS.time(stage="rollups"):
+        # Сводки по категориям: пересчёт только изменённых дней (см. taxonomy.py)
+        get_category_rollups()
+
+
+class _RefreshBatch:
+    """Отложенное обновление после коммита + даты, у которых менялись значения."""
+
+    def __init__(self):
+        self.dates = set()
+
+    def __call__(self):
+        if getattr(settings, "DIARY_BACKGROUND_REFRESH", True):
+            get_refresher().submit(self.dates)
+        else:
+            _refresh(self.dates)
+
+
+# -------------------------------------------------------------------
+# 🧵 Фоновое обновление
+#
+# on_commit пачки срабатывает в потоке, который коммитил (у очереди записи —
+# единственный писатель), и обновление на секунды задерживало следующую
+# группу записей. Теперь пачка только передаёт даты фоновому потоку, а он
+# ждёт REFRESH_DELAY, сливая даты подряд идущих коммитов в одно обновление.
+# Читатели при этом не видят старых данных: версия DataVersion уже выросла,
+# и get_diary_matrix() при отставшем снимке строит матрицу из БД.
+# -------------------------------------------------------------------
+
+# Сколько ждать следующие коммиты, прежде чем обновлять (сек)
+REFRESH_DELAY = 0.5
+
+
+class _Refresher:
+    """Даты изменённых дней и поток, который обновляет по ним производные данные."""
+
+    def __init__(self, delay: float = REFRESH_DELAY):
+        self.delay = delay
+        self._dates = set()
+        self._pending = False
+        self._running = False
+        self._cond = threading.Condition()
+        self._thread = None
+        # Статистика: сколько обновлений выполнено
+        self.runs = 0
+
+    def submit(self, dates):
+        with self._cond:
+            self._dates.update(dates)
+            self._pending = True
+            if self._thread is None or not self._thread.is_alive():
+                # Модели для прогнозов импортируются здесь, а не в потоке: при выходе
+                # интерпретатора sklearn/joblib уже не могут зарегистрировать atexit
+                from . import prediction_store  # noqa: F401
+
+                # Не daemon: короткоживущий процесс (импорт, архив, синхронизация)
+                # при выходе дождётся обновления, запланированного его записью
+                self._thread = threading.Thread(target=self._run, name="diary-refresh")
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Ждёт, пока не останется запланированных обновлений (False — по таймауту)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def _run(self):
+        while True:
+            time.sleep(self.delay)
+            with self._cond:
+                dates, self._dates = self._dates, set()
+                self._pending = False
+                self._running = True
+            close_old_connections()
+            try:
+                _refresh(dates)
+            except Exception as e:
+                db_logger.exception(f"[refresh] ❌ Ошибка обновления после записи: {e}")
+            finally:
+                close_old_connections()
+                with self._cond:
+                    self._running = False
+                    self.runs += 1
+                    idle = not self._pending
+                    if idle:
+                        # Поток завершается без работы — следующий submit запустит новый
+                        self._thread = None
+                    self._cond.notify_all()
+            if idle:
+                return
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher() -> _Refresher:
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = _Refresher()
+        return _refresher
+
+
+def schedule_data_refresh(dates=()):
+    """
+    Увеличивает DataVersion и планирует перестройку снимка дневника,
+    CSV-экспорта и прогнозов для изменённых дат после коммита.
+    Вызывать и из кода, который пишет в обход сигналов (bulk_create и т.п.).
+    """
+    from .prediction_store import invalidate_dates
+
+    dates = list(dates)
+    # Версия данных растёт в той же транзакции, что и сама запись
+    bump_data_version()
+    # Старые прогнозы изменённых дней удаляются сразу: до фонового пересчёта
+    # чтение посчитает прогноз моделью, а не вернёт прогноз до правки
+    invalidate_dates(dates)
+    conn = transaction.get_connection()
+    if conn.in_atomic_block:
+        for item in conn.run_on_commit:
+            if isinstance(item[1], _RefreshBatch):
+                item[1].dates.update(dates)
+                return
+    batch = _RefreshBatch()
+    batch.dates.update(dates)
+    transaction.on_commit(batch)
+
+
+def _entry_dates(instance) -> list:
+    # При каскадном удалении Entry уже может не быть в БД
+    try:
+        return [instance.entry.date]
+    except Entry.DoesNotExist:
+        return []
+
+
+def _is_cascade(origin) -> bool:
+    """
+    Значение удаляется вместе с днём или параметром (origin — то, у чего вызван delete()).
+    Collector удаляет EntryValue раньше Entry, поэтому по самой строке это не определить.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Entry, Parameter)
+
+
+def _log_value(instance, value):
+    changelog.record(ChangeLog.VALUE, instance.entry.date, instance.parameter.key, value)
+
 
 @receiver(post_save, sender=EntryValue)
 def entryvalue_saved(sender, instance, **kwargs):
-    export_diary_to_csv()
+    schedule_data_refresh(_entry_dates(instance))
+    _log_value(instance, instance.value)
 
 @receiver(post_delete, sender=EntryValue)
-def entryvalue_deleted(sender, instance, **kwargs):
-    export_diary_to_csv()
+def entryvalue_deleted(sender, instance, origin=None, **kwargs):
+    # Каскад: обновление и запись в журнал делают обработчики дня/параметра —
+    # одно изменение вместо строки и запроса на каждое значение
+    if _is_cascade(origin):
+        return
+    schedule_data_refresh(_entry_dates(instance))
+    _log_value(instance, None)
+
+@receiver(pre_save, sender=Parameter)
+def parameter_saving(sender, instance, **kwargs):
+    # Старый ключ — чтобы другое устройство распознало переименование
+    instance._old_key = Parameter.objects.filter(pk=instance.pk).values_list("key", flat=True).first() if instance.pk else None
 
 @receiver(post_save, sender=Parameter)
 def parameter_saved(sender, instance, **kwargs):
-    export_diary_to_csv() 
\ No newline at end of file
+    schedule_data_refresh()
+    changelog.record(ChangeLog.PARAMETER, key=instance.key,
+                     payload=changelog.parameter_payload(instance, getattr(instance, "_old_key", None)))
+
+@receiver(pre_delete, sender=Parameter)
+def parameter_deleting(sender, instance, **kwargs):
+    # Даты значений параметра (удаляются каскадом) — одним запросом, для пересчёта прогнозов
+    instance._value_dates = list(
+        Entry.objects.filter(entryvalue__parameter=instance).values_list("date", flat=True)
+    )
+
+@receiver(post_delete, sender=Parameter)
+def parameter_deleted(sender, instance, **kwargs):
+    schedule_data_refresh(getattr(instance, "_value_dates", ()))
+    changelog.record(ChangeLog.PARAMETER_DELETE, key=instance.key)
+
+# -------------------------------------------------------------------
+# 🔁 Журнал изменений дня (комментарий, удаление) — см. changelog.py
+# -------------------------------------------------------------------
+
+@receiver(post_save, sender=Entry)
+def entry_saved(sender, instance, created, **kwargs):
+    # Пустой день, созданный при открытии страницы, — не изменение
+    if created and not instance.comment:
+        return
+    changelog.record(ChangeLog.COMMENT, instance.date, payload={"comment": instance.comment})
+
+@receiver(post_delete, sender=Entry)
+def entry_deleted(sender, instance, **kwargs):
+    # Значения дня удалены каскадом без собственных обработчиков (см. entryvalue_deleted)
+    schedule_data_refresh([instance.date])
+    changelog.record(ChangeLog.ENTRY_DELETE, instance.date)
@@ -0,0 +1,224 @@
+# diary_analytic/snapshot.py
+
+"""
+🗂️ snapshot.py — снимок дневника на диске (memmap)
+
+Обучение, история и экспорт раньше каждый раз заново читали SQLite через ORM
+и строили pivot. Теперь после каждой зафиксированной пачки изменений широкая
+матрица дневника пишется в столбцовый формат NumPy:
+
+    snapshots/
+        current              ← имя актуального снимка (меняется атомарно)
+        snap-<ns>/
+            values.npy       ← int8/float32, даты × параметры
+            bits.npy         ← упакованная маска заполненности
+            dates.npy        ← datetime64[D]
+            keys.json        ← ключи параметров
+            meta.json        ← служебная информация (БД, версия данных, размеры)
+
+Читатели открывают файлы через np.load(mmap_mode="r"), т.е. без копирования:
+все gunicorn-воркеры и management-команды делят одну копию из page cache.
+Снимок помечен версией данных (DataVersion) и считается устаревшим, если
+счётчик в БД ушёл вперёд.
+
+Пишет снимки только обновление после записи (signals._RefreshBatch) и команда
+refresh_snapshot; читатель, не нашедший свежего снимка, строит матрицу в памяти.
+Указатель переключается под замком (dir_lock.py) и только вперёд по версии
+данных: медленный писатель со старой версией свой снимок отбрасывает.
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from .diary_matrix import DiaryMatrix
+from .dir_lock import dir_lock
+from .loggers import db_logger
+from .versioning import get_data_version
+
+POINTER_FILE = "current"
+KEEP_SNAPSHOTS = 2
+# Переключение указателя и сборка мусора — под этим замком
+LOCK_DIR = ".write.lock"
+# Сколько раз повторить чтение матрицы, если во время него прошёл коммит
+READ_RETRIES = 3
+
+
+def get_snapshot_dir() -> str:
+    return str(getattr(settings, "DIARY_SNAPSHOT_DIR", os.path.join(settings.BASE_DIR, "snapshots")))
+
+
+def _database_name() -> str:
+    # Снимок привязан к конкретной БД (например, тестовая БД не должна читать боевой снимок)
+    return str(connection.settings_dict.get("NAME"))
+
+
+# --------------------------------------------------------------------
+# 💾 Запись снимка
+# --------------------------------------------------------------------
+
+def write_snapshot(matrix: DiaryMatrix, extra_meta: dict | None = None) -> str:
+    """
+    Записывает матрицу в новый каталог snap-<ns>/ и атомарно переключает
+    указатель `current`. Возвращает путь к актуальному снимку: новому или,
+    если текущий снимок той же БД не старше по версии данных, текущему.
+    """
+    root = get_snapshot_dir()
+    os.makedirs(root, exist_ok=True)
+
+    name = f"snap-{time.time_ns()}-{os.getpid()}"
+    tmp_dir = os.path.join(root, f".tmp-{name}")
+    os.makedirs(tmp_dir)
+
+    np.save(os.path.join(tmp_dir, "values.npy"), np.ascontiguousarray(matrix.values))
+    np.save(os.path.join(tmp_dir, "bits.npy"), np.ascontiguousarray(matrix.bits))
+    np.save(os.path.join(tmp_dir, "dates.npy"), matrix.dates)
+    with open(os.path.join(tmp_dir, "keys.json"), "w", encoding="utf-8") as f:
+        json.dump(matrix.keys, f, ensure_ascii=False)
+
+    meta = {
+        "database": _database_name(),
+        "created": time.time(),
+        "shape": list(matrix.shape),
+        "dtype": str(matrix.values.dtype),
+    }
+    meta.update(extra_meta or {})
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    final_dir = os.path.join(root, name)
+    with dir_lock(os.path.join(root, LOCK_DIR)):
+        current = current_snapshot_path()
+        if current is not None and not _is_newer(meta, current):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            db_logger.info(f"[snapshot] ⏭️ Снимок версии {meta.get('data_version')} не новее текущего — отброшен")
+            return current
+        # Сначала каталог целиком, затем указатель — читатель никогда не увидит полуснимок.
+        # Переименование тоже под замком: иначе чужая сборка мусора могла бы удалить каталог
+        os.replace(tmp_dir, final_dir)
+        pointer_tmp = os.path.join(root, f".{POINTER_FILE}-{name}")
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(pointer_tmp, os.path.join(root, POINTER_FILE))
+        _collect_garbage(root, keep=name)
+    db_logger.info(f"[snapshot] 💾 Записан снимок {name}: shape={matrix.shape}")
+    return final_dir
+
+
+def _is_newer(meta: dict, current_path: str) -> bool:
+    """Новый снимок той же БД заменяет текущий, только если его версия данных больше."""
+    try:
+        current = read_snapshot_meta(current_path)
+    except (OSError, ValueError):
+        return True
+    if current.get("database") != meta.get("database"):
+        return True
+    new, old = meta.get("data_version"), current.get("data_version")
+    return new is None or old is None or new > old
+
+
+def _collect_garbage(root: str, keep: str):
+    """
+    Удаляет старые снимки, оставляя KEEP_SNAPSHOTS последних (keep — тот, на
+    который указывает `current`). Вызывается под замком записи.
+    Уже открытые memmap'ы продолжают работать (POSIX держит inode).
+    """
+    snaps = sorted(
+        (d for d in os.listdir(root) if d.startswith("snap-") and d != keep),
+        key=lambda d: int(d.split("-")[1]),
+    )
+    for old in snaps[: max(0, len(snaps) - (KEEP_SNAPSHOTS - 1))]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+def read_consistent() -> tuple:
+    """
+    Матрица из БД и версия данных, которой она точно соответствует: (version, matrix).
+
+    Транзакция здесь не годится: при transaction_mode=IMMEDIATE (settings)
+    даже читающий atomic() берёт блокировку записи SQLite, и перестройка
+    снимка на промахе кэша задерживала бы писателей. Поэтому чтение
+    оптимистичное: каждая фиксация данных увеличивает DataVersion в той же
+    транзакции, и если версия до и после чтения совпала — между ними
+    коммитов не было. Иначе чтение повторяется.
+    """
+    if connection.in_atomic_block:
+        # Внешняя транзакция уже даёт согласованный срез
+        return get_data_version(), DiaryMatrix.from_db()
+    for _ in range(READ_RETRIES):
+        version = get_data_version()
+        matrix = DiaryMatrix.from_db()
+        if get_data_version() == version:
+            return version, matrix
+    # Записи идут без перерыва — один раз читаем под блокировкой, как раньше
+    db_logger.warning(f"[snapshot] ⚠️ Версия данных менялась {READ_RETRIES} раза подряд — чтение в транзакции")
+    with transaction.atomic():
+        return get_data_version(), DiaryMatrix.from_db()
+
+
+def refresh_snapshot() -> DiaryMatrix:
+    """
+    Перестраивает матрицу из БД и записывает новый снимок с меткой версии
+    данных, которой соответствует содержимое (см. read_consistent).
+    """
+    version, matrix = read_consistent()
+    try:
+        write_snapshot(matrix, {"data_version": version})
+    except OSError as e:
+        db_logger.exception(f"[snapshot] ❌ Не удалось записать снимок: {e}")
+    return matrix
+
+
+# --------------------------------------------------------------------
+# 📖 Чтение снимка
+# --------------------------------------------------------------------
+
+def current_snapshot_path() -> str | None:
+    root = get_snapshot_dir()
+    try:
+        with open(os.path.join(root, POINTER_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(root, name)
+    return path if os.path.isdir(path) else None
+
+
+def read_snapshot_meta(path: str) -> dict:
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_snapshot(expected_version: int | None = None) -> DiaryMatrix | None:
+    """
+    Открывает актуальный снимок без копирования (memmap, только чтение).
+    None — если снимка нет, он повреждён, записан для другой БД
+    или его версия данных не совпадает с expected_version.
+    """
+    path = current_snapshot_path()
+    if path is None:
+        return None
+    try:
+        meta = read_snapshot_meta(path)
+        if meta.get("database") != _database_name():
+            return None
+        if expected_version is not None and meta.get("data_version") != expected_version:
+            return None
+        if 0 in meta.get("shape", [0]):
+            # Пустые .npy нельзя открыть через mmap
+            return DiaryMatrix.empty()
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        bits = np.load(os.path.join(path, "bits.npy"), mmap_mode="r")
+        dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        with open(os.path.join(path, "keys.json"), encoding="utf-8") as f:
+            keys = json.load(f)
+    except (OSError, ValueError) as e:
+        # Снимок могли удалить между чтением указателя и открытием файлов
+        db_logger.warning(f"[snapshot] ⚠️ Не удалось открыть снимок {path}: {e}")
+        return None
+    return DiaryMatrix.from_packed(dates, keys, values, bits)
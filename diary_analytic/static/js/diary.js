@@ -519,7 +519,13 @@ async function loadParameterHistory(paramKey, dateStr) {
   }
 
   try {
-    const res = await fetch(`/api/parameter_history/?param=${encodeURIComponent(paramKey)}&date=${encodeURIComponent(dateStr)}`);
+    // Диапазон и число точек — на сервере: не больше точки на пиксель ширины графика (LTTB)
+    const minDate = loadChartsMinDate();
+    const width = ctx.clientWidth || (ctx.parentElement && ctx.parentElement.clientWidth) || window.innerWidth;
+    let url = `/api/parameter_history/?param=${encodeURIComponent(paramKey)}&date=${encodeURIComponent(dateStr)}`;
+    if (minDate) url += `&from=${encodeURIComponent(minDate)}`;
+    if (width) url += `&max_points=${Math.max(3, Math.round(width))}`;
+    const res = await fetch(url);
     const data = await res.json();
     if (!data.dates || !data.values || data.dates.length === 0) {
       ctx.style.display = 'none';
@@ -529,8 +535,7 @@ async function loadParameterHistory(paramKey, dateStr) {
     ctx.style.display = '';
     if (emptyDiv) emptyDiv.style.display = 'none';
 
-    // Фильтрация по минимальной дате
-    const minDate = loadChartsMinDate();
+    // Фильтрация по минимальной дате (на случай ответа без from)
     let filteredDates = data.dates;
     let filteredValues = data.values;
     if (minDate) {
@@ -0,0 +1,204 @@
+# diary_analytic/static_assets.py
+
+"""
+🗜️ static_assets.py — хэшированная статика, предсжатые файлы и сжатие ответов
+
+Раньше diary.js, add_entry.css и остальные скрипты отдавались по STATIC_URL
+под постоянными именами (версия — вручную через ?v=...), и браузер
+перепроверял их при каждой загрузке страницы. HTML и JSON уходили без сжатия.
+
+    - CompressedManifestStorage — collectstatic пишет файлы с хэшем содержимого
+      в имени (diary.3f2a….js) и рядом сжатые варианты .gz и .br (brotli —
+      если установлен пакет brotli);
+    - PrecompressedStaticMiddleware — отдаёт файлы из STATIC_ROOT сам: выбирает
+      .br/.gz по Accept-Encoding, для хэшированных имён ставит
+      Cache-Control: max-age=1 год, immutable (имя меняется вместе с содержимым);
+    - ThresholdGZipMiddleware — gzip для динамических ответов (история
+      параметров, прогнозы, HTML) начиная с DIARY_GZIP_MIN_BYTES байт.
+
+Всё это — продакшен-профиль (DEBUG=False, DIARY_DEBUG=0). При DEBUG=True
+ManifestStaticFilesStorage.url отдаёт исходные имена без хэша, а копии в
+STATIC_ROOT скрывали бы правки diary.js — поэтому PrecompressedStaticMiddleware
+в DEBUG отключается, и статику раздаёт runserver из каталогов приложений.
+
+Сборка и запуск:
+    python manage.py collectstatic --noinput
+    DIARY_DEBUG=0 python manage.py runserver
+"""
+
+import gzip
+import mimetypes
+import posixpath
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.middleware.gzip import GZipMiddleware
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него только .gz
+    brotli = None
+
+# Что сжимать заранее и с какого размера (меньшие файлы не выигрывают)
+COMPRESSIBLE = (".js", ".css", ".svg", ".html", ".json", ".txt", ".map")
+MIN_COMPRESS_BYTES = 256
+# Сжатый вариант сохраняется, только если он заметно меньше
+MIN_RATIO = 0.95
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Файлы без хэша в имени (например, запрошенные по исходному имени) — короткий кэш
+MUTABLE_CACHE = "public, max-age=60"
+
+
+# --------------------------------------------------------------------
+# 📦 collectstatic: хэш в имени + .gz/.br
+# --------------------------------------------------------------------
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage, который после хэширования сохраняет рядом
+    со всеми текстовыми файлами сжатые копии (name.gz, name.br).
+    manifest_strict = False: файл, которого нет в манифесте (collectstatic
+    ещё не запускали), отдаётся по исходному имени, а не ломает страницу.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        compressed = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if dry_run or isinstance(processed, Exception):
+                continue
+            for target in (name, hashed_name):
+                if target and target not in compressed and target.endswith(COMPRESSIBLE):
+                    compressed.add(target)
+                    self._write_compressed(target)
+
+    def _write_compressed(self, name: str):
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_BYTES:
+            return
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, body in variants:
+            if len(body) < len(data) * MIN_RATIO:
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(body))
+
+
+def _hashed_names() -> frozenset:
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    hashed = getattr(staticfiles_storage, "hashed_files", None) or {}
+    return frozenset(hashed.values())
+
+
+# --------------------------------------------------------------------
+# 📤 Отдача статики из STATIC_ROOT с учётом Accept-Encoding
+# --------------------------------------------------------------------
+
+class PrecompressedStaticMiddleware:
+    """
+    Отдаёт файлы STATIC_ROOT до остальных middleware и вьюх. Если файла
+    там нет (collectstatic не запускали), запрос идёт дальше — например,
+    к runserver, который раздаёт статику из приложений в DEBUG.
+    """
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            # Хэшированных имён в DEBUG нет, а старые копии STATIC_ROOT прятали бы правки
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        root = getattr(settings, "STATIC_ROOT", None)
+        self.root = Path(root).resolve() if root else None
+        self.prefix = "/" + settings.STATIC_URL.lstrip("/") if settings.STATIC_URL else None
+        self.immutable = _hashed_names() if self.root else frozenset()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.static_response(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Файл статики — пара stat() и открытие файла, цикл событий не блокирует надолго
+        return self.static_response(request) or await self.get_response(request)
+
+    def static_response(self, request):
+        if self.root is None or not self.prefix or request.method not in ("GET", "HEAD") \
+                or not request.path.startswith(self.prefix):
+            return None
+        return self.serve(request, request.path[len(self.prefix):])
+
+    def serve(self, request, name: str):
+        name = posixpath.normpath(name).lstrip("/")
+        if name.endswith((".gz", ".br")):
+            return None
+        path = (self.root / name).resolve()
+        if self.root not in path.parents or not path.is_file():
+            return None
+
+        headers = {
+            "Vary": "Accept-Encoding",
+            "Cache-Control": IMMUTABLE_CACHE if name in self.immutable else MUTABLE_CACHE,
+        }
+        accepted = request.headers.get("Accept-Encoding", "")
+        encoding = None
+        for candidate, suffix in self.ENCODINGS:
+            if candidate in accepted and path.with_name(path.name + suffix).is_file():
+                encoding, path = candidate, path.with_name(path.name + suffix)
+                break
+
+        stat = path.stat()
+        if request.headers.get("If-Modified-Since") == http_date(stat.st_mtime):
+            return HttpResponseNotModified(headers=headers)
+
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(path, "rb"), content_type=content_type or "application/octet-stream")
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+
+# --------------------------------------------------------------------
+# 🗜️ Сжатие динамических ответов
+# --------------------------------------------------------------------
+
+class ThresholdGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware с настраиваемым порогом: маленькие ответы (update_value,
+    короткая история) не сжимаются — выигрыш меньше затрат CPU.
+    """
+
+    def process_response(self, request, response):
+        threshold = getattr(settings, "DIARY_GZIP_MIN_BYTES", 1024)
+        if not response.streaming and len(response.content) < threshold:
+            return response
+        return super().process_response(request, response)
+
+
+def transfer_sizes(data: bytes) -> dict:
+    """Размер тела без сжатия, с gzip и (если есть) brotli — для замеров."""
+    sizes = {"raw": len(data), "gzip": len(gzip.compress(data, compresslevel=6))}
+    if brotli is not None:
+        sizes["br"] = len(brotli.compress(data, quality=11))
+    return sizes
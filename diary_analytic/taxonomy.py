@@ -0,0 +1,298 @@
+# diary_analytic/taxonomy.py
+
+"""
+🗂️ taxonomy.py — иерархия параметров из названий и дневные сводки по категориям
+
+Название параметра кодирует категорию, имя и флаги через "::":
+
+    "ЖВТ-ОБЩ-ПНК 🫀 :: Изжога 🔥 :: {all} p3"
+      │               │           └─ теги: all, p3
+      │               └─ имя: "Изжога 🔥"
+      └─ код категории: ЖВТ → ЖВТ-ОБЩ → ЖВТ-ОБЩ-ПНК
+
+Раньше название разбиралось только в шаблоне (split_param_title) при
+каждой отрисовке. Здесь оно разбирается один раз на версию данных в
+Taxonomy, а параметр входит во все префиксы своего кода (ЖВТ, ЖВТ-ОБЩ,
+ЖВТ-ОБЩ-ПНК) — так у групповых графиков есть и общий, и частный уровень.
+
+CategoryRollups — сводки по категориям, выровненные по датам матрицы
+дневника: сумма, максимум и число заполненных значений участников за
+день (n_dates × n_categories). Групповой график получает один ряд вместо
+десятков рядов участников.
+
+При записи EntryValue (см. signals._RefreshBatch) сводки обновляются
+инкрементально, как признаки в feature_store.py: изменённые дни находятся
+сравнением с прошлой матрицей, и пересчитываются только их строки.
+
+Пример:
+    rollups = get_category_rollups()
+    rows, values = rollups.series("ЖВТ-ОБЩ", "sum", until=date(2025, 5, 12))
+"""
+
+import re
+import threading
+
+import numpy as np
+
+from .diary_matrix import DiaryMatrix, update_aligned_rows
+from .loggers import predict_logger
+from .versioning import VersionedCache
+
+SEPARATOR = "::"
+CODE_SEPARATOR = "-"
+# Код категории — буквы, цифры, дефисы и пробелы до первого эмодзи/символа
+_CODE = re.compile(r"[\w\s-]*")
+
+AGGREGATES = ("sum", "max", "count", "mean")
+
+# Если затронута большая доля дней — дешевле пересчитать всё
+INCREMENTAL_MAX_FRACTION = 0.25
+
+
+# --------------------------------------------------------------------
+# 🏷️ Разбор названия
+# --------------------------------------------------------------------
+
+def parse_title(title: str) -> tuple:
+    """
+    :return: (path, name, tags) — сегменты кода категории, имя, теги.
+             Название без "::" — параметр без категории: ((), title, ()).
+    """
+    parts = [part.strip() for part in title.split(SEPARATOR)]
+    if len(parts) < 2:
+        return (), title.strip(), ()
+    code = _CODE.match(parts[0]).group()
+    path = tuple(seg for seg in (s.strip() for s in code.split(CODE_SEPARATOR)) if seg)
+    tags = tuple(
+        tag for tag in (token.strip("{}") for part in parts[2:] for token in part.split()) if tag
+    )
+    return path, parts[1], tags
+
+
+class ParamInfo:
+    """Разобранное название параметра."""
+
+    __slots__ = ("key", "title", "path", "name", "tags")
+
+    def __init__(self, key: str, title: str):
+        self.key = key
+        self.title = title
+        self.path, self.name, self.tags = parse_title(title)
+
+    @property
+    def category(self) -> str:
+        return CODE_SEPARATOR.join(self.path)
+
+    def categories(self) -> list[str]:
+        """Все уровни: ["ЖВТ", "ЖВТ-ОБЩ", "ЖВТ-ОБЩ-ПНК"]."""
+        return [CODE_SEPARATOR.join(self.path[:i]) for i in range(1, len(self.path) + 1)]
+
+    def as_dict(self) -> dict:
+        return {"category": self.category, "name": self.name, "tags": list(self.tags)}
+
+
+class Taxonomy:
+    """
+    Индекс категорий: параметры по ключу и участники каждой категории
+    (включая параметры подкатегорий).
+    """
+
+    __slots__ = ("params", "categories", "members", "_signature")
+
+    def __init__(self, items):
+        """:param items: пары (key, title)"""
+        self.params = {key: ParamInfo(key, title) for key, title in items}
+        members = {}
+        for info in self.params.values():
+            for category in info.categories():
+                members.setdefault(category, []).append(info.key)
+        self.categories = sorted(members)
+        self.members = {category: sorted(keys) for category, keys in members.items()}
+        self._signature = tuple(sorted((key, info.path) for key, info in self.params.items()))
+
+    def same_structure(self, other: "Taxonomy") -> bool:
+        """Совпадает ли состав категорий (переименование имени без смены кода не важно)."""
+        return other is not None and self._signature == other._signature
+
+    def membership(self, keys) -> np.ndarray:
+        """float32-матрица len(keys) × len(categories): 1 — ключ входит в категорию."""
+        pos = {category: j for j, category in enumerate(self.categories)}
+        out = np.zeros((len(keys), len(self.categories)), dtype=np.float32)
+        for i, key in enumerate(keys):
+            info = self.params.get(key)
+            if info is not None:
+                out[i, [pos[c] for c in info.categories()]] = 1.0
+        return out
+
+    def payload(self) -> dict:
+        return {
+            "categories": [
+                {
+                    "category": category,
+                    "parent": category.rpartition(CODE_SEPARATOR)[0] or None,
+                    "members": self.members[category],
+                }
+                for category in self.categories
+            ],
+            "parameters": {key: info.as_dict() for key, info in sorted(self.params.items())},
+        }
+
+
+_taxonomy_cache = VersionedCache("taxonomy")
+
+
+def get_taxonomy() -> Taxonomy:
+    """Индекс по текущим названиям параметров; кэш до смены версии данных."""
+    from .models import Parameter
+
+    return _taxonomy_cache.get(
+        "taxonomy", lambda version: Taxonomy(Parameter.objects.values_list("key", "name"))
+    )
+
+
+# --------------------------------------------------------------------
+# 📊 Дневные сводки по категориям
+# --------------------------------------------------------------------
+
+def compute_rows(matrix: DiaryMatrix, membership: np.ndarray, positions) -> tuple:
+    """
+    Сводки для строк матрицы positions.
+    :return: (sums, maxes, counts) — массивы len(positions) × n_categories;
+             sum/max — NaN, если у категории за день нет значений
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    mask = np.unpackbits(matrix.bits[positions], axis=1, count=len(matrix.keys)).view(bool)
+    values = np.where(mask, matrix.values[positions], 0).astype(np.float32)
+
+    counts = mask.astype(np.float32) @ membership
+    sums = values @ membership
+    maxes = np.full(counts.shape, -np.inf, dtype=np.float32)
+    filled = np.where(mask, values, -np.inf)
+    for j in range(membership.shape[1]):
+        cols = np.flatnonzero(membership[:, j])
+        if len(cols):
+            maxes[:, j] = filled[:, cols].max(axis=1)
+    empty = counts == 0
+    sums[empty] = np.nan
+    maxes[empty] = np.nan
+    return sums, maxes, counts.astype(np.int32)
+
+
+class CategoryRollups:
+    """
+    Неизменяемые сводки, строка i — дата source.dates[i].
+    """
+
+    __slots__ = ("source", "taxonomy", "categories", "dates", "sums", "maxes", "counts", "_cat_pos")
+
+    def __init__(self, source: DiaryMatrix, taxonomy: Taxonomy, sums, maxes, counts):
+        self.source = source
+        self.taxonomy = taxonomy
+        self.categories = taxonomy.categories
+        self.dates = source.dates
+        self.sums = sums
+        self.maxes = maxes
+        self.counts = counts
+        self._cat_pos = {category: j for j, category in enumerate(self.categories)}
+
+    def category_position(self, category: str) -> int | None:
+        return self._cat_pos.get(category)
+
+    def _window(self, until=None, since=None) -> slice:
+        lo = np.searchsorted(self.dates, np.datetime64(since, "D")) if since else 0
+        hi = np.searchsorted(self.dates, np.datetime64(until, "D"), side="right") if until else len(self.dates)
+        return slice(lo, hi)
+
+    def series(self, category: str, aggregate: str = "sum", until=None, since=None) -> tuple:
+        """
+        Ряд категории по дням, в которые у неё есть значения (как DiaryMatrix.column_rows).
+        :return: (rows, values) — позиции строк матрицы и float32-значения
+        """
+        j = self._cat_pos[category]
+        window = self._window(until, since)
+        counts = self.counts[window, j]
+        rows = np.flatnonzero(counts) + window.start
+        if aggregate == "sum":
+            values = self.sums[rows, j]
+        elif aggregate == "max":
+            values = self.maxes[rows, j]
+        elif aggregate == "count":
+            values = self.counts[rows, j].astype(np.float32)
+        elif aggregate == "mean":
+            values = self.sums[rows, j] / self.counts[rows, j]
+        else:
+            raise ValueError(f"неизвестная агрегация: {aggregate}")
+        return rows, values.astype(np.float32)
+
+    def totals(self, until=None, since=None, categories=None) -> dict:
+        """
+        Итоги за период: {category: {sum, max, count, days}} (days — дни со значениями).
+        """
+        window = self._window(until, since)
+        counts = self.counts[window]
+        days = (counts > 0).sum(axis=0)
+        sums = np.nansum(self.sums[window], axis=0) if counts.size else np.zeros(len(self.categories))
+        out = {}
+        for category in categories or self.categories:
+            j = self._cat_pos[category]
+            out[category] = {
+                "sum": float(sums[j]),
+                "max": float(np.nanmax(self.maxes[window, j])) if days[j] else None,
+                "count": int(counts[:, j].sum()),
+                "days": int(days[j]),
+            }
+        return out
+
+
+class RollupStore:
+    """
+    Держит последние CategoryRollups и обновляет их под новую матрицу.
+    """
+
+    def __init__(self):
+        self._rollups = None
+        # Копия матрицы, по которой посчитаны _rollups (для поиска изменённых дней)
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.full_runs = 0
+        self.incremental_runs = 0
+
+    def advance(self, matrix: DiaryMatrix, taxonomy: Taxonomy) -> CategoryRollups:
+        with self._lock:
+            arrays = self._incremental(matrix, taxonomy)
+            if arrays is None:
+                membership = taxonomy.membership(matrix.keys)
+                arrays = compute_rows(matrix, membership, np.arange(len(matrix.dates)))
+                self.full_runs += 1
+                predict_logger.debug(f"[taxonomy] полный пересчёт сводок {arrays[0].shape}")
+            self._rollups = CategoryRollups(matrix, taxonomy, *arrays)
+            self._matrix = matrix.detached()
+            return self._rollups
+
+    def _incremental(self, matrix: DiaryMatrix, taxonomy: Taxonomy) -> tuple | None:
+        old = self._rollups
+        if old is None or old.source.keys != matrix.keys or not old.taxonomy.same_structure(taxonomy):
+            return None
+        membership = taxonomy.membership(matrix.keys)
+        # Сводка дня зависит только от самого дня
+        updated = update_aligned_rows(self._matrix, old.dates, (old.sums, old.maxes, old.counts), matrix,
+                                      lambda dates, rows: compute_rows(matrix, membership, rows),
+                                      max_fraction=INCREMENTAL_MAX_FRACTION)
+        if updated is None:
+            return None
+        arrays, affected = updated
+        if len(affected):
+            self.incremental_runs += 1
+            predict_logger.debug(f"[taxonomy] пересчитано строк сводок {len(affected)}")
+        return arrays
+
+
+_store = RollupStore()
+_cache = VersionedCache("category_rollups")
+
+
+def get_category_rollups() -> CategoryRollups:
+    """Сводки для текущей матрицы дневника; кэш до смены версии данных."""
+    from .utils import get_diary_matrix
+
+    return _cache.get("rollups", lambda version: _store.advance(get_diary_matrix(), get_taxonomy()))
@@ -0,0 +1,27 @@
+# diary_analytic/test_runner.py
+
+"""
+🧪 test_runner.py — запуск тестов без фоновых побочных эффектов
+
+Обновление после записи по умолчанию идёт в фоновом потоке (см. signals.py).
+В тестах такой поток переживает тест: срабатывает уже без его override_settings
+(реальные DIARY_SNAPSHOT_DIR и DIARY_EXPORT_PATH) или после удаления тестовой
+БД. Поэтому на весь прогон обновление выполняется сразу в потоке коммита;
+тесты самого фонового потока включают его явно.
+
+Подключается в settings: TEST_RUNNER = 'diary_analytic.test_runner.DiaryTestRunner'.
+"""
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class DiaryTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._overrides = override_settings(DIARY_BACKGROUND_REFRESH=False)
+        self._overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._overrides.disable()
+        super().teardown_test_environment(**kwargs)
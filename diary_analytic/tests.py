@@ -1,3 +1,1226 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+import numpy as np
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from concurrent.futures import Future
+from unittest import mock
+
+from django.db import transaction
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from sklearn.linear_model import LinearRegression
+
+import pandas as pd
+
+from diary_analytic import archive, async_views, backtest, changelog, correlations, export, feature_store, metrics, model_store, prediction_store, profiling, search, signals, snapshot, taxonomy, versioning, views, write_queue
+from diary_analytic.admin import EntryValueAdminForm
+from diary_analytic.importers.excel_entry_importer import import_excel_dataframe
+from diary_analytic.diary_matrix import DiaryMatrix
+from diary_analytic.json_response import FastJsonResponse, series_payload
+from diary_analytic.static_assets import IMMUTABLE_CACHE, MUTABLE_CACHE, PrecompressedStaticMiddleware
+from diary_analytic.models import ChangeLog, Entry, EntryValue, Parameter, Prediction
+
+
+# --------------------------------------------------------------------
+# 🔢 DataVersion: согласованность кэшей между процессами
+#
+# Каждый «воркер» — отдельный процесс Python со своей копией Django,
+# работающий с общей временной SQLite-базой (DIARY_DB_PATH).
+# --------------------------------------------------------------------
+
+BUMP_SCRIPT = """
+import django, json, sys
+django.setup()
+from diary_analytic.versioning import bump_data_version
+seen = [bump_data_version() for _ in range(int(sys.argv[1]))]
+print(json.dumps(seen))
+"""
+
+WRITE_SCRIPT = """
+import django, sys
+django.setup()
+from django.db import transaction
+from diary_analytic.models import Entry, EntryValue, Parameter
+with transaction.atomic():
+    entry, _ = Entry.objects.get_or_create(date=sys.argv[1])
+    parameter, _ = Parameter.objects.get_or_create(key="toshn", defaults={"name": "Тошнота"})
+    EntryValue.objects.update_or_create(entry=entry, parameter=parameter, defaults={"value": 2.0})
+"""
+
+# Долгоживущий процесс-читатель: на каждую строку stdin проверяет версию
+# (как DataVersionMiddleware) и печатает число значений из локального кэша.
+READER_SCRIPT = """
+import django, sys
+django.setup()
+from diary_analytic.versioning import VersionedCache, get_data_version, sync_local_caches
+from diary_analytic.models import EntryValue
+cache = VersionedCache("values_count")
+computed = []
+def compute(version):
+    computed.append(version)
+    return EntryValue.objects.count()
+for _ in sys.stdin:
+    version = get_data_version()
+    sync_local_caches(version)
+    count = cache.get("count", compute, version=version)
+    print(version, count, len(computed), flush=True)
+"""
+
+
+# Чужая транзакция держит блокировку записи SQLite, пока процесс перестраивает снимок
+LOCKED_REFRESH_SCRIPT = """
+import django, sqlite3, sys, time
+django.setup()
+from django.conf import settings
+from diary_analytic.snapshot import refresh_snapshot
+writer = sqlite3.connect(settings.DATABASES["default"]["NAME"], isolation_level=None)
+writer.execute("BEGIN IMMEDIATE")
+start = time.monotonic()
+refresh_snapshot()
+print(round(time.monotonic() - start, 3))
+writer.execute("ROLLBACK")
+"""
+
+
+class DataVersionMultiProcessTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE="config.settings",
+            DIARY_DB_PATH=os.path.join(cls.tmp.name, "db.sqlite3"),
+            DIARY_SNAPSHOT_DIR=os.path.join(cls.tmp.name, "snapshots"),
+            DIARY_EXPORT_PATH=os.path.join(cls.tmp.name, "export.csv"),
+        )
+        cls.run_python("-m", "django", "migrate", "--noinput", "-v", "0")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def run_python(cls, *args):
+        result = subprocess.run(
+            [sys.executable, *args], env=cls.env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=120,
+        )
+        if result.returncode != 0:
+            raise AssertionError(result.stderr)
+        return result.stdout
+
+    def test_concurrent_bumps_are_monotonic_and_not_lost(self):
+        processes, bumps = 4, 15
+        with ThreadPoolExecutor(processes) as pool:
+            outputs = list(pool.map(lambda _: self.run_python("-c", BUMP_SCRIPT, str(bumps)), range(processes)))
+
+        seen = [json.loads(out.strip().splitlines()[-1]) for out in outputs]
+        for versions in seen:
+            self.assertEqual(versions, sorted(versions))
+        all_versions = sorted(v for versions in seen for v in versions)
+        self.assertEqual(len(set(all_versions)), processes * bumps)
+        self.assertEqual(all_versions[-1] - all_versions[0], processes * bumps - 1)
+
+    def test_snapshot_rebuild_does_not_wait_for_writer_lock(self):
+        # Раньше чтение шло в atomic() с BEGIN IMMEDIATE и ждало блокировку (timeout 20 с)
+        seconds = float(self.run_python("-c", LOCKED_REFRESH_SCRIPT).strip().splitlines()[-1])
+        self.assertLess(seconds, 5)
+
+    def test_write_in_other_process_invalidates_local_cache(self):
+        reader = subprocess.Popen(
+            [sys.executable, "-c", READER_SCRIPT], env=self.env, cwd=settings.BASE_DIR,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            def check():
+                reader.stdin.write("check\n")
+                reader.stdin.flush()
+                return [int(x) for x in reader.stdout.readline().split()]
+
+            version, count, computed = check()
+            # Повторная проверка без записей — попадание в кэш
+            self.assertEqual(check(), [version, count, computed])
+
+            self.run_python("-c", WRITE_SCRIPT, "2030-01-01")
+
+            new_version, new_count, new_computed = check()
+            self.assertGreater(new_version, version)
+            self.assertEqual(new_count, count + 1)
+            self.assertEqual(new_computed, computed + 1)
+        finally:
+            reader.stdin.close()
+            reader.wait(timeout=30)
+
+
+# --------------------------------------------------------------------
+# 🔬 Профили: пересекающиеся capture() в разных потоках
+# --------------------------------------------------------------------
+
+class ProfilingOverlapTests(SimpleTestCase):
+    def test_overlapping_captures_in_threads(self):
+        if tracemalloc.is_tracing():
+            self.skipTest("tracemalloc включён снаружи (python -X tracemalloc)")
+        first_started, first_done = threading.Event(), threading.Event()
+        stems, errors = {}, []
+
+        def first():
+            try:
+                with profiling.capture("first") as cap:
+                    first_started.set()
+                    data = [bytearray(1024) for _ in range(100)]
+                stems["first"] = cap.stem
+            except Exception as e:  # noqa: BLE001 — ошибку проверяет тест
+                errors.append(e)
+            finally:
+                first_started.set()
+                first_done.set()
+
+        def second():
+            try:
+                first_started.wait(10)
+                with profiling.capture("second") as cap:
+                    # Первый профиль заканчивается, пока второй ещё идёт
+                    first_done.wait(10)
+                    data = [bytearray(1024) for _ in range(100)]
+                stems["second"] = cap.stem
+            except Exception as e:  # noqa: BLE001
+                errors.append(e)
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(DIARY_PROFILES_DIR=tmp):
+            threads = [threading.Thread(target=second), threading.Thread(target=first)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(30)
+            self.assertEqual(errors, [])
+            self.assertEqual(set(stems), {"first", "second"})
+            saved = {meta["label"] for meta in profiling.list_profiles()}
+            self.assertEqual(saved, {"first", "second"})
+        # Последний профиль выключил трассировку, которую включил первый
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_spans_from_many_threads_keep_their_own_slots(self):
+        cap = profiling.Capture("command")
+        barrier = threading.Barrier(16)
+
+        def step(i):
+            barrier.wait(10)
+            with cap.span(f"step-{i}"):
+                time.sleep(0.01)
+
+        with ThreadPoolExecutor(16) as pool:
+            list(pool.map(step, range(16)))
+        self.assertEqual(sorted(name for name, _, _ in cap.spans), sorted(f"step-{i}" for i in range(16)))
+        # Ни один шаг не затёр время другого и не остался с нулём
+        self.assertTrue(all(seconds >= 0.009 for _, seconds, _ in cap.spans))
+
+
+# --------------------------------------------------------------------
+# 📉 Бэктест: инкрементальные статистики против честного переобучения
+# --------------------------------------------------------------------
+
+class BacktestTests(SimpleTestCase):
+    def test_matches_naive_refit_per_cutoff(self):
+        rng = np.random.default_rng(7)
+        values = rng.normal(size=(60, 5)).round(1)
+        values[rng.random(values.shape) < 0.15] = np.nan
+        mask = ~np.isnan(values)
+
+        for t in range(values.shape[1]):
+            X, y, train, test = backtest._same_day_design(values, mask, t)
+            rows, preds = backtest.backtest_target(X, y, train, test, min_train=2)
+            self.assertTrue(len(rows))
+            for row, pred in zip(rows, preds):
+                # Обучение только на строках строго до прогнозируемой
+                before = np.flatnonzero(train[:row])
+                model = LinearRegression().fit(X[before], y[before])
+                self.assertAlmostEqual(pred, model.predict(X[row:row + 1])[0], places=6)
+
+    def test_min_train_below_one_is_rejected(self):
+        X, y = np.zeros((3, 1)), np.ones(3)
+        flags = np.ones(3, dtype=bool)
+        with self.assertRaises(ValueError):
+            backtest.backtest_target(X, y, flags, flags, min_train=0)
+
+        for raw in ("0", "-2"):
+            response = views.backtest_api(RequestFactory().get("/api/backtest/", {"min_train": raw}))
+            self.assertEqual(response.status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command("backtest", "--min-train", "0")
+
+
+# --------------------------------------------------------------------
+# 🗄️ Поколения моделей: параллельная публикация
+# --------------------------------------------------------------------
+
+class ModelStorePublishTests(SimpleTestCase):
+    def test_concurrent_publishes_never_move_pointer_back(self):
+        publishers, rounds = 6, 5
+        seen, done = [], threading.Event()
+
+        def watch():
+            while not done.is_set():
+                generation = model_store.current_generation("base")
+                if generation is not None:
+                    seen.append(generation)
+
+        def publish(_):
+            published = []
+            for _ in range(rounds):
+                tmp_dir = model_store.begin_generation("base")
+                with open(os.path.join(tmp_dir, "toshn.pkl"), "wb") as f:
+                    f.write(b"model")
+                published.append(model_store.publish_generation("base", tmp_dir))
+            return published
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(DIARY_MODELS_DIR=tmp):
+            watcher = threading.Thread(target=watch)
+            watcher.start()
+            try:
+                with ThreadPoolExecutor(publishers) as pool:
+                    published = [n for batch in pool.map(publish, range(publishers)) for n in batch]
+            finally:
+                done.set()
+                watcher.join(30)
+
+            self.assertEqual(sorted(published), list(range(1, publishers * rounds + 1)))
+            self.assertEqual(seen, sorted(seen))
+            current = model_store.current_generation("base")
+            self.assertEqual(current, publishers * rounds)
+            self.assertTrue(os.path.isfile(os.path.join(model_store.generation_dir("base", current), "toshn.pkl")))
+            remaining = model_store._existing_generations(model_store.strategy_dir("base"))
+            self.assertEqual(remaining, list(range(current - model_store.KEEP_GENERATIONS + 1, current + 1)))
+            self.assertFalse(os.path.exists(os.path.join(model_store.strategy_dir("base"), model_store.LOCK_DIR)))
+
+
+# --------------------------------------------------------------------
+# 🧮 Сетка значений в админке: права и режим записи
+# --------------------------------------------------------------------
+
+# Страницы админки без collectstatic: статика по исходным именам
+PLAIN_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+@override_settings(DIARY_WRITE_QUEUE=False, STORAGES=PLAIN_STORAGES)
+class AdminGridTests(TestCase):
+    URL = "/admin/diary_analytic/entry/grid/?end=2025-05-12"
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import Permission, User
+
+        cls.parameter = Parameter.objects.create(key="toshn", name="Тошнота")
+        cls.viewer = User.objects.create_user("viewer", is_staff=True)
+        cls.viewer.user_permissions.add(Permission.objects.get(codename="view_entry"))
+        cls.editor = User.objects.create_user("editor", is_staff=True, is_superuser=True)
+        cls.cell = {f"c_{cls.parameter.id}_20250512": "4"}
+
+    def test_view_only_user_cannot_save(self):
+        self.client.force_login(self.viewer)
+        page = self.client.get(self.URL)
+        self.assertEqual(page.status_code, 200)
+        self.assertFalse(page.context["can_change"])
+        self.assertNotContains(page, "Сохранить изменения")
+
+        self.assertEqual(self.client.post(self.URL, self.cell).status_code, 403)
+        self.assertFalse(EntryValue.objects.exists())
+
+    def test_editor_saves_without_writer_thread(self):
+        self.client.force_login(self.editor)
+        response = self.client.post(self.URL, self.cell)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(EntryValue.objects.get(entry__date="2025-05-12").value, 4.0)
+        coordinator = write_queue.get_write_coordinator()
+        self.assertTrue(coordinator._thread is None or not coordinator._thread.is_alive())
+
+
+# --------------------------------------------------------------------
+# 🔁 Журнал изменений и синхронизация (changelog.py)
+#
+# Локальное устройство — laptop; дельты «с телефона» собираются вручную.
+# --------------------------------------------------------------------
+
+def _delta(*changes, origin="phone"):
+    return {
+        "format": changelog.FORMAT_VERSION,
+        "origin": origin,
+        "changes": [
+            [origin, changed_at.isoformat(), kind, day.isoformat() if day else None, key, value, payload]
+            for changed_at, kind, day, key, value, payload in changes
+        ],
+    }
+
+
+@override_settings(DIARY_SYNC_DEVICE="laptop")
+class ChangeLogSyncTests(TestCase):
+    DAY = date(2025, 5, 12)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parameter = Parameter.objects.create(key="toshn", name="Тошнота")
+
+    def value(self):
+        return EntryValue.objects.filter(entry__date=self.DAY, parameter=self.parameter).values_list("value", flat=True).first()
+
+    def test_reapplying_a_delta_is_a_no_op(self):
+        body = _delta((datetime.now(timezone.utc), ChangeLog.VALUE, self.DAY, "toshn", 3.0, None))
+        first = changelog.apply_delta(body)
+        self.assertEqual((first.applied, first.duplicate), (1, 0))
+        logged = ChangeLog.objects.count()
+
+        again = changelog.apply_delta(body)
+        self.assertEqual((again.applied, again.duplicate, again.stale), (0, 1, 0))
+        self.assertEqual(ChangeLog.objects.count(), logged)
+        self.assertEqual(self.value(), 3.0)
+
+    def test_stale_change_loses_to_newer_local_change(self):
+        entry = Entry.objects.create(date=self.DAY)
+        EntryValue.objects.create(entry=entry, parameter=self.parameter, value=2.0)
+        local_at = ChangeLog.objects.get(kind=ChangeLog.VALUE).changed_at
+
+        stale = changelog.apply_delta(_delta((local_at - timedelta(hours=1), ChangeLog.VALUE, self.DAY, "toshn", 5.0, None)))
+        self.assertEqual((stale.applied, stale.stale), (0, 1))
+        self.assertEqual(self.value(), 2.0)
+
+        newer = changelog.apply_delta(_delta((local_at + timedelta(hours=1), ChangeLog.VALUE, self.DAY, "toshn", 4.0, None)))
+        self.assertEqual(newer.applied, 1)
+        self.assertEqual(self.value(), 4.0)
+
+    def test_rename_travels_as_old_key(self):
+        entry = Entry.objects.create(date=self.DAY)
+        EntryValue.objects.create(entry=entry, parameter=self.parameter, value=1.0)
+
+        # Локальное переименование пишет старый ключ в payload
+        self.parameter.key = "nausea"
+        self.parameter.save()
+        change = ChangeLog.objects.filter(kind=ChangeLog.PARAMETER).latest("id")
+        self.assertEqual((change.key, change.payload["old_key"]), ("nausea", "toshn"))
+
+        # Чужое переименование меняет ключ у того же параметра — значения остаются
+        stats = changelog.apply_delta(_delta((
+            datetime.now(timezone.utc) + timedelta(minutes=1), ChangeLog.PARAMETER, None, "nausea_2",
+            None, {"name": "Тошнота", "is_active": True, "description": "", "old_key": "nausea"},
+        )))
+        self.assertEqual(stats.applied, 1)
+        renamed = Parameter.objects.get(pk=self.parameter.pk)
+        self.assertEqual(renamed.key, "nausea_2")
+        self.assertEqual(EntryValue.objects.get(parameter=renamed).value, 1.0)
+        self.assertFalse(Parameter.objects.filter(key__in=("toshn", "nausea")).exists())
+
+    def test_deletes_are_logged_once(self):
+        coordinator = write_queue.get_write_coordinator()
+        coordinator.submit(self.DAY, "toshn", 2).result(timeout=5)
+        coordinator.submit(self.DAY, "toshn", None).result(timeout=5)
+        values = ChangeLog.objects.filter(kind=ChangeLog.VALUE).values_list("value", flat=True)
+        self.assertEqual(list(values.order_by("id")), [2.0, None])
+
+        # Удаление дня — одно изменение, без строки на каждое значение каскада
+        coordinator.submit(self.DAY, "toshn", 1).result(timeout=5)
+        logged = ChangeLog.objects.count()
+        Entry.objects.filter(date=self.DAY).delete()
+        kinds = ChangeLog.objects.filter(id__gt=0).order_by("id").values_list("kind", flat=True)[logged:]
+        self.assertEqual(list(kinds), [ChangeLog.ENTRY_DELETE])
+
+    def test_applied_changes_are_not_echoed(self):
+        since = ChangeLog.objects.latest("id").id  # создание параметра в setUpTestData
+        changelog.apply_delta(_delta((datetime.now(timezone.utc), ChangeLog.VALUE, self.DAY, "toshn", 3.0, None)))
+        # Применённое лежит в журнале с исходным origin, а не как новое изменение laptop
+        self.assertEqual(list(ChangeLog.objects.filter(id__gt=since).values_list("origin", flat=True)), ["phone"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path, cursor, count = changelog.export_delta(since, exclude_origin="phone", output=tmp)
+            self.assertIsNone(path)
+            self.assertEqual(count, 0)
+            self.assertEqual(cursor, ChangeLog.objects.latest("id").id)
+
+            # Своя правка уходит, чужая — нет
+            Entry.objects.filter(date=self.DAY).update(comment="")
+            Entry.objects.get(date=self.DAY).save()
+            path, _, count = changelog.export_delta(cursor, exclude_origin="phone", output=tmp)
+            body = changelog.read_delta(path)
+            self.assertEqual(count, 1)
+            self.assertEqual(body["origin"], "laptop")
+            self.assertEqual([row[2] for row in body["changes"]], [ChangeLog.COMMENT])
+
+
+# --------------------------------------------------------------------
+# ✍️ Очередь записи: групповой коммит (write_queue.py)
+# --------------------------------------------------------------------
+
+class WriteCoordinatorTests(TestCase):
+    DAY = date(2025, 5, 12)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parameter = Parameter.objects.create(key="toshn", name="Тошнота")
+        Parameter.objects.create(key="ustalost", name="Усталость")
+
+    def value(self, key="toshn"):
+        return EntryValue.objects.filter(entry__date=self.DAY, parameter__key=key).values_list("value", flat=True).first()
+
+    def test_last_write_wins_within_batch(self):
+        batch = [write_queue._Write(self.DAY, "toshn", v) for v in (1.0, 3.0, 2.0)]
+        batch.append(write_queue._Write(self.DAY, "ustalost", 4.0))
+        batch.append(write_queue._Write(self.DAY, "ustalost", None))
+        write_queue.WriteCoordinator()._commit(batch)
+
+        self.assertEqual(self.value(), 2.0)
+        self.assertIsNone(self.value("ustalost"))
+        # Все дубли пары получают ответ последней записи
+        self.assertEqual([w.future.result(0) for w in batch[:3]], [{"success": True, "created": True}] * 3)
+        self.assertTrue(batch[4].future.result(0)["deleted"])
+
+    def test_invalid_parameter_fails_only_its_own_futures(self):
+        bad = [write_queue._Write(self.DAY, "nope", 1.0), write_queue._Write(self.DAY, "nope", 2.0)]
+        good = write_queue._Write(self.DAY, "toshn", 3.0)
+        write_queue.WriteCoordinator()._commit([bad[0], good, bad[1]])
+
+        for write in bad:
+            self.assertIsInstance(write.future.exception(0), write_queue.InvalidParameter)
+        self.assertEqual(good.future.result(0), {"success": True, "created": True})
+        self.assertEqual(self.value(), 3.0)
+
+    def test_submit_inside_atomic_commits_in_place(self):
+        coordinator = write_queue.WriteCoordinator()
+        with transaction.atomic():
+            future = coordinator.submit(self.DAY, "toshn", 5)
+            # Писатель чужую транзакцию не увидел бы — запись сделана здесь же, без потока
+            self.assertTrue(future.done())
+            self.assertEqual(self.value(), 5.0)
+        self.assertIsNone(coordinator._thread)
+        self.assertEqual(coordinator.batches, 1)
+
+    def test_update_value_timeout_returns_503(self):
+        stuck = mock.Mock()
+        stuck.submit.return_value = Future()  # никогда не завершится
+        request = RequestFactory().post(
+            "/update_value/", json.dumps({"parameter": "toshn", "value": 2, "date": "2025-05-12"}),
+            content_type="application/json",
+        )
+        with mock.patch.object(write_queue, "get_write_coordinator", return_value=stuck), \
+                mock.patch.object(views, "WRITE_TIMEOUT", 0.01), override_settings(DIARY_WRITE_QUEUE=True):
+            response = views.update_value(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content), {"error": "write timeout"})
+
+
+def isolated_settings(root):
+    """Обновление после коммита пишет снимок, экспорт и архив — во временный каталог."""
+    return override_settings(
+        DIARY_SNAPSHOT_DIR=os.path.join(root, "snapshots"),
+        DIARY_EXPORT_PATH=os.path.join(root, "export.csv"),
+        DIARY_MODELS_DIR=os.path.join(root, "models"),
+        DIARY_ARCHIVE_DIR=os.path.join(root, "archive"),
+        DIARY_PRECOMPUTE_PREDICTIONS=False,
+        # Обновление — в потоке теста, чтобы оно не пережило override_settings
+        DIARY_BACKGROUND_REFRESH=False,
+    )
+
+
+class WriteCoordinatorThreadTests(TransactionTestCase):
+    """Настоящий поток-писатель: параллельные записи сливаются в группы."""
+
+    def setUp(self):
+        # Сначала подмена путей: создание параметра в autocommit сразу запускает обновление
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = isolated_settings(self.tmp.name)
+        self.settings_override.enable()
+        Parameter.objects.create(key="toshn", name="Тошнота")
+
+    def tearDown(self):
+        # Обновление, запущенное записью теста, не должно пережить подмену путей
+        self.assertTrue(signals.get_refresher().wait_idle(timeout=30))
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def test_concurrent_submits_are_grouped_and_last_wins(self):
+        coordinator = write_queue.WriteCoordinator(group_delay=0.05)
+        days = [date(2025, 5, d) for d in range(1, 21)]
+        with ThreadPoolExecutor(len(days)) as pool:
+            futures = list(pool.map(lambda d: coordinator.submit(d, "toshn", d.day % 6), days))
+        futures.append(coordinator.submit(days[0], "toshn", 5))
+        for future in futures:
+            future.result(timeout=30)
+
+        stored = dict(EntryValue.objects.values_list("entry__date", "value"))
+        self.assertEqual(stored, {d: float(5 if d == days[0] else d.day % 6) for d in days})
+        # Future завершаются на коммите, счётчики писатель обновляет чуть позже
+        deadline = time.monotonic() + 10
+        while coordinator.writes < len(days) + 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(coordinator.writes, len(days) + 1)
+        self.assertLess(coordinator.batches, coordinator.writes)
+
+
+# --------------------------------------------------------------------
+# 🧊 Архив закрытых лет (archive.py)
+# --------------------------------------------------------------------
+
+class ArchiveTests(TestCase):
+    TODAY = date(2025, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.toshn = Parameter.objects.create(key="toshn", name="Тошнота")
+        cls.ustalost = Parameter.objects.create(key="ustalost", name="Усталость")
+        for day, toshn, ustalost in [
+            (date(2024, 3, 1), 1, 2), (date(2024, 12, 31), 3, None), (date(2025, 1, 1), 4, 5),
+        ]:
+            entry = Entry.objects.create(date=day, comment=f"день {day}")
+            EntryValue.objects.create(entry=entry, parameter=cls.toshn, value=toshn)
+            if ustalost is not None:
+                EntryValue.objects.create(entry=entry, parameter=cls.ustalost, value=ustalost)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = isolated_settings(self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def snapshot(self) -> tuple:
+        matrix = DiaryMatrix.from_db()
+        parameters = export.export_parameters()
+        return (
+            matrix.keys, matrix.python_dates(), matrix.to_float_array().tolist(),
+            list(export.iter_export_rows(parameters)),
+        )
+
+    def assertSameData(self, expected):
+        keys, dates, values, rows = self.snapshot()
+        self.assertEqual((keys, dates, rows), expected[:2] + expected[3:])
+        np.testing.assert_array_equal(np.array(values), np.array(expected[2]))
+
+    def test_archive_and_unarchive_keep_matrix_and_export(self):
+        before = self.snapshot()
+
+        part = archive.archive_year(2024, today=self.TODAY)
+        self.assertEqual(part["rows"], 3)
+        self.assertFalse(EntryValue.objects.filter(entry__date__year=2024).exists())
+        self.assertSameData(before)
+
+        # Манифест без года обновляется после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            restored = archive.unarchive_year(2024)
+        self.assertEqual(restored, 3)
+        self.assertEqual(archive.partitions(), [])
+        self.assertEqual(EntryValue.objects.filter(entry__date__year=2024).count(), 3)
+        self.assertSameData(before)
+
+    def test_current_year_cannot_be_archived(self):
+        with self.assertRaises(ValueError):
+            archive.archive_year(2025, today=self.TODAY)
+
+    def test_archived_year_is_read_only(self):
+        archive.archive_year(2024, today=self.TODAY)
+        day = date(2024, 3, 1)
+
+        response = self.client.post(
+            "/update_value/", json.dumps({"parameter": "toshn", "value": 5, "date": "2024-03-01"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content), {"error": "archived period", "period": "2024"})
+
+        future = write_queue.get_write_coordinator().submit(day, "toshn", 5)
+        self.assertIsInstance(future.exception(5), archive.ArchivedPeriodError)
+
+        messages = []
+        created, updated = import_excel_dataframe(
+            pd.DataFrame({"Дата": ["2024-03-01", "2025-01-01"], "Тошнота": [5, 2]}), messages.append,
+        )
+        self.assertEqual((created, updated), (0, 1))
+        self.assertEqual(len(messages), 1)
+
+        entry = Entry.objects.get(date=day)
+        form = EntryValueAdminForm({"entry": entry.pk, "parameter": self.toshn.pk, "value": 5})
+        self.assertFalse(form.is_valid())
+        self.assertFalse(EntryValue.objects.filter(entry=entry).exists())
+        live = Entry.objects.create(date=date(2025, 2, 1))
+        self.assertTrue(EntryValueAdminForm({"entry": live.pk, "parameter": self.toshn.pk, "value": 5}).is_valid())
+
+
+class SnapshotReadTests(SimpleTestCase):
+    def test_read_retries_until_version_is_stable(self):
+        # Между двумя чтениями версии прошёл коммит (1 → 2) — первое чтение отбрасывается
+        versions = iter([1, 2, 2, 2])
+        matrices = iter(["first", "second"])
+        with mock.patch.object(snapshot, "connection", mock.Mock(in_atomic_block=False)), \
+                mock.patch.object(snapshot, "get_data_version", side_effect=lambda: next(versions)), \
+                mock.patch.object(snapshot.DiaryMatrix, "from_db", side_effect=lambda: next(matrices)), \
+                mock.patch.object(snapshot.transaction, "atomic") as atomic:
+            self.assertEqual(snapshot.read_consistent(), (2, "second"))
+        atomic.assert_not_called()
+
+
+class SnapshotWriteTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = isolated_settings(self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_pointer_only_moves_to_newer_data_version(self):
+        matrix = DiaryMatrix.empty()
+        newest = snapshot.write_snapshot(matrix, {"data_version": 5})
+        # Медленный писатель со старой версией не отводит указатель назад
+        self.assertEqual(snapshot.write_snapshot(matrix, {"data_version": 4}), newest)
+        self.assertEqual(snapshot.current_snapshot_path(), newest)
+        self.assertEqual(snapshot.read_snapshot_meta(newest)["data_version"], 5)
+
+        for version in (6, 7, 8):
+            latest = snapshot.write_snapshot(matrix, {"data_version": version})
+        self.assertEqual(snapshot.current_snapshot_path(), latest)
+        snaps = [d for d in os.listdir(snapshot.get_snapshot_dir()) if d.startswith("snap-")]
+        self.assertEqual(len(snaps), snapshot.KEEP_SNAPSHOTS)
+        self.assertIn(os.path.basename(latest), snaps)
+
+    def test_reader_miss_builds_in_memory_only(self):
+        from diary_analytic import utils
+
+        toshn = Parameter.objects.create(key="toshn", name="Тошнота")
+        EntryValue.objects.create(entry=Entry.objects.create(date=date(2025, 5, 12)), parameter=toshn, value=2)
+        matrix = utils._open_matrix(versioning.get_data_version())
+        self.assertEqual(matrix.keys, ["toshn"])
+        self.assertIsNone(snapshot.current_snapshot_path())
+
+
+# --------------------------------------------------------------------
+# 🔗 Спирмен: ранги по общим дням пары
+# --------------------------------------------------------------------
+
+class SpearmanTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        values = rng.integers(0, 6, size=(80, 4)).astype(np.float64)
+        # Разные пропуски по столбцам, чтобы общие дни пар различались
+        self.mask = rng.random(values.shape) < np.array([0.9, 0.6, 0.4, 0.75])
+        self.frame = pd.DataFrame(np.where(self.mask, values, np.nan))
+        dates = np.datetime64("2024-01-01") + np.arange(len(values))
+        self.matrix = DiaryMatrix(dates, list("abcd"), np.where(self.mask, values, 0), self.mask)
+
+    def test_matches_pandas_on_gapped_columns(self):
+        result = correlations.spearman(self.matrix)
+        expected = self.frame.corr("spearman", min_periods=1).to_numpy()
+        np.testing.assert_allclose(result.r, expected, atol=1e-12)
+
+    def test_lag_ranks_within_shifted_pairs(self):
+        result = correlations.spearman(self.matrix, lag=1)
+        shifted = self.frame.shift(1)
+        for i in range(4):
+            for j in range(4):
+                expected = shifted[i].corr(self.frame[j], method="spearman", min_periods=1)
+                np.testing.assert_allclose(result.r[i, j], expected, atol=1e-12)
+
+    def test_negative_limit_is_rejected(self):
+        response = views.correlations_api(RequestFactory().get("/api/correlations/", {"target": "x", "limit": "-1"}))
+        self.assertEqual(response.status_code, 400)
+
+
+# --------------------------------------------------------------------
+# 📈 Экспозиция метрик
+# --------------------------------------------------------------------
+
+@override_settings(DIARY_METRICS_DIR=None)
+class MetricsRenderTests(SimpleTestCase):
+    def test_every_sample_belongs_to_a_declared_family(self):
+        metrics.HTTP_REQUESTS.inc(view="home", method="GET", status="200")
+        metrics.HTTP_SECONDS.observe(0.01, view="home")
+        lines = metrics.render().splitlines()
+        families = {line.split()[2]: line.split()[3] for line in lines if line.startswith("# TYPE")}
+        self.assertEqual(families["diary_http_requests_total"], "counter")
+        self.assertNotIn("diary_http_requests", families)
+
+        suffixes = {"counter": ("",), "summary": ("_sum", "_count"), "histogram": ("_bucket", "_sum", "_count")}
+        for line in lines:
+            if line.startswith("#"):
+                continue
+            name = line.split("{")[0].split()[0]
+            self.assertTrue(any(name == family + suffix for family, kind in families.items()
+                                for suffix in suffixes[kind]), name)
+
+
+class MetricsFilesTests(SimpleTestCase):
+    def test_file_of_previous_process_with_same_pid_is_adopted(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(DIARY_METRICS_DIR=root):
+            name = "test_reused_pid"
+            stale = Path(root) / f"{os.getpid()}-1.json"
+            stale.write_text(json.dumps({"diary_cache_requests": [[[name, "hit"], [3.0]]]}), encoding="utf-8")
+            before = metrics.CACHE_REQUESTS.snapshot().get((name, "hit"), [0.0])[0]
+
+            values = metrics.collect()
+            self.assertEqual(values["diary_cache_requests"][(name, "hit")], [before + 3.0])
+            self.assertFalse(stale.exists())
+            # Значения перешли к текущему процессу, а его файл назван по pid и времени запуска
+            self.assertEqual(metrics.CACHE_REQUESTS.snapshot()[(name, "hit")], [before + 3.0])
+            self.assertEqual([p.name for p in Path(root).glob("*.json")], [f"{metrics._process_name}.json"])
+
+
+# --------------------------------------------------------------------
+# 🗃️ Ограниченный локальный кэш
+# --------------------------------------------------------------------
+
+class VersionedCacheLimitTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = versioning.VersionedCache("test_lru", max_items=2)
+        computed = []
+
+        def compute(key):
+            return lambda version: computed.append(key) or key
+
+        for key in ("a", "b", "a", "c", "a", "b"):
+            cache.get(key, compute(key), version=1)
+        # "a" использовался перед "c", поэтому вытеснен "b", а затем "c"
+        self.assertEqual(computed, ["a", "b", "c", "b"])
+        self.assertEqual(len(cache), 2)
+
+    def test_lttb_caches_are_bounded(self):
+        for cache in (views._history_lttb_cache, views._category_lttb_cache):
+            self.assertEqual(cache.max_items, views.LTTB_CACHE_ITEMS)
+
+
+# --------------------------------------------------------------------
+# 🔄 Инкрементальные хранилища = полный пересчёт
+# --------------------------------------------------------------------
+
+class IncrementalStoreTests(SimpleTestCase):
+    keys = ["a", "b", "c", "d"]
+
+    def _matrix(self, dates, values, mask):
+        return DiaryMatrix(np.asarray(dates, dtype="datetime64[D]"), self.keys, np.where(mask, values, 0), mask)
+
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        # Пропуск в датах, чтобы окна признаков шли по календарным дням, а не по строкам
+        dates = np.setdiff1d(np.datetime64("2024-01-01") + np.arange(200), [np.datetime64("2024-01-20")])
+        values = rng.integers(0, 6, size=(len(dates), len(self.keys))).astype(np.int8)
+        mask = rng.random(values.shape) < 0.7
+        self.before = self._matrix(dates, values, mask)
+
+        # Одно значение изменено, добавлены пропущенный и следующий день, первый день удалён
+        values, mask = values.copy(), mask.copy()
+        values[30, 1], mask[30, 1] = 5 - values[30, 1], True
+        added = np.array(["2024-01-20", "2024-07-19"], dtype="datetime64[D]")
+        all_dates = np.concatenate([dates, added])
+        order = np.argsort(all_dates)[1:]
+        extra_values = rng.integers(0, 6, size=(2, len(self.keys))).astype(np.int8)
+        extra_mask = np.ones((2, len(self.keys)), dtype=bool)
+        self.after = self._matrix(all_dates[order], np.concatenate([values, extra_values])[order],
+                                  np.concatenate([mask, extra_mask])[order])
+
+    def test_feature_store_matches_full_rebuild(self):
+        store = feature_store.FeatureStore()
+        store.advance(self.before)
+        features = store.advance(self.after)
+        self.assertEqual((store.full_runs, store.incremental_runs), (1, 1))
+        np.testing.assert_array_equal(features.values, feature_store.compute_rows(self.after, self.after.dates))
+
+    def test_rollup_store_matches_full_rebuild(self):
+        tax = taxonomy.Taxonomy([("a", "ЖВТ-ОБЩ :: A"), ("b", "ЖВТ-ПНК :: B"), ("c", "СОН :: C"), ("d", "ЖВТ-ОБЩ :: D")])
+        store = taxonomy.RollupStore()
+        store.advance(self.before, tax)
+        rollups = store.advance(self.after, tax)
+        self.assertEqual((store.full_runs, store.incremental_runs), (1, 1))
+        expected = taxonomy.compute_rows(self.after, tax.membership(self.keys), np.arange(len(self.after.dates)))
+        for actual, full in zip((rollups.sums, rollups.maxes, rollups.counts), expected):
+            np.testing.assert_array_equal(actual, full)
+
+
+# --------------------------------------------------------------------
+# 🔎 Пересборка FTS-индекса по схеме миграции
+# --------------------------------------------------------------------
+
+class SearchIndexTests(TestCase):
+    def test_recreate_uses_migration_schema(self):
+        if not search.fts_available():
+            self.skipTest("SQLite без FTS5")
+        Entry.objects.create(date=date(2025, 3, 1), comment="сильная тошнота после ужина")
+        self.assertEqual(search.rebuild_index(recreate=True), 1)
+        # Триггеры пересозданы вместе с таблицей: новый день сразу в индексе
+        Entry.objects.create(date=date(2025, 3, 2), comment="тошнит с утра")
+        found = [item["date"] for item in search.search_comments("тошн")["results"]]
+        self.assertEqual(sorted(found), ["2025-03-01", "2025-03-02"])
+
+
+# --------------------------------------------------------------------
+# 🧵 Фоновое обновление после записи
+# --------------------------------------------------------------------
+
+class BackgroundRefreshTests(SimpleTestCase):
+    def test_consecutive_commits_merge_into_one_refresh(self):
+        calls = []
+        refresher = signals._Refresher(delay=0.05)
+        with mock.patch.object(signals, "_refresh", side_effect=lambda dates: calls.append(set(dates))):
+            refresher.submit({date(2025, 5, 1)})
+            refresher.submit({date(2025, 5, 2)})
+            self.assertTrue(refresher.wait_idle(timeout=5))
+        self.assertEqual(calls, [{date(2025, 5, 1), date(2025, 5, 2)}])
+        self.assertEqual(refresher.runs, 1)
+
+    def test_batch_hands_dates_to_refresher(self):
+        batch = signals._RefreshBatch()
+        batch.dates.add(date(2025, 5, 1))
+        with mock.patch.object(signals, "get_refresher") as get_refresher, \
+                mock.patch.object(signals, "_refresh") as refresh:
+            with override_settings(DIARY_BACKGROUND_REFRESH=True):
+                batch()
+            get_refresher.return_value.submit.assert_called_once_with({date(2025, 5, 1)})
+            refresh.assert_not_called()
+            with override_settings(DIARY_BACKGROUND_REFRESH=False):
+                batch()
+            refresh.assert_called_once_with({date(2025, 5, 1)})
+
+
+@override_settings(DIARY_METRICS_DIR=None)
+class PredictionFallbackTests(TestCase):
+    def test_missing_precompute_is_counted(self):
+        before = metrics.PREDICTION_FALLBACKS.snapshot().get(("base",), [0.0])[0]
+        with mock.patch.object(views.PredictorManager, "predict_for_date", return_value={"toshn": 1.0}), \
+                self.assertLogs("predict", level="INFO"):
+            predictions = views.get_predictions_by_models(date(2025, 5, 12), ["base"])
+        self.assertEqual(predictions, {"base": {"toshn": 1.0}})
+        self.assertEqual(metrics.PREDICTION_FALLBACKS.snapshot()[("base",)][0], before + 1)
+
+
+class PredictionStoreTests(TestCase):
+    DAY = date(2025, 5, 12)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.toshn = Parameter.objects.create(key="toshn", name="ЖВТ-ОБЩ :: Тошнота")
+        cls.entry = Entry.objects.create(date=cls.DAY)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = isolated_settings(self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        precompute = override_settings(DIARY_PRECOMPUTE_PREDICTIONS=True)
+        precompute.enable()
+        self.addCleanup(precompute.disable)
+
+    def store(self, strategy, day, model_version=None):
+        if model_version is None:
+            model_version = views.PredictorManager(strategy).model_version()
+        Prediction.objects.create(strategy=strategy, target="toshn", date=day, value=1.0, model_version=model_version)
+
+    def test_write_drops_predictions_of_edited_day(self):
+        next_day = self.DAY + timedelta(days=1)
+        for strategy in ("base", "lagged"):
+            self.store(strategy, self.DAY)
+            self.store(strategy, next_day)
+        EntryValue.objects.create(entry=self.entry, parameter=self.toshn, value=3)
+
+        left = set(Prediction.objects.values_list("strategy", "date"))
+        # Следующий день зависит от правки только через признаки прошлых дней (lagged)
+        self.assertEqual(left, {("base", next_day)})
+        self.assertEqual(prediction_store.get_stored_predictions(self.DAY), {})
+
+    def test_other_model_version_is_a_miss(self):
+        self.store("base", self.DAY)
+        self.store("flags", self.DAY, model_version=views.PredictorManager("flags").model_version() + 1)
+        self.assertEqual(prediction_store.get_stored_predictions(self.DAY), {"base": {"toshn": 1.0}})
+
+
+# --------------------------------------------------------------------
+# ⚡ Async-вьюхи: общий разбор параметров с WSGI-вариантом
+# --------------------------------------------------------------------
+
+class AsyncRangeOptionsTests(SimpleTestCase):
+    def test_async_range_rejects_like_sync(self):
+        for query in ({}, {"from": "2025-05-10", "to": "2025-05-01"},
+                      {"from": "2025-05-01", "to": "2025-05-02", "strategy": "nope"}):
+            request = RequestFactory().get("/api/predictions_range/", query)
+            sync = views.predictions_range(request)
+            async_ = async_to_sync(async_views.predictions_range)(request)
+            self.assertEqual((async_.status_code, async_.content), (sync.status_code, sync.content))
+            self.assertEqual(sync.status_code, 400)
+
+
+# --------------------------------------------------------------------
+# 🧮 Компактная матрица дневника против прежнего pivot в pandas
+# --------------------------------------------------------------------
+
+def _pandas_pivot() -> pd.DataFrame:
+    """Прежний get_diary_dataframe(): узкая таблица значений → pivot по датам."""
+    rows = [
+        {"date": v.entry.date, "parameter": v.parameter.key, "value": v.value}
+        for v in EntryValue.objects.select_related("entry", "parameter")
+    ]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).pivot(index="date", columns="parameter", values="value").sort_index()
+
+
+class DiaryMatrixTests(TestCase):
+    def fill(self, values):
+        params = {key: Parameter.objects.create(key=key, name=key) for key in ("b_toshn", "a_ustalost", "c_son")}
+        for day, row in values.items():
+            entry = Entry.objects.create(date=day)
+            for key, value in row.items():
+                EntryValue.objects.create(entry=entry, parameter=params[key], value=value)
+
+    def test_from_db_matches_pandas_pivot(self):
+        self.fill({
+            date(2025, 5, 12): {"b_toshn": 1, "a_ustalost": 2},
+            date(2025, 5, 10): {"c_son": 0, "a_ustalost": 5},
+            date(2025, 5, 11): {"b_toshn": 3},
+        })
+        matrix = DiaryMatrix.from_db()
+        self.assertEqual(matrix.values.dtype, np.int8)
+        pd.testing.assert_frame_equal(matrix.to_frame(), _pandas_pivot())
+
+    def test_fractional_values_use_float32(self):
+        self.fill({date(2025, 5, 10): {"b_toshn": 2.5}, date(2025, 5, 11): {"c_son": 4}})
+        matrix = DiaryMatrix.from_db()
+        self.assertEqual(matrix.values.dtype, np.float32)
+        pd.testing.assert_frame_equal(matrix.to_frame(), _pandas_pivot())
+
+    def test_empty_diary(self):
+        self.assertTrue(DiaryMatrix.from_db().to_frame().empty)
+        self.assertTrue(_pandas_pivot().empty)
+
+    def test_packed_mask_round_trip(self):
+        rng = np.random.default_rng(5)
+        # Ширины не кратные 8: хвост последнего байта не должен давать лишних ячеек
+        for width in (1, 7, 8, 9, 20):
+            mask = rng.random((30, width)) < 0.4
+            values = np.where(mask, rng.integers(0, 6, size=mask.shape), 0).astype(np.int8)
+            dates = np.datetime64("2025-01-01") + np.arange(30)
+            matrix = DiaryMatrix(dates, [f"k{i}" for i in range(width)], values, mask)
+            np.testing.assert_array_equal(matrix.mask, mask)
+            np.testing.assert_array_equal(matrix.detached().mask, mask)
+            expected = np.where(mask, values.astype(np.float64), np.nan)
+            np.testing.assert_array_equal(matrix.to_float_array(), expected)
+
+
+# --------------------------------------------------------------------
+# 📦 FastJsonResponse против JsonResponse
+# --------------------------------------------------------------------
+
+class FastJsonResponseTests(TestCase):
+    def assertSameJson(self, fast_data, plain_data):
+        fast, plain = FastJsonResponse(fast_data), JsonResponse(plain_data)
+        self.assertEqual(fast["Content-Type"], plain["Content-Type"])
+        self.assertEqual(json.loads(fast.content), json.loads(plain.content))
+
+    def test_nan_becomes_null(self):
+        values = np.array([1.0, np.nan, 2.5])
+        self.assertSameJson(
+            {"values": values, "float32": values.astype(np.float32), "scalar": np.float64("nan"), "count": np.int64(3)},
+            {"values": [1.0, None, 2.5], "float32": [1.0, None, 2.5], "scalar": None, "count": 3},
+        )
+
+    def test_date_columns_are_iso_strings(self):
+        days = np.array(["2025-05-10", "2025-05-12"], dtype="datetime64[D]")
+        self.assertSameJson(
+            {"dates": days, "first": days[0], "today": date(2025, 5, 12)},
+            {"dates": ["2025-05-10", "2025-05-12"], "first": "2025-05-10", "today": "2025-05-12"},
+        )
+
+    def test_series_payload_schemas(self):
+        mask = np.array([[True], [False], [True], [True]])
+        dates = np.array(["2025-05-10", "2025-05-11", "2025-05-13", "2025-05-14"], dtype="datetime64[D]")
+        matrix = DiaryMatrix(dates, ["toshn"], np.array([[1], [0], [3], [2]], dtype=np.int8), mask)
+        rows, values = np.array([0, 2, 3]), np.array([1.0, 3.0, np.nan])
+        self.assertSameJson(
+            series_payload(matrix, rows, values),
+            {"dates": ["2025-05-10", "2025-05-13", "2025-05-14"], "values": [1.0, 3.0, None]},
+        )
+        self.assertSameJson(
+            series_payload(matrix, rows, values, "columnar"),
+            {"start": "2025-05-10", "offsets": [0, 3, 4], "values": [1.0, 3.0, None]},
+        )
+
+
+def _legacy_export_csv(filepath):
+    """Прежний export_diary_to_csv (DataFrame → to_csv) — эталон формата экспорта."""
+    parameters = list(Parameter.objects.order_by("name"))
+    data = []
+    for entry in Entry.objects.order_by("-date"):
+        row = {"Дата": entry.date.strftime("%d.%m.%y")}
+        values = {ev.parameter_id: ev.value for ev in entry.entryvalue_set.all()}
+        for p in parameters:
+            val = values.get(p.id, None)
+            row[p.name] = "" if val is None else int(val)
+        data.append(row)
+    df = pd.DataFrame(data)[["Дата"] + [p.name for p in parameters]]
+    df.to_csv(filepath, index=False, encoding="utf-8-sig")
+
+
+class ExportDownloadTests(TestCase):
+    def setUp(self):
+        sleep = Parameter.objects.create(key="sleep", name="Сон, часы")
+        mood = Parameter.objects.create(key="mood", name='Настроение "утро"')
+        Parameter.objects.create(key="unused", name="Пусто")
+        for day, values in [
+            (date(2025, 5, 10), {sleep: 7.6, mood: 3}),
+            (date(2025, 5, 11), {mood: -2}),
+            (date(2025, 5, 12), {}),
+            (date(2025, 5, 13), {sleep: 8, mood: 0}),
+        ]:
+            entry = Entry.objects.create(date=day)
+            for parameter, value in values.items():
+                EntryValue.objects.create(entry=entry, parameter=parameter, value=value)
+
+    def test_csv_matches_legacy_export(self):
+        with tempfile.TemporaryDirectory() as root:
+            legacy = Path(root) / "export.csv"
+            with isolated_settings(root):
+                _legacy_export_csv(str(legacy))
+                response = views.export_download(RequestFactory().get("/export/"))
+                streamed = b"".join(response.streaming_content)
+            self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+            self.assertTrue(streamed.startswith(b"\xef\xbb\xbf"))
+            self.assertEqual(streamed, legacy.read_bytes())
+
+    def test_xlsx_matches_csv_rows(self):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        with tempfile.TemporaryDirectory() as root, isolated_settings(root):
+            response = views.export_download(RequestFactory().get("/export/", {"format": "xlsx"}))
+            workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+            rows = list(workbook[export.DATA_SHEET].iter_rows(values_only=True))
+        self.assertEqual(rows[0], ("Дата", 'Настроение "утро"', "Пусто", "Сон, часы"))
+        self.assertEqual(rows[1:], [
+            ("13.05.25", 0, None, 8),
+            ("12.05.25", None, None, None),
+            ("11.05.25", -2, None, None),
+            ("10.05.25", 3, None, 7),
+        ])
+        self.assertEqual(workbook.sheetnames, [export.DATA_SHEET, export.DESCRIPTIONS_SHEET])
+
+    def test_invalid_format(self):
+        response = views.export_download(RequestFactory().get("/export/", {"format": "pdf"}))
+        self.assertEqual(response.status_code, 400)
+
+
+# --------------------------------------------------------------------
+# 📈 predictions_range: границы диапазона и ответы 400
+# --------------------------------------------------------------------
+
+class PredictionsRangeTests(TestCase):
+    def get(self, **query):
+        return views.predictions_range(RequestFactory().get("/api/predictions_range/", query))
+
+    def test_bad_requests(self):
+        too_long = date(2020, 1, 1) + timedelta(days=views.MAX_RANGE_DAYS)
+        for query, error in [
+            ({}, "missing or invalid from/to"),
+            ({"from": "2025-05-01"}, "missing or invalid from/to"),
+            ({"from": "2025-05-01", "to": "05.05.2025"}, "missing or invalid from/to"),
+            ({"from": "2025-05-10", "to": "2025-05-09"}, "to is before from"),
+            ({"from": "2020-01-01", "to": too_long.isoformat()}, f"range is longer than {views.MAX_RANGE_DAYS} days"),
+            ({"from": "2025-05-01", "to": "2025-05-02", "strategy": "nope"}, "unknown strategy: nope"),
+        ]:
+            with self.subTest(query=query):
+                response = self.get(**query)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(json.loads(response.content), {"error": error})
+
+    def test_range_limits_are_inclusive(self):
+        query = RequestFactory().get("/", {"from": "2025-05-10", "to": "2025-05-10"}).GET
+        self.assertEqual(views.parse_range_options(query)[:2], (date(2025, 5, 10), date(2025, 5, 10)))
+
+        last = date(2020, 1, 1) + timedelta(days=views.MAX_RANGE_DAYS - 1)
+        query = RequestFactory().get("/", {"from": "2020-01-01", "to": last.isoformat(), "params": "a,,b"}).GET
+        date_from, date_to, strategies, params = views.parse_range_options(query)
+        self.assertEqual((date_to - date_from).days + 1, views.MAX_RANGE_DAYS)
+        self.assertEqual(strategies, prediction_store.STRATEGIES)
+        self.assertEqual(params, ["a", "b"])
+
+    def test_payload_columns(self):
+        toshn = Parameter.objects.create(key="toshn", name="Тошнота")
+        for day, value in [(date(2025, 5, 10), 2), (date(2025, 5, 12), 4)]:
+            EntryValue.objects.create(entry=Entry.objects.create(date=day), parameter=toshn, value=value)
+
+        with tempfile.TemporaryDirectory() as root, isolated_settings(root), \
+                mock.patch.object(views.PredictorManager, "load_models", return_value={}):
+            response = self.get(**{"from": "2025-05-09", "to": "2025-05-12", "strategy": "base", "params": "toshn,nope"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {
+            "start": "2025-05-09",
+            "days": 4,
+            "params": ["toshn", "nope"],
+            "actual": {"toshn": [None, 2.0, None, 4.0], "nope": [None] * 4},
+            "predicted": {"base": {"toshn": [None] * 4, "nope": [None] * 4}},
+        })
+
+
+# --------------------------------------------------------------------
+# 🗜️ Предсжатая статика: выбор кодировки, выход из STATIC_ROOT, кэш
+# --------------------------------------------------------------------
+
+class PrecompressedStaticTests(SimpleTestCase):
+    HASHED = "js/diary.3f2a9c1b.js"
+    BODY = b"console.log('diary');\n" * 50
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        (root / "static" / "js").mkdir(parents=True)
+        for name, body in [(self.HASHED, self.BODY), (self.HASHED + ".gz", b"gz"),
+                           (self.HASHED + ".br", b"br"), ("js/diary.js", self.BODY)]:
+            (root / "static" / name).write_bytes(body)
+        (root / "secret.txt").write_text("secret")
+
+        settings_override = override_settings(DEBUG=False, STATIC_ROOT=root / "static", STATIC_URL="static/")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with mock.patch("diary_analytic.static_assets._hashed_names", return_value=frozenset({self.HASHED})):
+            self.middleware = PrecompressedStaticMiddleware(lambda request: None)
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, headers=headers))
+
+    def test_accept_encoding_choice(self):
+        for accepted, encoding, body in [
+            ("gzip, deflate, br", "br", b"br"),
+            ("gzip", "gzip", b"gz"),
+            ("", None, self.BODY),
+        ]:
+            with self.subTest(accepted=accepted):
+                response = self.get("/static/" + self.HASHED, accept_encoding=accepted)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get("Content-Encoding"), encoding)
+                self.assertEqual(response["Content-Type"], "text/javascript")
+                self.assertEqual(response["Vary"], "Accept-Encoding")
+                self.assertEqual(b"".join(response.streaming_content), body)
+
+    def test_cache_control(self):
+        self.assertEqual(self.get("/static/" + self.HASHED)["Cache-Control"], IMMUTABLE_CACHE)
+        self.assertEqual(self.get("/static/js/diary.js")["Cache-Control"], MUTABLE_CACHE)
+
+    def test_only_files_inside_static_root(self):
+        for path in ("/static/../secret.txt", "/static/js/../../secret.txt", "/static/%2e%2e/secret.txt",
+                     "/static/" + self.HASHED + ".gz", "/static/js", "/static/missing.js", "/other/diary.js"):
+            with self.subTest(path=path):
+                self.assertIsNone(self.get(path))
+
+    def test_disabled_in_debug(self):
+        with override_settings(DEBUG=True), self.assertRaises(MiddlewareNotUsed):
+            PrecompressedStaticMiddleware(lambda request: None)
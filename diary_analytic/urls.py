@@ -1,7 +1,7 @@
 # diary_analytic/urls.py
 
 from django.urls import path
-from . import views
+from . import async_views, views
 
 # -----------------------------------------------------------
 # 🧭 Маршруты для приложения дневника состояния
@@ -35,6 +35,35 @@ urlpatterns = [
     # API: история значений параметра
     path("api/parameter_history/", views.parameter_history, name="parameter_history"),
 
+    # API: прогнозы и факт на диапазон дат (?from=...&to=...&strategy=...&params=a,b)
+    path("api/predictions_range/", views.predictions_range, name="predictions_range"),
+
+    # API: walk-forward бэктест стратегий (MAE/RMSE по параметрам)
+    path("api/backtest/", views.backtest_api, name="backtest"),
+
+    # API: корреляции параметров (?method=pearson|spearman&lag=0|1&target=...)
+    path("api/correlations/", views.correlations_api, name="correlations"),
+
+    # API: категории параметров и их дневные сводки (см. taxonomy.py)
+    path("api/categories/", views.categories_api, name="categories"),
+    path("api/category_history/", views.category_history, name="category_history"),
+    path("api/category_sums/", views.category_sums, name="category_sums"),
+
+    # API: полнотекстовый поиск по комментариям (?q=...&from=...&to=...)
+    path("api/search_comments/", views.search_comments, name="search_comments"),
+
+    # Async-варианты (ASGI, см. async_views.py): тот же формат ответов
+    path("async/get_predictions/", async_views.get_predictions, name="async_get_predictions"),
+    path("async/api/parameter_history/", async_views.parameter_history, name="async_parameter_history"),
+    path("async/api/predictions_block/", async_views.predictions_block, name="async_predictions_block"),
+    path("async/api/predictions_range/", async_views.predictions_range, name="async_predictions_range"),
+
+    # Метрики для Prometheus (без слэша в конце — путь по умолчанию у скрейпера)
+    path("metrics", views.metrics_view, name="metrics"),
+
+    # Скачивание экспорта: /export/?format=csv|xlsx (потоково)
+    path("export/", views.export_download, name="export"),
+
     # API: описание параметра (GET/POST)
     path("api/get_parameter_description/", views.get_parameter_description, name="get_parameter_description"),
     path("api/set_parameter_description/", views.set_parameter_description, name="set_parameter_description"),
@@ -4,6 +4,7 @@
 📊 utils.py — утилиты для работы с данными
 
 Основная функция:
+    - get_diary_matrix() — компактная матрица дневника (DiaryMatrix: int8 + битовая маска).
     - get_diary_dataframe() — превращает данные из моделей Entry, Parameter, EntryValue
       в широкую таблицу для обучения и прогнозирования моделей.
     - get_today_row(date) — извлекает строку параметров за конкретный день
@@ -12,14 +13,48 @@
 import pandas as pd
 from datetime import date
 from .models import EntryValue, Entry, Parameter
+from .diary_matrix import DiaryMatrix
+from .snapshot import load_snapshot, read_consistent
+from .versioning import VersionedCache
+from .profiling import profiled
 import os
+from django.conf import settings
 from .loggers import db_logger
 
 
+# --------------------------------------------------------------------
+# 🧮 Компактная матрица дневника
+# --------------------------------------------------------------------
+
+@profiled("get_diary_matrix")
+def get_diary_matrix() -> DiaryMatrix:
+    """
+    Возвращает дневник в компактном виде (см. diary_matrix.DiaryMatrix).
+
+    Сначала открывается memmap-снимок (snapshot.py), общий для всех процессов.
+    Если снимка нет или он отстал от DataVersion — матрица строится из БД
+    одним запросом values_list() только в памяти: снимок пишет обновление
+    после записи (signals.py), а не каждый воркер, промахнувшийся после коммита.
+    Открытая матрица кэшируется в процессе до смены версии данных.
+    """
+    return _matrix_cache.get("matrix", _open_matrix)
+
+
+_matrix_cache = VersionedCache("diary_matrix")
+
+
+def _open_matrix(version: int) -> DiaryMatrix:
+    matrix = load_snapshot(expected_version=version)
+    if matrix is None:
+        _, matrix = read_consistent()
+    return matrix
+
+
 # --------------------------------------------------------------------
 # 📈 Получение данных в формате DataFrame для ML
 # --------------------------------------------------------------------
 
+@profiled("get_diary_dataframe")
 def get_diary_dataframe() -> pd.DataFrame:
     """
     Собирает все записи пользователя в виде «широкой» таблицы:
@@ -43,36 +78,8 @@ def get_diary_dataframe() -> pd.DataFrame:
     :return: pd.DataFrame, индексированный по дате
     """
 
-    # Извлекаем все значения параметров, связанных с Entry и Parameter
-    values = EntryValue.objects.select_related("entry", "parameter")
-
-    # Создаём список словарей (удобно для передачи в DataFrame)
-    rows = []
-    for val in values:
-        rows.append({
-            "date": val.entry.date,             # Дата (строка = день)
-            "parameter": val.parameter.key,     # Название параметра (ключ)
-            "value": val.value                  # Значение от 0.0 до 5.0
-        })
-
-    # Преобразуем в "узкий" DataFrame
-    df = pd.DataFrame(rows)
-
-    if df.empty:
-        return pd.DataFrame()  # если данных нет — вернуть пустую таблицу
-
-    # Преобразуем из узкого формата в "широкий":
-    # было: date | parameter | value
-    # станет: date | toshn | ustalost | ...
-    df = df.pivot(index="date", columns="parameter", values="value")
-
-    # Убедимся, что даты отсортированы (на всякий случай)
-    df.sort_index(inplace=True)
-
-    # Можно заполнить пропуски, если нужно (по ТЗ: только при обучении)
-    # df.fillna(0.0, inplace=True)
-
-    return df
+    # Компактная матрица → float64-DataFrame только здесь, на границе с моделью
+    return get_diary_matrix().to_frame()
 
 
 # --------------------------------------------------------------------
@@ -92,11 +99,7 @@ def get_today_row(target_date: date) -> dict:
     :return: dict — { "ustalost": 2.0, "toshn": 0.0, ... }
     """
 
-    df = get_diary_dataframe()
-    if df.empty or target_date not in df.index:
-        return {}
-
-    return df.loc[target_date].dropna().to_dict()
+    return get_diary_matrix().row(target_date)
 
 
 def export_diary_to_csv(filepath=None):
@@ -105,60 +108,26 @@ def export_diary_to_csv(filepath=None):
     Также создает отдельный лист/файл с описаниями параметров.
     ВНИМАНИЕ: если вы переименовали ключ параметра, старые экспортированные файлы будут содержать старый ключ.
     При необходимости обновляйте их вручную.
-    :param filepath: путь к файлу (по умолчанию other/export.csv)
+    Строки пишутся потоково из одного запроса (см. export.py), без DataFrame в памяти.
+    :param filepath: путь к файлу (по умолчанию settings.DIARY_EXPORT_PATH → other/export.csv)
     """
+    from . import export
+
     if filepath is None:
-        filepath = os.path.join("other", "export.csv")
+        filepath = str(getattr(settings, "DIARY_EXPORT_PATH", os.path.join("other", "export.csv")))
 
     try:
-        # Получаем все параметры (по name, как в примере)
-        parameters = list(Parameter.objects.order_by("name"))
-        param_keys = [p.key for p in parameters]
-        param_names = [p.name for p in parameters]
-
-        # Получаем все Entry (даты)
-        entries = list(Entry.objects.order_by("-date"))
-
-        # Формируем строки для DataFrame
-        data = []
-        for entry in entries:
-            row = {"Дата": entry.date.strftime("%d.%m.%y")}
-            values = {ev.parameter_id: ev.value for ev in entry.entryvalue_set.all()}
-            for p in parameters:
-                val = values.get(p.id, None)
-                if val is None:
-                    row[p.name] = ""
-                else:
-                    row[p.name] = int(val)
-            data.append(row)
-
-        import pandas as pd
-        df = pd.DataFrame(data)
-        # Ставим "Дата" первым столбцом, остальные — как в param_names
-        columns = ["Дата"] + param_names
-        df = df[columns]
+        parameters = export.export_parameters()
 
         # Экспорт основной таблицы
         if filepath.endswith('.xlsx'):
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, encoding="utf-8-sig", sheet_name="Данные")
-                # Описания параметров на отдельном листе
-                desc_df = pd.DataFrame({
-                    "Ключ": [p.key for p in parameters],
-                    "Название": [p.name for p in parameters],
-                    "Описание": [p.description or "" for p in parameters],
-                })
-                desc_df.to_excel(writer, index=False, encoding="utf-8-sig", sheet_name="Описания параметров")
+            # Описания параметров — на отдельном листе той же книги
+            export.write_xlsx(filepath, parameters)
         else:
             # CSV: сохраняем основной файл и отдельный файл с описаниями
-            df.to_csv(filepath, index=False, encoding="utf-8-sig")
+            export.write_csv(filepath, export.export_header(parameters), export.iter_export_rows(parameters))
             desc_path = filepath.replace('.csv', '_descriptions.csv')
-            desc_df = pd.DataFrame({
-                "Ключ": [p.key for p in parameters],
-                "Название": [p.name for p in parameters],
-                "Описание": [p.description or "" for p in parameters],
-            })
-            desc_df.to_csv(desc_path, index=False, encoding="utf-8-sig")
-        db_logger.info(f"✅ Экспорт данных в CSV завершён: {filepath}, строк: {len(df)}")
+            export.write_csv(desc_path, export.DESCRIPTIONS_HEADER, export.iter_descriptions(parameters))
+        db_logger.info(f"✅ Экспорт данных в CSV завершён: {filepath}")
     except Exception as e:
         db_logger.exception(f"❌ Ошибка при экспорте данных в CSV: {e}")
@@ -0,0 +1,190 @@
+# diary_analytic/versioning.py
+
+"""
+🔢 versioning.py — согласованность кэшей между процессами
+
+Под gunicorn работает несколько воркеров, и запись через `update_value` в одном
+из них не видна кэшам в остальных. Поэтому в SQLite хранится общий счётчик
+DataVersion (одна строка), который увеличивается в той же транзакции, что и
+запись EntryValue/Parameter, и после сохранения обученных моделей.
+
+    - bump_data_version()    — увеличить счётчик (внутри транзакции записи);
+    - get_data_version()     — прочитать счётчик (один запрос по PK);
+    - current_data_version() — версия, зафиксированная для текущего запроса;
+    - VersionedCache         — локальный кэш процесса, привязанный к версии;
+    - DataVersionMiddleware  — дешёвая проверка версии раз в запрос.
+"""
+
+import contextvars
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import transaction
+from django.db.models import F
+
+from . import metrics
+from .models import DataVersion
+
+# Версия, прочитанная middleware в начале запроса (чтобы весь запрос видел одну версию)
+_request_version: contextvars.ContextVar[int | None] = contextvars.ContextVar("diary_data_version", default=None)
+
+# Все локальные кэши процесса (для массовой инвалидации)
+_registry: list["VersionedCache"] = []
+
+
+# --------------------------------------------------------------------
+# 🔢 Счётчик версии
+# --------------------------------------------------------------------
+
+def get_data_version() -> int:
+    """Текущее значение счётчика из БД (0, если строки ещё нет)."""
+    version = DataVersion.objects.filter(pk=1).values_list("version", flat=True).first()
+    return version or 0
+
+
+def bump_data_version() -> int:
+    """
+    Увеличивает счётчик на 1 и возвращает новое значение.
+    Если вызвать внутри transaction.atomic(), увеличение фиксируется
+    вместе с остальными изменениями транзакции (или откатывается с ними).
+    """
+    with transaction.atomic():
+        updated = DataVersion.objects.filter(pk=1).update(version=F("version") + 1)
+        if not updated:
+            DataVersion.objects.create(pk=1, version=1)
+        version = get_data_version()
+    # После коммита текущий запрос тоже должен видеть новую версию
+    transaction.on_commit(lambda: _request_version.set(None))
+    return version
+
+
+def current_data_version() -> int:
+    """
+    Версия данных для текущего запроса. Внутри запроса — значение, прочитанное
+    DataVersionMiddleware; вне запроса (команды, фоновые задачи) — свежее из БД.
+    """
+    version = _request_version.get()
+    if version is None:
+        version = get_data_version()
+    return version
+
+
+# --------------------------------------------------------------------
+# 🗃️ Локальный кэш процесса, привязанный к версии данных
+# --------------------------------------------------------------------
+
+class VersionedCache:
+    """
+    Кэш «ключ → значение» внутри одного процесса. Запись помнит версию данных,
+    при которой была вычислена, и считается промахом, если версия сдвинулась.
+    С max_items хранится не больше max_items записей: при переполнении
+    вытесняется та, к которой дольше всего не обращались (для ключей из
+    GET-параметров, которые клиент может перебирать бесконечно).
+
+    Пример:
+        _cache = VersionedCache("diary_matrix")
+        matrix = _cache.get("matrix", lambda version: build_matrix())
+    """
+
+    def __init__(self, name: str, max_items: int | None = None):
+        self.name = name
+        self.max_items = max_items
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def get(self, key, compute, version: int | None = None):
+        """
+        Возвращает значение из кэша или вычисляет его через compute(version).
+        """
+        if version is None:
+            version = current_data_version()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self.max_items:
+                self._items.move_to_end(key)
+        if item is not None and item[0] == version:
+            metrics.cache_hit(self.name)
+            return item[1]
+        metrics.cache_miss(self.name)
+        value = compute(version)
+        self.put(key, value, version)
+        return value
+
+    def put(self, key, value, version: int):
+        with self._lock:
+            self._items[key] = (version, value)
+            if self.max_items:
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_items:
+                    self._items.popitem(last=False)
+
+    def drop_stale(self, version: int):
+        with self._lock:
+            self._items = OrderedDict((k, item) for k, item in self._items.items() if item[0] == version)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+_last_synced = None
+
+
+def sync_local_caches(version: int):
+    """
+    Освобождает записи всех локальных кэшей, если версия данных сдвинулась.
+    """
+    global _last_synced
+    if version == _last_synced:
+        return
+    for cache in _registry:
+        cache.drop_stale(version)
+    _last_synced = version
+
+
+# --------------------------------------------------------------------
+# 🧭 Middleware: проверка версии раз в запрос
+# --------------------------------------------------------------------
+
+class DataVersionMiddleware:
+    """
+    Читает счётчик DataVersion (один запрос по PK) в начале каждого запроса,
+    фиксирует его для всего запроса и сбрасывает устаревшие локальные кэши.
+    Работает и под ASGI без перехода в синхронный режим (async-вьюхи).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        version = get_data_version()
+        sync_local_caches(version)
+        token = _request_version.set(version)
+        request.data_version = version
+        try:
+            return self.get_response(request)
+        finally:
+            _request_version.reset(token)
+
+    async def __acall__(self, request):
+        # Чтение счётчика — в пуле потоков, чтобы не блокировать цикл событий
+        version = await sync_to_async(get_data_version, thread_sensitive=False)()
+        sync_local_caches(version)
+        token = _request_version.set(version)
+        request.data_version = version
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_version.reset(token)
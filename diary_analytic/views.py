@@ -2,19 +2,27 @@
 
 from datetime import datetime
 from django.shortcuts import render
-from django.http import HttpRequest, HttpResponse, JsonResponse 
+from django.http import FileResponse, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET, require_http_methods
 from .models import Entry, Parameter, EntryValue
 from .forms import EntryForm
-from .utils import get_diary_dataframe, get_today_row
+from .utils import get_diary_matrix, get_today_row
 from .predictor_manager import PredictorManager
-from .loggers import web_logger, db_logger, predict_logger
+from . import archive, backtest, correlations, downsample, export, metrics, prediction_store, profiling, search, taxonomy, write_queue
+from .versioning import VersionedCache
+from .json_response import FastJsonResponse, SCHEMAS, series_payload
+from .loggers import web_logger, db_logger
 import json
 import os
+import tempfile
 import traceback
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from django.conf import settings
 from diary_analytic.ml_utils import get_model
+from diary_analytic.ml_utils.features import FeatureMatrix
+import numpy as np
 import pandas as pd
 import re
 from slugify import slugify
@@ -85,6 +93,12 @@ def add_entry(request: HttpRequest) -> HttpResponse:
         v.parameter.key: v.value
         for v in entry_values
     }
+    # День из архивного года: значений в EntryValue нет, они в архиве (archive.py)
+    if archive.archived_period(selected_date):
+        keys = dict(parameters.values_list("id", "key"))
+        for _, parameter_id, value in archive.values_between(selected_date, selected_date):
+            if parameter_id in keys:
+                values_map.setdefault(keys[parameter_id], value)
     web_logger.debug(f"[add_entry] 📊 Загружено параметров для Entry: {len(values_map)}")
     for key, value in values_map.items():
         web_logger.debug(f"[add_entry] 📌 Параметр {key}: значение {value} (тип: {type(value)})")
@@ -131,6 +145,10 @@ def add_entry(request: HttpRequest) -> HttpResponse:
 # 🔘 AJAX: обновление значения параметра (клик по кнопке)
 # --------------------------------------------------------------------
 
+# Сколько запрос ждёт подтверждения записи от очереди (сек)
+WRITE_TIMEOUT = 10
+
+
 @csrf_exempt  # отключаем CSRF (используем ручную защиту через заголовок в JS)
 @require_POST  # разрешаем только POST-запросы
 def update_value(request):
@@ -179,43 +197,68 @@ def update_value(request):
             db_logger.warning(f"⚠️ Некорректный формат даты: {date_str}")
             return JsonResponse({"error": "invalid date"}, status=400)
 
-        # --------------------------
-        # 📅 3. Получаем или создаём Entry на эту дату
-        # --------------------------
-        entry, _ = Entry.objects.get_or_create(date=entry_date)
-
-        # --------------------------
-        # 📌 4. Находим параметр по ключу
-        # --------------------------
+        # Архивные годы только для чтения (см. archive.py)
         try:
-            parameter = Parameter.objects.get(key=param_key)
-        except Parameter.DoesNotExist:
-            db_logger.error(f"❌ Параметр не найден: '{param_key}'")
-            return JsonResponse({"error": "invalid parameter"}, status=400)
-
-        # --------------------------
-        # 💾 5. Обновляем или создаём EntryValue
-        # --------------------------
-        if value is None:
-            db_logger.info(f"[update_value] 🟡 value=None: запрос на удаление значения. param_key={param_key}, date={date_str}")
-            # Удаление значения
+            archive.check_writable(entry_date)
+        except archive.ArchivedPeriodError as e:
+            db_logger.warning(f"[update_value] 🧊 {e}")
+            return JsonResponse({"error": "archived period", "period": e.period}, status=409)
+
+        # При включённой очереди записи (write_queue.py) пишет единственный
+        # поток-писатель группами; запрос только ждёт подтверждения коммита
+        if write_queue.is_enabled():
+            future = write_queue.get_write_coordinator().submit(entry_date, param_key, value)
             try:
-                deleted_count, deleted_details = EntryValue.objects.filter(entry=entry, parameter=parameter).delete()
-                db_logger.info(f"[update_value] 🗑️ Удалён EntryValue: {param_key} ({entry_date}), удалено записей: {deleted_count}")
-                return JsonResponse({"success": True, "deleted": True, "deleted_count": deleted_count})
-            except Exception as del_exc:
-                db_logger.exception(f"[update_value] ❌ Ошибка при удалении EntryValue: {param_key} ({entry_date}): {del_exc}")
-                return JsonResponse({"error": "delete error"}, status=500)
-        else:
-            db_logger.info(f"[update_value] 🟢 value={value}: обновление/создание значения. param_key={param_key}, date={date_str}")
-            ev, created = EntryValue.objects.update_or_create(
-                entry=entry,
-                parameter=parameter,
-                defaults={"value": float(value)}
-            )
-            action = "Создан" if created else "Обновлён"
-            db_logger.info(f"[update_value] ✅ {action} EntryValue: {param_key} = {value} ({entry_date})")
-            return JsonResponse({"success": True})
+                result = future.result(timeout=WRITE_TIMEOUT)
+            except write_queue.InvalidParameter:
+                db_logger.error(f"❌ Параметр не найден: '{param_key}'")
+                return JsonResponse({"error": "invalid parameter"}, status=400)
+            except FutureTimeoutError:
+                db_logger.error(f"[update_value] ⏳ Запись не подтверждена за {WRITE_TIMEOUT} с: {param_key} ({entry_date})")
+                return JsonResponse({"error": "write timeout"}, status=503)
+            db_logger.info(f"[update_value] ✅ Записано через очередь: {param_key} = {value} ({entry_date}) → {result}")
+            # Ответ в прежнем формате (без служебного "created")
+            return JsonResponse({k: v for k, v in result.items() if k != "created"})
+
+        # Запись значения и увеличение DataVersion (в сигналах) — одна транзакция
+        with transaction.atomic():
+            # --------------------------
+            # 📅 3. Получаем или создаём Entry на эту дату
+            # --------------------------
+            entry, _ = Entry.objects.get_or_create(date=entry_date)
+
+            # --------------------------
+            # 📌 4. Находим параметр по ключу
+            # --------------------------
+            try:
+                parameter = Parameter.objects.get(key=param_key)
+            except Parameter.DoesNotExist:
+                db_logger.error(f"❌ Параметр не найден: '{param_key}'")
+                return JsonResponse({"error": "invalid parameter"}, status=400)
+
+            # --------------------------
+            # 💾 5. Обновляем или создаём EntryValue
+            # --------------------------
+            if value is None:
+                db_logger.info(f"[update_value] 🟡 value=None: запрос на удаление значения. param_key={param_key}, date={date_str}")
+                # Удаление значения
+                try:
+                    deleted_count, deleted_details = EntryValue.objects.filter(entry=entry, parameter=parameter).delete()
+                    db_logger.info(f"[update_value] 🗑️ Удалён EntryValue: {param_key} ({entry_date}), удалено записей: {deleted_count}")
+                    return JsonResponse({"success": True, "deleted": True, "deleted_count": deleted_count})
+                except Exception as del_exc:
+                    db_logger.exception(f"[update_value] ❌ Ошибка при удалении EntryValue: {param_key} ({entry_date}): {del_exc}")
+                    return JsonResponse({"error": "delete error"}, status=500)
+            else:
+                db_logger.info(f"[update_value] 🟢 value={value}: обновление/создание значения. param_key={param_key}, date={date_str}")
+                ev, created = EntryValue.objects.update_or_create(
+                    entry=entry,
+                    parameter=parameter,
+                    defaults={"value": float(value)}
+                )
+                action = "Создан" if created else "Обновлён"
+                db_logger.info(f"[update_value] ✅ {action} EntryValue: {param_key} = {value} ({entry_date})")
+                return JsonResponse({"success": True})
 
     except Exception as e:
         # 🔥 В случае любой ошибки — лог + JSON-ответ 500
@@ -225,10 +268,6 @@ def update_value(request):
 # 📡 Обрабатывает GET-запрос на получение прогнозов по всем стратегиям
 @require_GET
 def get_predictions(request: HttpRequest) -> JsonResponse:
-    from .utils import get_today_row
-    import joblib
-    import traceback
-
     web_logger.debug("[get_predictions] 🔧 Получен запрос на прогнозы: %s", request.GET)
 
     date_str = request.GET.get("date")
@@ -250,97 +289,47 @@ def get_predictions(request: HttpRequest) -> JsonResponse:
         web_logger.warning("[get_predictions] 🚫 Данные на дату %s отсутствуют или пусты", selected_date)
         return JsonResponse({"error": "no data"}, status=404)
 
-    base_dir = os.path.join(settings.BASE_DIR, "diary_analytic", "trained_models")
     strategies = ["base"]  # Здесь можно добавить другие стратегии при необходимости
-    predictions = {}
-
     web_logger.debug("[get_predictions] 🔍 Стратегии для прогноза: %s", strategies)
 
-    for strategy in strategies:
-        model_dir = os.path.join(base_dir, strategy)
-        web_logger.debug("[get_predictions] 📂 Проверка папки моделей: %s", model_dir)
-
-        if not os.path.exists(model_dir):
-            web_logger.warning("[get_predictions] ⚠️ Папка не найдена: %s", model_dir)
-            continue
-
-        for fname in os.listdir(model_dir):
-            if not fname.endswith(".pkl"):
-                continue
-
-            param_key = fname.replace(".pkl", "")
-            full_key = f"{param_key}_{strategy}"
-            model_path = os.path.join(model_dir, fname)
-
-            try:
-                model_dict = joblib.load(model_path)
-                if isinstance(model_dict, dict) and "model" in model_dict:
-                    model = model_dict["model"]
-                    features = model_dict.get("features", None)
-                else:
-                    model = model_dict
-                    features = None
-                web_logger.debug(f"[get_predictions] 📦 Загружена модель: {model_path}")
-                # Логируем shape входа и имена признаков
-                if hasattr(model, 'n_features_in_'):
-                    web_logger.debug(f"[get_predictions] Модель {full_key} ожидает признаков: {model.n_features_in_}")
-                if hasattr(model, 'feature_names_in_'):
-                    web_logger.debug(f"[get_predictions] Модель {full_key} ожидает признаки: {model.feature_names_in_}")
-                # Преобразуем row в список признаков в том же порядке, что и при обучении
-                if features is not None:
-                    X = pd.DataFrame([{f: row.get(f, 0.0) for f in features}])
-                    web_logger.debug(f"[get_predictions] Вход для модели {full_key}: {X}")
-                    value = float(model.predict(X)[0])
-                elif hasattr(model, 'feature_names_in_'):
-                    X = pd.DataFrame([{f: row.get(f, 0.0) for f in model.feature_names_in_}])
-                    web_logger.debug(f"[get_predictions] Вход для модели {full_key}: {X}")
-                    value = float(model.predict(X)[0])
-                else:
-                    # Fallback: просто все значения row
-                    X = pd.DataFrame([row])
-                    web_logger.debug(f"[get_predictions] Вход для модели {full_key} (fallback): {X}")
-                    value = float(model.predict(X)[0])
-                predictions[full_key] = round(value, 2)
-                web_logger.debug("[get_predictions] ✅ Прогноз: %s = %.2f", full_key, value)
-            except Exception as e:
-                tb = traceback.format_exc()
-                web_logger.error(f"[get_predictions] ⚠️ Ошибка при прогнозе {full_key}: {e}\n{tb}")
-                predictions[full_key] = None
+    # Прогнозы берутся из таблицы Prediction (или считаются, если их там нет)
+    predictions = flatten_predictions(get_predictions_by_models(selected_date, strategies))
 
     web_logger.debug("[get_predictions] 📤 Отправка JSON с %d прогнозами", len(predictions))
-    return JsonResponse(predictions)
+    return FastJsonResponse(predictions)
 
 # 📦 Обучает модели по всем стратегиям и сохраняет их в отдельные папки
 @csrf_exempt
 @require_POST
 def retrain_models_all(request: HttpRequest) -> JsonResponse:
-    from .utils import get_diary_dataframe
     web_logger.info("=== retrain_models_all вызвана ===")
     web_logger.info("[retrain] 🔁 Запущено переобучение моделей по всем стратегиям...")
 
-    df = get_diary_dataframe()
+    # Матрица признаков строится один раз и общая для всех стратегий;
+    # обучаемся только на прошедших днях (срез-представление, без копии)
     today = datetime.now().date()
-    # Исправленная фильтрация по дате
-    if "date" in df.columns:
-        df = df[df["date"] < today]
-    else:
-        df = df.reset_index()
-        if "date" in df.columns:
-            df = df[df["date"] < today]
-        # если и после этого нет — не фильтруем
+    fm = FeatureMatrix.from_matrix(get_diary_matrix()).before(today)
 
-    web_logger.info(f"Перед обучением: df.columns = {list(df.columns)}")
+    web_logger.info(f"Перед обучением: матрица признаков {fm.shape}, columns = {fm.columns}")
 
-    strategies = ["base", "flags"]  # теперь обе модели!
+    strategies = prediction_store.STRATEGIES  # base, flags и lagged
     results = []
 
-    from .predictor_manager import PredictorManager
     for strategy_name in strategies:
         web_logger.debug(f"[retrain] ▶️ Стратегия: {strategy_name}")
         manager = PredictorManager(strategy_name)
-        res = manager.train(df.copy())
+        res = manager.train(fm)
         results.extend(res)
 
+    # Предрасчёт прогнозов на все даты — страница больше не запускает модели
+    if prediction_store.is_enabled():
+        try:
+            written = prediction_store.precompute_predictions(strategies)
+            results.append(f"🔮 Предрасчитано прогнозов: {written}")
+        except Exception as e:
+            web_logger.exception(f"[retrain] ❌ Ошибка предрасчёта прогнозов: {e}")
+            results.append(f"❌ Ошибка предрасчёта прогнозов: {e}")
+
     # Новый блок: если есть ошибки, возвращаем status: error
     if any("❌" in msg for msg in results):
         return JsonResponse({"status": "error", "details": results})
@@ -356,41 +345,427 @@ def parameter_history(request):
     GET-параметры:
         param: ключ параметра (например, 'ustalost')
         date:  конечная дата (например, '2025-05-13')
+        from:  необязательно, начальная дата (включительно)
+        max_points: необязательно, не больше стольких точек (прореживание LTTB)
+        schema: необязательно, 'rows' (по умолчанию) или 'columnar'
     Ответ: { dates: [...], values: [...] }
+           или { start: ..., offsets: [...], values: [...] } (см. json_response.py)
     """
     param_key = request.GET.get('param')
     date_str = request.GET.get('date')
+    schema = request.GET.get('schema', 'rows')
     if not param_key or not date_str:
         return JsonResponse({'error': 'missing param or date'}, status=400)
+    if schema not in SCHEMAS:
+        return JsonResponse({'error': 'invalid schema'}, status=400)
+    try:
+        to_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'invalid date'}, status=400)
+    try:
+        date_from, max_points = parse_history_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return FastJsonResponse(history_payload(param_key, to_date, schema, date_from, max_points))
+
+
+def parse_history_options(params) -> tuple:
+    """
+    Необязательные from и max_points истории параметра (общие для WSGI- и async-варианта).
+    :raises ValueError: с текстом ошибки для ответа 400
+    """
+    date_from = max_points = None
+    if params.get('from'):
+        try:
+            date_from = datetime.strptime(params['from'], '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('invalid from')
+    if params.get('max_points'):
+        try:
+            max_points = int(params['max_points'])
+        except ValueError:
+            raise ValueError('invalid max_points')
+        if max_points < downsample.MIN_POINTS:
+            raise ValueError(f'max_points must be at least {downsample.MIN_POINTS}')
+    return date_from, max_points
+
+
+# Прореженные ряды: (param, from, to, max_points) → (rows, values), сброс при смене версии данных.
+# Ключ собран из GET-параметров, поэтому число записей ограничено (LRU)
+LTTB_CACHE_ITEMS = 256
+_history_lttb_cache = VersionedCache("history_lttb", max_items=LTTB_CACHE_ITEMS)
+
+
+def history_payload(param_key: str, to_date, schema: str = 'rows', date_from=None, max_points: int = None) -> dict:
+    """
+    Тело ответа parameter_history (общее для WSGI- и async-варианта).
+    Столбец параметра берём прямо из компактной матрицы (без pivot в pandas),
+    даты — из готовых ISO-строк, массивы сериализуются без .tolist().
+    С max_points длинный ряд прореживается LTTB (см. downsample.py).
+    """
+    matrix = get_diary_matrix()
+    rows, values = matrix.column_rows(param_key, until=to_date, since=date_from)
+    if max_points and len(rows) > max_points:
+        def compute(version):
+            # x — номер дня, чтобы пропуски в датах учитывались в площадях треугольников
+            days = matrix.dates[rows].astype(np.int64)
+            keep = downsample.lttb(days, values, max_points)
+            return rows[keep], values[keep]
+
+        rows, values = _history_lttb_cache.get((param_key, date_from, to_date, max_points), compute)
+    return series_payload(matrix, rows, values, schema)
+
+# --------------------------------------------------------------------
+# 📈 API: прогнозы и факт на диапазон дат (графики «прогноз vs факт»)
+# --------------------------------------------------------------------
+# Самый длинный диапазон за один запрос (дней)
+MAX_RANGE_DAYS = 3660
+
+
+@require_GET
+def predictions_range(request):
+    """
+    Прогнозы стратегий и фактические значения на каждый день диапазона.
+    GET-параметры:
+        from, to: границы диапазона 'YYYY-MM-DD' (включительно)
+        strategy: стратегия (можно несколько раз; по умолчанию все)
+        params:   ключи параметров через запятую (по умолчанию все)
+    Ответ (колонками, дата i-го значения = start + i дней):
+        {start, days, params: [...], actual: {key: [...]}, predicted: {strategy: {key: [...]}}}
+    """
+    try:
+        date_from, date_to, strategies, params = parse_range_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return FastJsonResponse(predictions_range_payload(date_from, date_to, strategies, params))
+
+
+def parse_range_options(query) -> tuple:
+    """
+    GET-параметры predictions_range (общие для WSGI- и async-варианта):
+    (date_from, date_to, strategies, params или None).
+    :raises ValueError: с текстом ошибки для ответа 400
+    """
+    try:
+        date_from = datetime.strptime(query.get('from', ''), '%Y-%m-%d').date()
+        date_to = datetime.strptime(query.get('to', ''), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('missing or invalid from/to')
+    if date_to < date_from:
+        raise ValueError('to is before from')
+    if (date_to - date_from).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f'range is longer than {MAX_RANGE_DAYS} days')
+    strategies = query.getlist('strategy') or prediction_store.STRATEGIES
+    unknown = [s for s in strategies if s not in prediction_store.STRATEGIES]
+    if unknown:
+        raise ValueError(f'unknown strategy: {unknown[0]}')
+    params = [p for p in query.get('params', '').split(',') if p] or None
+    return date_from, date_to, strategies, params
+
+
+def predictions_range_payload(date_from, date_to, strategies, params=None) -> dict:
+    """
+    Тело ответа predictions_range. Строки признаков строятся сразу на все даты,
+    и каждая стратегия считается одним проходом predict_matrix (X @ W + b).
+    """
+    matrix = get_diary_matrix()
+    days = np.arange(np.datetime64(date_from, 'D'), np.datetime64(date_to, 'D') + 1)
+    dates = days.astype(object).tolist()
+    keys = params or matrix.keys
+    missing = np.full(len(days), np.nan)
+
+    # Факт: строки матрицы под диапазон, по одной непрерывной строке на параметр
+    actual_block = np.ascontiguousarray(matrix.float_rows(days).T)
+    actual = {}
+    for key in keys:
+        pos = matrix.key_position(key)
+        actual[key] = actual_block[pos] if pos is not None else missing
+
+    predicted = {}
+    for strategy in strategies:
+        manager = PredictorManager(strategy)
+        models = manager.load_models()
+        if params:
+            models = {key: models[key] for key in params if key in models}
+        targets, values = manager.predict_matrix(matrix, dates, models=models)
+        by_target = dict(zip(targets, np.ascontiguousarray(np.round(values, 2).T)))
+        predicted[strategy] = {key: by_target.get(key, missing) for key in keys}
+
+    return {
+        'start': str(days[0]),
+        'days': len(days),
+        'params': keys,
+        'actual': actual,
+        'predicted': predicted,
+    }
+
+# --------------------------------------------------------------------
+# 📉 API: walk-forward бэктест стратегий
+# --------------------------------------------------------------------
+_backtest_cache = VersionedCache("backtest")
+
+
+@require_GET
+def backtest_api(request):
+    """
+    Качество прогнозов по истории (расширяющееся окно).
+    GET-параметры:
+        strategy:  стратегия (можно несколько раз; по умолчанию все)
+        min_train: минимум обучающих дней до отсечки (по умолчанию 3)
+    Ответ: {strategy: {"targets": {key: {n, mae, rmse, baseline_mae}}, "summary": {...}}}
+    """
+    strategies = request.GET.getlist('strategy') or backtest.STRATEGIES
+    unknown = [s for s in strategies if s not in backtest.STRATEGIES]
+    if unknown:
+        return JsonResponse({'error': f'unknown strategy: {unknown[0]}'}, status=400)
+    try:
+        min_train = int(request.GET.get('min_train', 3))
+    except ValueError:
+        return JsonResponse({'error': 'invalid min_train'}, status=400)
+    if min_train < 1:
+        return JsonResponse({'error': 'min_train must be >= 1'}, status=400)
+
+    # Результат зависит только от данных → кэшируем до смены версии данных
+    key = (tuple(strategies), min_train)
+    results = _backtest_cache.get(key, lambda version: backtest.run_backtest(get_diary_matrix(), strategies, min_train))
+    return JsonResponse(results)
+
+# --------------------------------------------------------------------
+# 🔗 API: корреляции и совместная встречаемость параметров
+# --------------------------------------------------------------------
+@require_GET
+def correlations_api(request):
+    """
+    Попарные корреляции параметров по всему дневнику (см. correlations.py).
+    GET-параметры:
+        method:      'pearson' (по умолчанию) или 'spearman'
+        lag:         0 (по умолчанию) — тот же день; 1 — параметр за вчера против сегодня
+        min_periods: минимум общих дней для корреляции (по умолчанию 5)
+        target:      необязательно, ключ параметра — тогда только самые связанные с ним
+        limit:       число записей для target (по умолчанию 20)
+    Ответ: {method, lag, min_periods, keys, r: [[...]], n: [[...]], nz: [[...]]}
+           или {method, lag, min_periods, target, correlates: [{key, r, n, nz}, ...]}
+    """
+    method = request.GET.get('method', 'pearson')
+    if method not in correlations.METHODS:
+        return JsonResponse({'error': 'invalid method'}, status=400)
+    try:
+        lag = int(request.GET.get('lag', 0))
+        min_periods = int(request.GET.get('min_periods', correlations.MIN_PERIODS))
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        return JsonResponse({'error': 'invalid lag, min_periods or limit'}, status=400)
+    if not 0 <= lag <= correlations.MAX_LAG:
+        return JsonResponse({'error': f'lag must be in 0..{correlations.MAX_LAG}'}, status=400)
+    if limit < 0:
+        return JsonResponse({'error': 'limit must be >= 0'}, status=400)
+
+    result = correlations.get_correlations(method, lag)
+    target = request.GET.get('target')
+    if not target:
+        return FastJsonResponse(result.payload(min_periods))
+    if result.key_position(target) is None:
+        return JsonResponse({'error': 'unknown target'}, status=404)
+    return FastJsonResponse({
+        'method': method,
+        'lag': lag,
+        'min_periods': min_periods,
+        'target': target,
+        'correlates': result.top(target, min_periods, limit),
+    })
+
+# --------------------------------------------------------------------
+# 🗂️ API: категории параметров и сводки по ним
+# --------------------------------------------------------------------
+@require_GET
+def categories_api(request):
+    """
+    Категории из названий параметров (см. taxonomy.py): участники каждой
+    категории и разобранные имя/теги каждого параметра.
+    Ответ: {categories: [{category, parent, members}, ...], parameters: {key: {category, name, tags}}}
+    """
+    return FastJsonResponse(taxonomy.get_taxonomy().payload())
+
+
+# Прореженные ряды категорий: (category, agg, from, to, max_points) → (rows, values)
+_category_lttb_cache = VersionedCache("category_lttb", max_items=LTTB_CACHE_ITEMS)
+
+
+@require_GET
+def category_history(request):
+    """
+    Дневной ряд категории — один запрос вместо истории каждого участника.
+    GET-параметры:
+        category: код категории (например, 'ЖВТ-ОБЩ')
+        date:     конечная дата (включительно)
+        agg:      'sum' (по умолчанию), 'max', 'count' или 'mean'
+        from, max_points, schema — как у parameter_history
+    Ответ: { dates: [...], values: [...] } или columnar-формат (см. json_response.py)
+    """
+    category = request.GET.get('category')
+    date_str = request.GET.get('date')
+    agg = request.GET.get('agg', 'sum')
+    schema = request.GET.get('schema', 'rows')
+    if not category or not date_str:
+        return JsonResponse({'error': 'missing category or date'}, status=400)
+    if agg not in taxonomy.AGGREGATES:
+        return JsonResponse({'error': 'invalid agg'}, status=400)
+    if schema not in SCHEMAS:
+        return JsonResponse({'error': 'invalid schema'}, status=400)
     try:
         to_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     except ValueError:
         return JsonResponse({'error': 'invalid date'}, status=400)
+    try:
+        date_from, max_points = parse_history_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    df = get_diary_dataframe()
-    if df.empty or param_key not in df.columns:
-        return JsonResponse({'dates': [], 'values': []})
+    rollups = taxonomy.get_category_rollups()
+    if rollups.category_position(category) is None:
+        return JsonResponse({'error': 'unknown category'}, status=404)
+    rows, values = rollups.series(category, agg, until=to_date, since=date_from)
+    if max_points and len(rows) > max_points:
+        def compute(version):
+            keep = downsample.lttb(rollups.dates[rows].astype(np.int64), values, max_points)
+            return rows[keep], values[keep]
 
-    # Оставляем только даты <= выбранной
-    df = df.loc[df.index <= to_date]
-    # Если данных нет — вернуть пусто
-    if df.empty:
-        return JsonResponse({'dates': [], 'values': []})
+        rows, values = _category_lttb_cache.get((category, agg, date_from, to_date, max_points), compute)
+    return FastJsonResponse(series_payload(rollups.source, rows, values, schema))
 
-    # Убираем пропуски
-    series = df[param_key].dropna()
-    if series.empty:
-        return JsonResponse({'dates': [], 'values': []})
 
-    # Формируем списки для ответа
-    dates = [d.strftime('%Y-%m-%d') for d in series.index]
-    values = series.values.tolist()
-    return JsonResponse({'dates': dates, 'values': values})
+@require_GET
+def category_sums(request):
+    """
+    Итоги категорий за период.
+    GET-параметры:
+        from, to:   необязательные границы (включительно)
+        categories: необязательно, коды через запятую (по умолчанию все)
+    Ответ: {from, to, categories: {category: {sum, max, count, days}}}
+    """
+    try:
+        date_from = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if request.GET.get('from') else None
+        date_to = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else None
+    except ValueError:
+        return JsonResponse({'error': 'invalid from or to'}, status=400)
+
+    rollups = taxonomy.get_category_rollups()
+    wanted = [c for c in request.GET.get('categories', '').split(',') if c] or None
+    unknown = [c for c in wanted or () if rollups.category_position(c) is None]
+    if unknown:
+        return JsonResponse({'error': 'unknown category', 'categories': unknown}, status=404)
+    return FastJsonResponse({
+        'from': date_from.isoformat() if date_from else None,
+        'to': date_to.isoformat() if date_to else None,
+        'categories': rollups.totals(until=date_to, since=date_from, categories=wanted),
+    })
+
+# --------------------------------------------------------------------
+# 🔎 API: полнотекстовый поиск по комментариям
+# --------------------------------------------------------------------
+@require_GET
+def search_comments(request):
+    """
+    Поиск по комментариям дней (FTS5, ранжирование bm25, см. search.py).
+    GET-параметры:
+        q:      строка поиска (слова ищутся по префиксу, все обязательны)
+        from:   необязательно, начальная дата 'YYYY-MM-DD'
+        to:     необязательно, конечная дата 'YYYY-MM-DD'
+        limit:  необязательно, число результатов (по умолчанию 20, максимум 100)
+        offset: необязательно, смещение для постраничного вывода
+    Ответ: {query, took_ms, results: [{date, snippet, rank}, ...]}
+           snippet — экранированный HTML, совпадения в <mark>…</mark>
+    """
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return JsonResponse({'error': 'missing q'}, status=400)
+    dates = {}
+    for name in ('from', 'to'):
+        value = request.GET.get(name)
+        if not value:
+            continue
+        try:
+            dates[name] = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            return JsonResponse({'error': f'invalid {name}'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', 20))
+        offset = int(request.GET.get('offset', 0))
+    except ValueError:
+        return JsonResponse({'error': 'invalid limit or offset'}, status=400)
+
+    return FastJsonResponse(search.search_comments(q, dates.get('from'), dates.get('to'), limit, offset))
 
-def get_predictions_by_models(date):
-    model_names = ["base", "flags"]  # список моделей, которые есть
+# --------------------------------------------------------------------
+# 📊 Метрики в формате Prometheus (см. metrics.py)
+# --------------------------------------------------------------------
+@require_GET
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --------------------------------------------------------------------
+# 📤 Скачивание экспорта (потоково, память не растёт с длиной дневника)
+# --------------------------------------------------------------------
+@require_GET
+def export_download(request):
+    """
+    Экспорт всего дневника по запросу.
+    GET-параметры:
+        format: 'csv' (по умолчанию) или 'xlsx'
+    CSV отдаётся StreamingHttpResponse прямо из курсора БД;
+    XLSX пишется write-only книгой во временный файл и отдаётся кусками.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'xlsx'):
+        return JsonResponse({'error': 'invalid format'}, status=400)
+
+    parameters = export.export_parameters()
+    filename = f"diary_export_{datetime.now():%Y-%m-%d}.{fmt}"
+
+    if fmt == 'csv':
+        rows = export.iter_export_rows(parameters)
+        chunks = (chunk.encode('utf-8') for chunk in export.iter_csv(export.export_header(parameters), rows))
+        response = StreamingHttpResponse(chunks, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # XLSX — zip-архив, его нельзя писать в сокет по мере генерации строк
+    tmp = tempfile.TemporaryFile()
+    export.write_xlsx(tmp, parameters)
+    tmp.seek(0)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+def flatten_predictions(by_strategy: dict) -> dict:
+    """{strategy: {key: value}} → {"key_strategy": value} (формат ответа /get_predictions/)."""
+    return {
+        f"{param_key}_{strategy}": value
+        for strategy, preds in by_strategy.items()
+        for param_key, value in preds.items()
+    }
+
+
+@profiling.profiled("get_predictions_by_models")
+def get_predictions_by_models(date, model_names=None):
+    """
+    Прогнозы всех стратегий на дату: {strategy: {param_key: value}}.
+    Сначала ищем предрасчитанные прогнозы (таблица Prediction, индекс по дате);
+    модель запускается только для стратегий, которых там нет.
+    """
+    model_names = model_names or prediction_store.STRATEGIES  # список моделей, которые есть
     predictions = {}
+    if prediction_store.is_enabled():
+        predictions = prediction_store.get_stored_predictions(date, model_names)
     for model_name in model_names:
+        if model_name in predictions:
+            continue
+        prediction_store.note_fallback(model_name, date)
         manager = PredictorManager(model_name)
         preds = manager.predict_for_date(date)
         predictions[model_name] = preds  # {'param1': 1.2, 'param2': 3.1, ...}
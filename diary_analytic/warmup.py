@@ -0,0 +1,126 @@
+# diary_analytic/warmup.py
+
+"""
+🔥 warmup.py — прогрев процесса перед fork (gunicorn --preload)
+
+Без прогрева каждый воркер на первом запросе импортирует pandas/sklearn,
+открывает снимок дневника и читает .pkl всех моделей. При preload_app=True
+(см. gunicorn.conf.py) мастер делает это один раз до fork, и воркеры делят
+эти страницы памяти copy-on-write:
+
+    - warmup()       — в мастере: стратегии, модели текущих поколений, матрица дневника;
+    - prepare_fork() — закрыть соединения с БД (дескриптор SQLite нельзя делить между процессами);
+    - revalidate()   — в воркере после fork: если за это время опубликовано новое
+                       поколение моделей или сдвинулась версия данных — догружаем.
+"""
+
+import gc
+import os
+import time
+
+from django.db import connections
+
+from .loggers import web_logger
+
+
+def _timed(report: dict, name: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    report[f"{name}_s"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def memory_usage() -> dict:
+    """
+    Память текущего процесса, КБ: rss, pss (доля общих страниц), shared и private.
+    На системах без /proc/self/smaps_rollup — только максимальный rss.
+    """
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line and not line.startswith(" "))
+    except OSError:
+        import resource
+        return {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+    def kb(name):
+        return int(fields.get(name, "0 kB").split()[0])
+
+    return {
+        "rss_kb": kb("Rss"),
+        "pss_kb": kb("Pss"),
+        "shared_kb": kb("Shared_Clean") + kb("Shared_Dirty"),
+        "private_kb": kb("Private_Clean") + kb("Private_Dirty"),
+    }
+
+
+def _load_models(strategies) -> dict:
+    from .predictor_manager import PredictorManager
+
+    loaded = {}
+    for strategy in strategies:
+        manager = PredictorManager(strategy)
+        loaded[strategy] = {"generation": manager.generation, "models": len(manager.load_models())}
+    return loaded
+
+
+def _load_diary():
+    from .feature_store import get_lagged_features
+    from .json_response import iso_dates
+    from .taxonomy import get_category_rollups
+    from .utils import get_diary_matrix
+
+    matrix = get_diary_matrix()
+    iso_dates(matrix)
+    get_lagged_features()
+    get_category_rollups()
+    return matrix
+
+
+def warmup(strategies=None) -> dict:
+    """
+    Загружает всё, что нужно первому запросу. Возвращает отчёт с временами шагов.
+    """
+    from django.template.loader import get_template
+    from .prediction_store import STRATEGIES
+
+    strategies = strategies or STRATEGIES
+    report = {"pid": os.getpid()}
+
+    # Тяжёлые импорты (pandas, sklearn, joblib) + регистрация стратегий
+    _timed(report, "imports", lambda: __import__("diary_analytic.predictor_manager"))
+    report["models"] = _timed(report, "models", lambda: _load_models(strategies))
+    matrix = _timed(report, "diary", _load_diary)
+    report["diary_shape"] = list(matrix.shape)
+    _timed(report, "templates", lambda: get_template("diary_analytic/add_entry.html"))
+
+    # Всё загруженное — в «вечное» поколение GC: сборщик не будет трогать эти
+    # объекты (и их страницы) в воркерах, сохраняя общие страницы copy-on-write
+    gc.collect()
+    gc.freeze()
+    report["memory"] = memory_usage()
+    web_logger.info(f"[warmup] 🔥 Прогрев завершён: {report}")
+    return report
+
+
+def prepare_fork():
+    """Перед fork: у каждого воркера должно быть своё соединение с SQLite."""
+    connections.close_all()
+
+
+def revalidate(strategies=None) -> dict:
+    """
+    После fork: сверяет прогретое состояние с диском и БД.
+    Кэши, привязанные к версии данных, сбрасываются, если версия сдвинулась;
+    новое поколение моделей (если успело появиться) загружается сразу.
+    """
+    from .prediction_store import STRATEGIES
+    from .versioning import get_data_version, sync_local_caches
+
+    strategies = strategies or STRATEGIES
+    report = {"pid": os.getpid()}
+    version = get_data_version()
+    sync_local_caches(version)
+    report["data_version"] = version
+    report["models"] = _timed(report, "models", lambda: _load_models(strategies))
+    _timed(report, "diary", _load_diary)
+    return report
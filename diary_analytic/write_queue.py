@@ -0,0 +1,242 @@
+# diary_analytic/write_queue.py
+
+"""
+✍️ write_queue.py — один писатель и групповые коммиты для update_value
+
+Быстрые клики в интерфейсе дают пачку параллельных /update_value/: каждый
+запрос открывал свою транзакцию записи SQLite и запускал обновление снимка и
+экспорта, а соседние ждали блокировку (иногда до `database is locked`).
+
+Теперь потоки запросов только кладут запись в очередь процесса и ждут Future,
+а единственный поток-писатель забирает из очереди всё накопившееся и
+фиксирует одной транзакцией:
+
+    - по каждой паре (дата, параметр) побеждает последняя запись;
+    - Entry создаются одним bulk_create, EntryValue — одним upsert;
+    - снимок/экспорт/прогнозы обновляются один раз на группу (schedule_data_refresh);
+    - Future всех запросов группы завершаются сразу после коммита.
+
+Пример:
+    result = get_write_coordinator().submit(date(2025, 5, 12), "toshn", 2).result(timeout=10)
+    # {"success": True} или {"success": True, "deleted": True, "deleted_count": 1}
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from . import archive, changelog
+from .loggers import db_logger
+from .models import Entry, EntryValue, Parameter
+
+# Сколько записей максимум в одной транзакции
+MAX_BATCH = 500
+# Сколько писатель ждёт «догоняющие» записи, прежде чем коммитить группу (сек)
+GROUP_DELAY = 0.002
+
+
+class InvalidParameter(ValueError):
+    """Параметра с таким ключом нет."""
+
+
+class _Write:
+    __slots__ = ("date", "key", "value", "future")
+
+    def __init__(self, date, key, value):
+        self.date = date
+        self.key = key
+        self.value = value
+        self.future = Future()
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "DIARY_WRITE_QUEUE", True)
+
+
+class WriteCoordinator:
+    """
+    Очередь записей значений и поток-писатель (запускается при первой записи).
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH, group_delay: float = GROUP_DELAY):
+        self.max_batch = max_batch
+        self.group_delay = group_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Статистика: сколько групп и записей зафиксировано
+        self.batches = 0
+        self.writes = 0
+
+    def submit(self, date, key: str, value) -> Future:
+        """
+        Ставит запись в очередь. value=None — удалить значение.
+        Future завершается словарём-ответом или исключением (InvalidParameter и т.п.).
+        """
+        write = _Write(date, key, None if value is None else float(value))
+        if transaction.get_connection().in_atomic_block:
+            # Вызов изнутри чужой транзакции: писатель её не увидит — пишем здесь же
+            try:
+                self._commit([write])
+            except Exception as e:
+                write.future.set_exception(e)
+            return write.future
+        self._ensure_thread()
+        self._queue.put(write)
+        return write.future
+
+    def submit_many(self, items) -> list[Future]:
+        """
+        Пачка записей [(date, key, value), ...] (например, правки сетки в админке).
+        Кладутся в очередь подряд, поэтому писатель фиксирует их одной группой
+        (по MAX_BATCH за транзакцию).
+        """
+        writes = [_Write(d, key, None if value is None else float(value)) for d, key, value in items]
+        if not writes:
+            return []
+        if transaction.get_connection().in_atomic_block:
+            try:
+                self._commit(writes)
+            except Exception as e:
+                for write in writes:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+            return [write.future for write in writes]
+        self._ensure_thread()
+        for write in writes:
+            self._queue.put(write)
+        return [write.future for write in writes]
+
+    # -----------------------------------------------------------------
+    # 🧵 Поток-писатель
+    # -----------------------------------------------------------------
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="diary-writer", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.group_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            try:
+                self._commit(batch)
+            except Exception as e:
+                db_logger.exception(f"[write_queue] ❌ Ошибка групповой записи ({len(batch)} шт.): {e}")
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+
+    # -----------------------------------------------------------------
+    # 💾 Групповой коммит
+    # -----------------------------------------------------------------
+
+    def _commit(self, batch: list):
+        from .signals import schedule_data_refresh
+
+        # Последняя запись по паре (дата, параметр) побеждает; Future всех её дублей — вместе
+        latest, waiters = {}, {}
+        for write in batch:
+            pair = (write.date, write.key)
+            latest[pair] = write.value
+            waiters.setdefault(pair, []).append(write.future)
+
+        param_ids = dict(Parameter.objects.filter(key__in={k for _, k in latest}).values_list("key", "id"))
+        for pair in [p for p in latest if p[1] not in param_ids]:
+            error = InvalidParameter(pair[1])
+            for future in waiters.pop(pair):
+                future.set_exception(error)
+            del latest[pair]
+        # Архивные годы закрыты для записи (см. archive.py)
+        for pair in list(latest):
+            try:
+                archive.check_writable(pair[0])
+            except archive.ArchivedPeriodError as error:
+                for future in waiters.pop(pair):
+                    future.set_exception(error)
+                del latest[pair]
+        if not latest:
+            return
+
+        results = {}
+        # Внутри внешней транзакции (синхронный режим) on_commit сработает только в её конце
+        nested = transaction.get_connection().in_atomic_block
+        with transaction.atomic():
+            if not nested:
+                # Ответы отдаём сразу после коммита — до перестройки снимка и экспорта
+                transaction.on_commit(lambda: self._resolve(waiters, results))
+
+            upserts = {pair: value for pair, value in latest.items() if value is not None}
+            deletes = [pair for pair, value in latest.items() if value is None]
+
+            dates = {d for d, _ in upserts}
+            if dates:
+                Entry.objects.bulk_create([Entry(date=d) for d in dates], ignore_conflicts=True)
+            entry_ids = dict(Entry.objects.filter(date__in={d for d, _ in latest}).values_list("date", "id"))
+
+            if upserts:
+                pairs = Q()
+                for d, key in upserts:
+                    pairs |= Q(entry_id=entry_ids[d], parameter_id=param_ids[key])
+                existing = set(EntryValue.objects.filter(pairs).values_list("entry_id", "parameter_id"))
+                EntryValue.objects.bulk_create(
+                    [EntryValue(entry_id=entry_ids[d], parameter_id=param_ids[key], value=value) for (d, key), value in upserts.items()],
+                    update_conflicts=True,
+                    unique_fields=["entry", "parameter"],
+                    update_fields=["value"],
+                )
+                for d, key in upserts:
+                    results[(d, key)] = {"success": True, "created": (entry_ids[d], param_ids[key]) not in existing}
+
+            for d, key in deletes:
+                count = 0
+                if d in entry_ids:
+                    count, _ = EntryValue.objects.filter(entry_id=entry_ids[d], parameter_id=param_ids[key]).delete()
+                results[(d, key)] = {"success": True, "deleted": True, "deleted_count": count}
+
+            # bulk_create не вызывает сигналы — версия данных, снимок и журнал изменений вручную;
+            # удаления идут через QuerySet.delete() и попадают в журнал из post_delete
+            schedule_data_refresh({d for d, _ in latest})
+            changelog.record_values((d, key, value) for (d, key), value in upserts.items())
+
+        if nested:
+            self._resolve(waiters, results)
+        self.batches += 1
+        self.writes += len(batch)
+        db_logger.info(f"[write_queue] ✅ Группа: {len(batch)} запросов → {len(latest)} значений")
+
+    @staticmethod
+    def _resolve(waiters: dict, results: dict):
+        for pair, futures in waiters.items():
+            for future in futures:
+                future.set_result(results[pair])
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_write_coordinator() -> WriteCoordinator:
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = WriteCoordinator()
+        return _coordinator
@@ -0,0 +1,58 @@
+# gunicorn.conf.py
+
+"""
+🦄 Конфигурация gunicorn
+
+Запуск:
+    gunicorn            # конфиг подхватывается из текущего каталога
+
+Приложение загружается в мастере (preload_app), там же прогреваются стратегии,
+модели и матрица дневника (diary_analytic/warmup.py). Воркеры после fork делят
+эти страницы памяти copy-on-write и на первом запросе уже ничего не грузят.
+
+Метрики воркеров складываются через файлы в DIARY_METRICS_DIR (по умолчанию
+metrics/ рядом с конфигом); вне gunicorn они выключены (см. diary_analytic/metrics.py).
+"""
+
+import multiprocessing
+import os
+from pathlib import Path
+
+# До загрузки приложения (preload_app): settings читают переменную при импорте
+os.environ.setdefault("DIARY_METRICS_DIR", str(Path(__file__).resolve().parent / "metrics"))
+
+wsgi_app = "config.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", min(4, multiprocessing.cpu_count() * 2 + 1)))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))  # переобучение моделей бывает долгим
+preload_app = True
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+
+
+def when_ready(server):
+    """Мастер: приложение уже импортировано (preload), воркеры ещё не созданы."""
+    from diary_analytic.warmup import prepare_fork, warmup
+
+    report = warmup()
+    server.log.info(f"warmup: {report}")
+    prepare_fork()
+
+
+def pre_fork(server, worker):
+    # Соединение с SQLite не должно переходить в дочерний процесс
+    from diary_analytic.warmup import prepare_fork
+
+    prepare_fork()
+
+
+def post_fork(server, worker):
+    """Воркер: за время работы мастера могли появиться новые модели или данные."""
+    from diary_analytic.warmup import revalidate
+
+    try:
+        report = revalidate()
+        server.log.info(f"revalidate worker {worker.pid}: {report}")
+    except Exception as e:  # воркер всё равно поднимется и догрузит всё лениво
+        server.log.warning(f"revalidate worker {worker.pid} failed: {e}")